@@ -0,0 +1,57 @@
+{#-
+  Days an incremental mart rebuilds, as {'start': 'YYYY-MM-DD', 'end': 'YYYY-MM-DD' or none}:
+    --vars '{start_date: 2026-01-01, end_date: 2026-01-07}'   backfill: these days (end_date defaults to start_date)
+    incremental run                                           max(partition_column) - lookback_days (var, default 3) onwards
+    first run, --full-refresh, empty table                    none: all history
+  The partitions of the window are replaced as a whole (partition_overwrite), the others are left as they are.
+-#}
+{% macro incremental_window(partition_column) %}
+  {%- set start_date = var('start_date', none) -%}
+  {%- if start_date is not none -%}
+    {{ return({'start': start_date | string, 'end': var('end_date', start_date) | string}) }}
+  {%- endif -%}
+  {%- if not execute or not is_incremental() -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set query -%}
+    select cast(date_add('day', -{{ var('lookback_days', 3) | int }}, max(cast({{ partition_column }} as date))) as varchar)
+    from {{ this }}
+  {%- endset -%}
+  {%- set start = run_query(query).columns[0].values()[0] -%}
+  {{ return({'start': start, 'end': none} if start is not none else none) }}
+{% endmacro %}
+
+
+{#-
+  Predicate keeping the rows of `window` (`true` for a full build). Bounds are literals so Trino prunes
+  partitions of the source. For the source of a mart partitioned by another day than the source's
+  (readings by traffic day, files by ingest day): `start_slack_days` lowers the lower bound (rows
+  filed under an earlier day) and `end_slack_days` raises the upper one (rows filed late). An
+  incremental window has no upper bound; a backfill stops at end_date + end_slack_days.
+-#}
+{% macro window_filter(column, window, data_type='varchar', start_slack_days=0, end_slack_days=0) -%}
+  {%- if window is none -%}
+    true
+  {%- else -%}
+    {%- set prefix = 'date ' if data_type == 'date' else '' -%}
+    {%- set day = modules.datetime.date.fromisoformat -%}
+    {%- set days = modules.datetime.timedelta -%}
+    {{ column }} >= {{ prefix }}'{{ (day(window.start) - days(days=start_slack_days | int)).isoformat() }}'
+    {%- if window.end is not none %}
+    and {{ column }} <= {{ prefix }}'{{ (day(window.end) + days(days=end_slack_days | int)).isoformat() }}'
+    {%- endif -%}
+  {%- endif -%}
+{%- endmacro %}
+
+
+{#-
+  Hooks of the incremental marts: with OVERWRITE, an insert into an existing Hive partition replaces it
+  instead of appending to it, so re-running a window is idempotent.
+-#}
+{% macro partition_overwrite() -%}
+  set session {{ target.database }}.insert_existing_partitions_behavior = 'OVERWRITE'
+{%- endmacro %}
+
+{% macro reset_partition_overwrite() -%}
+  reset session {{ target.database }}.insert_existing_partitions_behavior
+{%- endmacro %}
@@ -1,11 +1,36 @@
+{#-
+  Daily readings per sensor. traffic_date is the UTC day of measured_at (ingest_dt when missing); before
+  the mart was incremental it was the day in the timestamp's own offset, so readings near local midnight
+  may now fall on the neighbouring day.
+  Incremental by traffic_date: only the days of incremental_window() are rebuilt (macros/incremental_window.sql).
+-#}
 {{ config(
-    materialized='table',
-    on_table_exists='drop',
-    properties={ "format": "'PARQUET'" }
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{{ partition_overwrite() }}",
+    post_hook="{{ reset_partition_overwrite() }}",
+    properties={ "format": "'PARQUET'", "partitioned_by": "ARRAY['traffic_date']" }
 ) }}
 
+{%- set window = incremental_window('traffic_date') %}
+
+with readings as (
+    select
+        date(at_timezone(coalesce(measured_at_ts, from_iso8601_timestamp(ingest_dt || 'T00:00:00Z')), 'UTC')) as traffic_date,
+        sensor_id,
+        city,
+        vehicle_count,
+        avg_speed_kmh,
+        occupancy_pct,
+        congestion_level,
+        incident_flag
+    from {{ ref('stg_traffic') }}
+    -- A reading is filed on or after its UTC day (one day of slack for a local --dt); a backfill also reads
+    -- the late_days ingest days after end_date (default lookback_days), an incremental run every later one
+    where {{ window_filter('ingest_dt', window, start_slack_days=1, end_slack_days=var('late_days', var('lookback_days', 3))) }}
+)
+
 select
-    date(coalesce(measured_at_ts, from_iso8601_timestamp(ingest_dt || 'T00:00:00Z'))) as traffic_date,
     sensor_id,
     city,
     count(*) as readings,
@@ -13,6 +38,9 @@ select
     avg(avg_speed_kmh) as avg_speed_kmh_avg,
     avg(occupancy_pct) as occupancy_pct_avg,
     max(congestion_level) as congestion_level_max,
-    sum(case incident_flag when 'Y' then 1 else 0 end) as incidents
-from {{ ref('stg_traffic') }}
-group by 1,2,3
+    sum(case incident_flag when 'Y' then 1 else 0 end) as incidents,
+    -- Hive partition column: last
+    traffic_date
+from readings
+where {{ window_filter('traffic_date', window, data_type='date') }}
+group by traffic_date, sensor_id, city
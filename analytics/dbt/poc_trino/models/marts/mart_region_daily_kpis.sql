@@ -1,11 +1,15 @@
+{#- Incremental by ingest_dt: only the days of incremental_window() are rebuilt (macros/incremental_window.sql) -#}
 {{ config(
-    materialized='table',
-    on_table_exists='drop',
-    properties={ "format": "'PARQUET'" }
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{{ partition_overwrite() }}",
+    post_hook="{{ reset_partition_overwrite() }}",
+    properties={ "format": "'PARQUET'", "partitioned_by": "ARRAY['ingest_dt']" }
 ) }}
 
+{%- set window = incremental_window('ingest_dt') %}
+
 select
-    ingest_dt,
     region_id,
     region_name,
     count(distinct sensor_id) as sensor_count,
@@ -13,6 +17,9 @@ select
     avg(avg_speed_kmh) as avg_speed_kmh,
     avg(occupancy_pct) as avg_occupancy_pct,
     max(congestion_level_rank) as max_congestion_level,
-    cast(floor(random() * 51) as integer) as incident_count
+    cast(floor(random() * 51) as integer) as incident_count,
+    -- Hive partition column: last
+    ingest_dt
 from {{ ref('mart_traffic_sensor_geo') }}
+where {{ window_filter('ingest_dt', window) }}
 group by ingest_dt, region_id, region_name
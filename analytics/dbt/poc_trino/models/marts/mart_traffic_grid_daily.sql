@@ -0,0 +1,30 @@
+{#- mart_traffic_grid_hourly summed per day: what grid_query.py reads for whole-day ranges -#}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{{ partition_overwrite() }}",
+    post_hook="{{ reset_partition_overwrite() }}",
+    properties={ "format": "'PARQUET'", "partitioned_by": "ARRAY['zoom', 'traffic_date']" }
+) }}
+
+{%- set window = incremental_window('traffic_date') %}
+
+select
+    quadkey,
+    tile_x,
+    tile_y,
+    sum(readings) as readings,
+    sum(vehicles_sum) as vehicles_sum,
+    sum(speed_sum) as speed_sum,
+    sum(speed_n) as speed_n,
+    sum(occupancy_sum) as occupancy_sum,
+    sum(occupancy_n) as occupancy_n,
+    max(congestion_max) as congestion_max,
+    sum(incidents) as incidents,
+    cast(merge(cast(sensors_hll as HyperLogLog)) as varbinary) as sensors_hll,
+    -- Hive partition columns: last
+    zoom,
+    traffic_date
+from {{ ref('mart_traffic_grid_hourly') }}
+where {{ window_filter('traffic_date', window, data_type='date') }}
+group by quadkey, tile_x, tile_y, zoom, traffic_date
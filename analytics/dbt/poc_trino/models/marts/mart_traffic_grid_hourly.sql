@@ -0,0 +1,88 @@
+{#-
+  Hourly traffic aggregates on the Bing tile (quadkey) grid, one row per tile, hour and zoom level
+  (var grid_zooms). Only additive columns (sums, counts, max, HyperLogLog of sensors), so any set of
+  tiles / hours merges into exact totals; a tile's parent is its quadkey minus the last digit.
+  Incremental by traffic_date like fct_traffic_daily (macros/incremental_window.sql).
+  Read with scripts/grid_query.py.
+-#}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{{ partition_overwrite() }}",
+    post_hook="{{ reset_partition_overwrite() }}",
+    properties={ "format": "'PARQUET'", "partitioned_by": "ARRAY['zoom', 'traffic_date']" }
+) }}
+
+{%- set window = incremental_window('traffic_date') %}
+
+with readings as (
+    select
+        at_timezone(coalesce(t.measured_at_ts, from_iso8601_timestamp(t.ingest_dt || 'T00:00:00Z')), 'UTC') as measured_at,
+        t.sensor_id,
+        coalesce(t.lat, s.latitude) as lat,
+        coalesce(t.lon, s.longitude) as lon,
+        t.vehicle_count,
+        t.avg_speed_kmh,
+        t.occupancy_pct,
+        t.congestion_level_rank,
+        t.incident_flag
+    from {{ ref('stg_traffic') }} t
+             left join {{ ref('stg_sensor_locations') }} s
+                       on t.sensor_id = s.sensor_id
+                           and t.city = s.city
+    -- By UTC day like fct_traffic_daily: from the day before the window to late_days after a backfill's end
+    where {{ window_filter('t.ingest_dt', window, start_slack_days=1, end_slack_days=var('late_days', var('lookback_days', 3))) }}
+),
+
+-- Finest grain first (one row per position and hour), so the tiles are computed once per position, not per reading
+positions as (
+    select
+        date(measured_at) as traffic_date,
+        hour(measured_at) as traffic_hour,
+        lat,
+        lon,
+        count(*) as readings,
+        sum(vehicle_count) as vehicles_sum,
+        sum(avg_speed_kmh) as speed_sum,
+        count(avg_speed_kmh) as speed_n,
+        sum(occupancy_pct) as occupancy_sum,
+        count(occupancy_pct) as occupancy_n,
+        max(congestion_level_rank) as congestion_max,
+        sum(case incident_flag when 'Y' then 1 else 0 end) as incidents,
+        approx_set(sensor_id) as sensors
+    from readings
+    -- Web Mercator range of bing tiles
+    where lat between -85.05112878 and 85.05112878
+      and lon between -180 and 180
+    group by 1, 2, 3, 4
+),
+
+tiles as (
+    select
+        p.*,
+        z.zoom,
+        bing_tile_at(p.lat, p.lon, z.zoom) as tile
+    from positions p
+             cross join unnest(array[{{ var('grid_zooms', [6, 9, 12, 15]) | join(', ') }}]) as z (zoom)
+    where {{ window_filter('p.traffic_date', window, data_type='date') }}
+)
+
+select
+    bing_tile_quadkey(tile) as quadkey,
+    bing_tile_coordinates(tile).x as tile_x,
+    bing_tile_coordinates(tile).y as tile_y,
+    cast(traffic_hour as integer) as traffic_hour,
+    sum(readings) as readings,
+    sum(vehicles_sum) as vehicles_sum,
+    sum(speed_sum) as speed_sum,
+    sum(speed_n) as speed_n,
+    sum(occupancy_sum) as occupancy_sum,
+    sum(occupancy_n) as occupancy_n,
+    max(congestion_max) as congestion_max,
+    sum(incidents) as incidents,
+    cast(merge(sensors) as varbinary) as sensors_hll,
+    -- Hive partition columns: last
+    cast(zoom as integer) as zoom,
+    traffic_date
+from tiles
+group by bing_tile_quadkey(tile), bing_tile_coordinates(tile).x, bing_tile_coordinates(tile).y, traffic_hour, zoom, traffic_date
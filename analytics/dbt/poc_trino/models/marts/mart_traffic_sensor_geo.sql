@@ -1,11 +1,15 @@
+{#- Incremental by ingest_dt: only the days of incremental_window() are rebuilt (macros/incremental_window.sql) -#}
 {{ config(
-    materialized='table',
-    on_table_exists='drop',
-    properties={ "format": "'PARQUET'" }
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{{ partition_overwrite() }}",
+    post_hook="{{ reset_partition_overwrite() }}",
+    properties={ "format": "'PARQUET'", "partitioned_by": "ARRAY['ingest_dt']" }
 ) }}
 
+{%- set window = incremental_window('ingest_dt') %}
+
 select
-    t.ingest_dt,
     t.sensor_id,
     t.city,
     s.region_id,
@@ -19,10 +23,13 @@ select
     t.avg_speed_kmh,
     t.occupancy_pct,
     t.congestion_level_rank,
-    t.incident_flag
+    t.incident_flag,
+    -- Hive partition column: last
+    t.ingest_dt
 from {{ ref('stg_traffic') }} t
          join {{ ref('stg_sensor_locations') }} s
               on t.sensor_id = s.sensor_id
                   and t.city = s.city
          join {{ ref('stg_regions') }} r
-              on s.region_id = r.region_id
\ No newline at end of file
+              on s.region_id = r.region_id
+where {{ window_filter('t.ingest_dt', window) }}
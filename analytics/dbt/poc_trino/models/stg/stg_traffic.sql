@@ -1,5 +1,31 @@
 {{ config(materialized='view') }}
 
+{#- traffic_source=parquet reads the typed copy written at ingest: no text parsing per query -#}
+{% if var('traffic_source', 'csv') == 'parquet' %}
+
+select
+    reading_id,
+    sensor_id,
+    road,
+    direction,
+    road_segment_id,
+    city,
+    lat,
+    lon,
+    measured_at_utc_raw,
+    with_timezone(measured_at_ts, 'UTC') as measured_at_ts,
+    vehicle_count,
+    avg_speed_kmh,
+    occupancy_pct,
+    congestion_level,
+    congestion_level_rank,
+    incident_flag,
+    source_system,
+    dt as ingest_dt
+from {{ source('raw_s3', 'traffic_parquet') }}
+
+{% else %}
+
 with src as (
   select
     reading_id,
@@ -17,7 +43,8 @@ with src as (
     congestion_level,
     incident_flag,
     source_system,
-    regexp_extract("$path", 'dt=(\\d{4}-\\d{2}-\\d{2})', 1) as ingest_dt
+    -- Partition column: a filter on ingest_dt only reads that day's files
+    dt as ingest_dt
   from {{ source('raw_s3', 'traffic_csv') }}
 )
 
@@ -50,3 +77,5 @@ select
     source_system,
     ingest_dt
 from src
+
+{% endif %}
@@ -0,0 +1,362 @@
+"""
+Exports rows with a WKT geometry column to GeoJSON, GeoParquet or FlatGeobuf, chunk by chunk.
+
+Sources (one of):
+    --csv FILE      a Trino `--output-format CSV_HEADER` export (docs/howto/carga_datos_postgis.md)
+    --query SQL     run on Trino (needs `trino`); --trino-host / --trino-port / --trino-user
+    --table NAME    shorthand for --query "select * from NAME"
+
+Every column but the geometry (--geom-column, default geom_wkt) becomes a property. At most
+--chunk-size rows are held at a time; their WKT is parsed in one vectorized shapely call.
+
+Formats (--format, or from the output suffix):
+    geojson      FeatureCollection written feature by feature. Every feature has a `bbox`, the
+                 collection gets the overall `bbox` as its last member.
+    geoparquet   GeoParquet 1.1: WKB `geometry` plus a `bbox` struct column declared as its
+                 covering. Each chunk is one row group, Hilbert-sorted, written with a page index,
+                 so readers (DuckDB, GDAL, pyarrow filters on bbox.*) skip row groups and pages
+                 outside the requested bbox. Row groups only cover small areas if the source is
+                 ordered spatially (e.g. `order by` a region or tile column in --query).
+    flatgeobuf   FlatGeobuf with its packed Hilbert R-tree (needs `pyogrio`); map clients read
+                 only the features of a bbox through HTTP range requests.
+
+    python scripts/export_geo.py --csv exports/regions_export.csv -o exports/regions.geojson
+    python scripts/export_geo.py --table hive.curated_s3.dim_regions -o exports/regions.parquet
+    python scripts/export_geo.py --table hive.curated_s3.dim_regions -o exports/regions.fgb
+
+Geometries are expected in lon/lat (EPSG:4326 as exported by Trino / PostGIS).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import shapely
+
+try:
+    import orjson
+except ImportError:  # optional accelerator for GeoJSON properties
+    orjson = None
+
+try:
+    import pyogrio
+except ImportError:  # optional: only needed for FlatGeobuf
+    pyogrio = None
+
+try:
+    import trino
+except ImportError:  # optional: only needed to read from Trino
+    trino = None
+
+FORMATS = {".geojson": "geojson", ".json": "geojson", ".parquet": "geoparquet", ".fgb": "flatgeobuf"}
+GEOPARQUET_VERSION = "1.1.0"
+# Trino type -> Arrow type; anything else is exported as its string form
+TRINO_TYPES = {
+    "boolean": pa.bool_(),
+    "tinyint": pa.int64(),
+    "smallint": pa.int64(),
+    "integer": pa.int64(),
+    "bigint": pa.int64(),
+    "real": pa.float64(),
+    "double": pa.float64(),
+}
+GEOMETRY_TYPE_NAMES = {0: "Point", 1: "LineString", 2: "LineString", 3: "Polygon", 4: "MultiPoint",
+                       5: "MultiLineString", 6: "MultiPolygon", 7: "GeometryCollection"}
+BBOX_TYPE = pa.struct([("xmin", pa.float64()), ("ymin", pa.float64()), ("xmax", pa.float64()), ("ymax", pa.float64())])
+
+# (properties without the geometry column, shapely geometries of the same rows)
+Chunk = tuple[pa.Table, np.ndarray]
+
+
+@dataclass
+class ExportStats:
+    features: int = 0
+    skipped: int = 0
+    geometry_types: set[int] = field(default_factory=set)  # shapely type ids
+    bbox: list[float] = field(default_factory=lambda: [np.inf, np.inf, -np.inf, -np.inf])
+
+    def add(self, geoms: np.ndarray) -> None:
+        self.features += len(geoms)
+        if not len(geoms):
+            return
+        self.geometry_types.update(shapely.get_type_id(geoms).astype(object).tolist())
+        xmin, ymin, xmax, ymax = shapely.total_bounds(geoms)
+        self.bbox = [min(self.bbox[0], xmin), min(self.bbox[1], ymin), max(self.bbox[2], xmax), max(self.bbox[3], ymax)]
+
+    def type_names(self) -> list[str]:
+        return sorted(GEOMETRY_TYPE_NAMES[t] for t in self.geometry_types)
+
+    def total_bounds(self) -> list[float] | None:
+        return [float(v) for v in self.bbox] if self.features else None
+
+
+# ---- Sources ----
+
+def read_csv_batches(path: str, geom_column: str, chunk_size: int) -> Iterator[pa.Table]:
+    """Streams the CSV (pyarrow's block reader: types inferred once, values parsed in C), re-cut to chunk_size rows."""
+    reader = pa_csv.open_csv(path, convert_options=pa_csv.ConvertOptions(column_types={geom_column: pa.string()}))
+    pending: list[pa.RecordBatch] = []
+    rows = 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size)
+            rest = table.slice(chunk_size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending)
+
+
+def read_trino_batches(query: str, chunk_size: int, host: str, port: int, user: str) -> Iterator[pa.Table]:
+    """Runs the query and fetches chunk_size rows at a time."""
+    if trino is None:
+        raise SystemExit("reading from Trino needs the `trino` package (pip install trino)")
+    conn = trino.dbapi.connect(host=host, port=port, user=user)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        rows = cursor.fetchmany(chunk_size)
+        schema = pa.schema([(col[0], TRINO_TYPES.get(col[1], pa.string())) for col in cursor.description])
+        while rows:
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array(values if f.type != pa.string() else [None if v is None else str(v) for v in values], type=f.type)
+                for f, values in zip(schema, columns)
+            ]
+            yield pa.Table.from_arrays(arrays, schema=schema)
+            rows = cursor.fetchmany(chunk_size)
+    finally:
+        conn.close()
+
+
+def parse_chunks(tables: Iterator[pa.Table], geom_column: str, on_invalid: str, stats: ExportStats) -> Iterator[Chunk]:
+    """WKT column -> shapely geometries, one vectorized call per chunk; rows without a valid geometry are skipped or fail."""
+    for table in tables:
+        if geom_column not in table.column_names:
+            raise SystemExit(f"geometry column {geom_column!r} not found (columns: {', '.join(table.column_names)})")
+        wkt = table.column(geom_column).to_numpy(zero_copy_only=False)
+        geoms = shapely.from_wkt(wkt, on_invalid="raise" if on_invalid == "raise" else "ignore")
+        props = table.drop_columns([geom_column])
+        missing = shapely.is_missing(geoms)
+        if missing.any():
+            if on_invalid == "raise":
+                raise SystemExit(f"{int(missing.sum())} rows without a geometry (use --on-invalid skip)")
+            keep = ~missing
+            stats.skipped += int(missing.sum())
+            props, geoms = props.filter(pa.array(keep)), geoms[keep]
+        stats.add(geoms)
+        yield props, geoms
+
+
+# ---- Writers ----
+
+def properties_encoder():
+    if orjson is not None:
+        return lambda value: orjson.dumps(value, default=str).decode("utf-8")
+    return json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+
+def write_geojson(path: str, chunks: Iterator[Chunk], stats: ExportStats) -> None:
+    """One feature per line; only the current chunk is held in memory."""
+    encode = properties_encoder()
+    with open(path, "w", encoding="utf-8") as out:
+        out.write('{"type":"FeatureCollection","features":[')
+        separator = "\n"
+        for props, geoms in chunks:
+            if not len(geoms):
+                continue
+            geometries = shapely.to_geojson(geoms)
+            bounds = shapely.bounds(geoms).tolist()
+            out.write(separator + ",\n".join(
+                f'{{"type":"Feature","bbox":[{b[0]!r},{b[1]!r},{b[2]!r},{b[3]!r}],"geometry":{geometry},'
+                f'"properties":{encode(properties)}}}'
+                for geometry, b, properties in zip(geometries, bounds, props.to_pylist())
+            ))
+            separator = ",\n"
+        bbox = stats.total_bounds()
+        out.write("\n]" + (f',"bbox":{json.dumps(bbox)}' if bbox else "") + "}\n")
+
+
+def hilbert_order(geoms: np.ndarray, bits: int = 16) -> np.ndarray:
+    """Indices sorting geometries along a Hilbert curve of their bbox centres (extent of this chunk)."""
+    bounds = shapely.bounds(geoms)
+    cx, cy = (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2
+    side = (1 << bits) - 1
+
+    def scale(v):
+        low, high = np.nanmin(v), np.nanmax(v)
+        return np.zeros(len(v), np.int64) if high <= low else ((v - low) / (high - low) * side).astype(np.int64)
+
+    x, y = scale(cx), scale(cy)
+    d = np.zeros(len(geoms), np.int64)
+    s = 1 << (bits - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant
+        flip = ~ry & rx
+        x = np.where(flip, side - x, x)
+        y = np.where(flip, side - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return np.argsort(d, kind="stable")
+
+
+def geo_table(props: pa.Table, geoms: np.ndarray) -> pa.Table:
+    bounds = shapely.bounds(geoms)
+    bbox = pa.StructArray.from_arrays([pa.array(bounds[:, i]) for i in range(4)], fields=list(BBOX_TYPE))
+    return props.append_column("geometry", pa.array(shapely.to_wkb(geoms), pa.binary())).append_column("bbox", bbox)
+
+
+def geo_metadata(stats: ExportStats) -> dict:
+    column = {
+        "encoding": "WKB",
+        "geometry_types": stats.type_names(),
+        "covering": {"bbox": {k: ["bbox", k] for k in ("xmin", "ymin", "xmax", "ymax")}},
+    }
+    if stats.total_bounds():
+        column["bbox"] = stats.total_bounds()
+    # No "crs": GeoParquet then means OGC:CRS84, i.e. lon/lat WGS84
+    return {"version": GEOPARQUET_VERSION, "primary_column": "geometry", "columns": {"geometry": column}}
+
+
+def write_geoparquet(path: str, chunks: Iterator[Chunk], stats: ExportStats) -> None:
+    writer = None
+    try:
+        for props, geoms in chunks:
+            if not len(geoms):
+                continue
+            order = hilbert_order(geoms)
+            table = geo_table(props.take(pa.array(order)), geoms[order])
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd", write_page_index=True)
+            writer.write_table(table.cast(writer.schema), row_group_size=len(table))
+        if writer is None:
+            raise SystemExit("no rows to export")
+        # The footer is written on close: bbox and geometry types cover every chunk
+        writer.add_key_value_metadata({"geo": json.dumps(geo_metadata(stats))})
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_flatgeobuf(path: str, chunks: Iterator[Chunk], stats: ExportStats, layer: str) -> None:
+    if pyogrio is None:
+        raise SystemExit("FlatGeobuf output needs the `pyogrio` package (pip install pyogrio)")
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        raise SystemExit("no rows to export")
+    geometry = pa.field("geometry", pa.binary(), metadata={"ARROW:extension:name": "geoarrow.wkb"})
+    schema = first[0].schema.append(geometry)
+
+    failures: list[BaseException] = []
+
+    def batches():
+        try:
+            for props, geoms in _chain(first, chunks):
+                table = props.append_column(geometry, pa.array(shapely.to_wkb(geoms), pa.binary()))
+                yield from table.cast(schema).to_batches()
+        except BaseException as e:
+            failures.append(e)  # GDAL only reports "error while accessing batch"
+            raise
+
+    # GDAL writes the features, then sorts them and builds the packed Hilbert R-tree on close
+    try:
+        pyogrio.write_arrow(pa.RecordBatchReader.from_batches(schema, batches()), path, layer=layer,
+                            driver="FlatGeobuf", geometry_name="geometry", geometry_type="Unknown",
+                            crs="EPSG:4326", layer_options={"SPATIAL_INDEX": "YES"})
+    except Exception:
+        if failures:
+            raise failures[0] from None
+        raise
+
+
+def _chain(first: Chunk, rest: Iterator[Chunk]) -> Iterator[Chunk]:
+    yield first
+    yield from rest
+
+
+# ---- CLI ----
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export a WKT geometry table to GeoJSON, GeoParquet or FlatGeobuf.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV export with a header (Trino CSV_HEADER)")
+    source.add_argument("--query", help="SQL query to run on Trino")
+    source.add_argument("--table", help="Trino table to export (select *)")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), help="Default: from the output suffix")
+    parser.add_argument("--geom-column", default="geom_wkt", help="WKT column (default: geom_wkt)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Rows per chunk / row group (default: 50000)")
+    parser.add_argument("--on-invalid", choices=("raise", "skip"), default="raise",
+                        help="Rows with empty or unparsable WKT (default: raise)")
+    parser.add_argument("--layer", help="FlatGeobuf layer name (default: output file stem)")
+    parser.add_argument("--trino-host", default=os.getenv("TRINO_HOST", "localhost"))
+    parser.add_argument("--trino-port", type=int, default=int(os.getenv("TRINO_PORT", "8081")))
+    parser.add_argument("--trino-user", default=os.getenv("TRINO_USER", "poc"))
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = FORMATS.get(os.path.splitext(args.output)[1].lower())
+        if args.format is None:
+            parser.error(f"cannot tell the format from {args.output!r}; use --format")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be >= 1")
+    return args
+
+
+def export(args: argparse.Namespace) -> ExportStats:
+    """Writes to a temporary file next to the output and renames it once complete."""
+    if args.csv:
+        tables = read_csv_batches(args.csv, args.geom_column, args.chunk_size)
+    else:
+        query = args.query or f"select * from {args.table}"
+        tables = read_trino_batches(query, args.chunk_size, args.trino_host, args.trino_port, args.trino_user)
+    stats = ExportStats()
+    chunks = parse_chunks(tables, args.geom_column, args.on_invalid, stats)
+
+    stem, suffix = os.path.splitext(args.output)
+    tmp_path = f"{stem}.tmp{suffix}"  # GDAL picks the FlatGeobuf file layout from the suffix
+    try:
+        if args.format == "geojson":
+            write_geojson(tmp_path, chunks, stats)
+        elif args.format == "geoparquet":
+            write_geoparquet(tmp_path, chunks, stats)
+        else:
+            layer = args.layer or os.path.splitext(os.path.basename(args.output))[0]
+            write_flatgeobuf(tmp_path, chunks, stats, layer)
+        os.replace(tmp_path, args.output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return stats
+
+
+def main(argv: list[str] | None = None) -> ExportStats:
+    args = parse_args(argv)
+    stats = export(args)
+    print(json.dumps({
+        "msg": "geo export done",
+        "output": args.output,
+        "format": args.format,
+        "features": stats.features,
+        "skipped": stats.skipped,
+        "geometry_types": stats.type_names(),
+        "bbox": stats.total_bounds(),
+    }))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,15 @@
-import csv
-import json
-from shapely import wkt
-from shapely.geometry import mapping
+"""
+regions_export.csv (Trino CSV_HEADER export of dim_regions) -> regions.geojson, in the working directory.
+
+Kept for the existing how-to; it is `export_geo.py` with fixed paths. For other layers, formats
+(GeoParquet, FlatGeobuf) or reading straight from Trino, use export_geo.py.
+"""
+from export_geo import main
 
 input_csv = "regions_export.csv"
 output_geojson = "regions.geojson"
 
-features = []
-
-with open(input_csv, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-
-    for row in reader:
-        geom = wkt.loads(row["geom_wkt"])
-
-        properties = {
-            "region_id": row["region_id"],
-            "region_name": row["region_name"],
-            "city": row["city"],
-            "region_type": row["region_type"],
-            "srid": int(row["srid"]),
-            "source": row["source"],
-        }
-
-        feature = {
-            "type": "Feature",
-            "geometry": mapping(geom),
-            "properties": properties,
-        }
-
-        features.append(feature)
-
-feature_collection = {
-    "type": "FeatureCollection",
-    "features": features,
-}
-
-with open(output_geojson, "w", encoding="utf-8") as f:
-    json.dump(feature_collection, f, ensure_ascii=False, indent=2)
+stats = main(["--csv", input_csv, "--output", output_geojson, "--format", "geojson"])
 
 print(f"GeoJSON generated: {output_geojson}")
-print(f"Features: {len(features)}")
\ No newline at end of file
+print(f"Features: {stats.features}")
@@ -0,0 +1,224 @@
+"""
+Answers "traffic in this bbox and time range" from the grid marts (mart_traffic_grid_hourly / _daily)
+instead of scanning readings: one query on the zoom + date partitions and a tile x/y range.
+
+    python scripts/grid_query.py --bbox=-3.80,40.35,-3.60,40.50 --start 2026-01-30 --end 2026-01-31
+    python scripts/grid_query.py --bbox=-3.80,40.35,-3.60,40.50 --start 2026-01-30T06:00 --end 2026-01-30T10:00
+
+Time range: dates are whole days, both included (daily mart); date-times are hours, end excluded
+(hourly mart; UTC unless the value has an offset). Zoom: --zoom, or the finest level of --zooms (the dbt var grid_zooms) for which the
+bbox spans at most --max-tiles tiles, so a zoomed-out map gets few large tiles and a zoomed-in one
+small tiles. Output: a GeoJSON FeatureCollection, one square per tile with its merged aggregates
+(avg speed / occupancy from sums and counts, distinct sensors from the HyperLogLog column).
+
+Tile math is Bing Maps' (the same as Trino's bing_tile_at): Web Mercator, 256 px tiles.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+try:
+    import trino
+except ImportError:  # optional: only needed to run the query (--sql-only prints it)
+    trino = None
+
+MAX_LATITUDE = 85.05112878
+DEFAULT_ZOOMS = (6, 9, 12, 15)  # dbt_project.yml vars.grid_zooms
+
+
+def tile_xy(lon: float, lat: float, zoom: int) -> tuple[int, int]:
+    """Tile containing the point (Bing Maps TileSystem, as Trino's bing_tile_at)."""
+    lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+    lon = min(max(lon, -180.0), 180.0)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180) / 360
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    map_size = 256 << zoom
+    pixel_x = min(max(x * map_size + 0.5, 0), map_size - 1)
+    pixel_y = min(max(y * map_size + 0.5, 0), map_size - 1)
+    return int(pixel_x) // 256, int(pixel_y) // 256
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a tile."""
+    n = 1 << zoom
+
+    def lat_at(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat_at(y + 1), (x + 1) / n * 360 - 180, lat_at(y)
+
+
+@dataclass(frozen=True)
+class TileRange:
+    zoom: int
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+    @classmethod
+    def of(cls, bbox: tuple[float, float, float, float], zoom: int) -> "TileRange":
+        min_lon, min_lat, max_lon, max_lat = bbox
+        x0, y0 = tile_xy(min_lon, max_lat, zoom)  # tile rows grow southwards
+        x1, y1 = tile_xy(max_lon, min_lat, zoom)
+        return cls(zoom, x0, y0, x1, y1)
+
+    @property
+    def tiles(self) -> int:
+        return (self.x1 - self.x0 + 1) * (self.y1 - self.y0 + 1)
+
+
+def pick_zoom(bbox: tuple[float, float, float, float], zooms: tuple[int, ...], max_tiles: int) -> TileRange:
+    """Finest stored zoom whose tile range stays within max_tiles (the coarsest one otherwise)."""
+    for zoom in sorted(zooms, reverse=True):
+        tiles = TileRange.of(bbox, zoom)
+        if tiles.tiles <= max_tiles:
+            return tiles
+    return TileRange.of(bbox, min(zooms))
+
+
+def parse_time(value: str) -> date | datetime:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def as_utc(value: date | datetime) -> datetime:
+    """Naive UTC date-time, as the marts' hours: a date is its midnight, a naive date-time is UTC."""
+    if type(value) is date:
+        return datetime.combine(value, datetime.min.time())
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def build_query(tiles: TileRange, start: date | datetime, end: date | datetime, schema: str) -> tuple[str, str]:
+    """(grain, SQL): the daily mart for whole days, the hourly one otherwise."""
+    if type(start) is date and type(end) is date:
+        grain = "daily"
+        time_filter = f"traffic_date between date '{start.isoformat()}' and date '{end.isoformat()}'"
+    else:
+        start, end = as_utc(start), as_utc(end)
+        grain = "hourly"
+        # The date bounds prune partitions; the hour bounds trim the first and last day
+        time_filter = (
+            f"traffic_date between date '{start.date().isoformat()}' and date '{end.date().isoformat()}'\n"
+            f"  and date_add('hour', traffic_hour, cast(traffic_date as timestamp))"
+            f" >= timestamp '{start.strftime('%Y-%m-%d %H:00:00')}'\n"
+            f"  and date_add('hour', traffic_hour, cast(traffic_date as timestamp))"
+            f" < timestamp '{end.strftime('%Y-%m-%d %H:%M:%S')}'"
+        )
+    sql = f"""select
+    quadkey,
+    tile_x,
+    tile_y,
+    sum(readings) as readings,
+    sum(vehicles_sum) as vehicles,
+    sum(speed_sum) / nullif(sum(speed_n), 0) as avg_speed_kmh,
+    sum(occupancy_sum) / nullif(sum(occupancy_n), 0) as avg_occupancy_pct,
+    max(congestion_max) as congestion_max,
+    sum(incidents) as incidents,
+    cardinality(merge(cast(sensors_hll as HyperLogLog))) as sensors
+from {schema}.mart_traffic_grid_{grain}
+where zoom = {tiles.zoom}
+  and {time_filter}
+  and tile_x between {tiles.x0} and {tiles.x1}
+  and tile_y between {tiles.y0} and {tiles.y1}
+group by quadkey, tile_x, tile_y"""
+    return grain, sql
+
+
+def to_feature_collection(rows: list[tuple], columns: list[str], zoom: int) -> dict:
+    features = []
+    for row in rows:
+        props = dict(zip(columns, row))
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(props["tile_x"], props["tile_y"], zoom)
+        features.append({
+            "type": "Feature",
+            "bbox": [min_lon, min_lat, max_lon, max_lat],
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]],
+            },
+            "properties": {"zoom": zoom, **props},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def query_grid(bbox: tuple[float, float, float, float], start: date | datetime, end: date | datetime,
+               conn, zoom: int | None = None, zooms: tuple[int, ...] = DEFAULT_ZOOMS, max_tiles: int = 1024,
+               schema: str = "hive.curated_s3") -> dict:
+    """FeatureCollection of the tiles of `bbox` with data in [start, end], read through a DB-API connection."""
+    tiles = TileRange.of(bbox, zoom) if zoom is not None else pick_zoom(bbox, zooms, max_tiles)
+    grain, sql = build_query(tiles, start, end, schema)
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    rows = cursor.fetchall()
+    result = to_feature_collection(rows, [col[0] for col in cursor.description], tiles.zoom)
+    # Foreign members: how the request was answered
+    result.update(zoom=tiles.zoom, grain=grain, tiles_in_bbox=tiles.tiles,
+                  query_ms=round((time.perf_counter() - started) * 1000, 1))
+    return result
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Traffic aggregates of a bbox and time range from the grid marts.")
+    parser.add_argument("--bbox", required=True, help="min_lon,min_lat,max_lon,max_lat (--bbox=... when it starts with a minus)")
+    parser.add_argument("--start", required=True, type=parse_time, help="YYYY-MM-DD (days) or YYYY-MM-DDTHH:MM (hours)")
+    parser.add_argument("--end", required=True, type=parse_time, help="last day (included) or end hour (excluded)")
+    parser.add_argument("--zoom", type=int, help="Tile zoom level (default: picked from the bbox)")
+    parser.add_argument("--zooms", default=",".join(map(str, DEFAULT_ZOOMS)), help="Zoom levels in the marts")
+    parser.add_argument("--max-tiles", type=int, default=1024, help="Tiles per answer when picking the zoom (default: 1024)")
+    parser.add_argument("--schema", default="hive.curated_s3")
+    parser.add_argument("--sql-only", action="store_true", help="Print the query instead of running it")
+    parser.add_argument("-o", "--output", help="GeoJSON file (default: stdout)")
+    parser.add_argument("--trino-host", default=os.getenv("TRINO_HOST", "localhost"))
+    parser.add_argument("--trino-port", type=int, default=int(os.getenv("TRINO_PORT", "8081")))
+    parser.add_argument("--trino-user", default=os.getenv("TRINO_USER", "poc"))
+    args = parser.parse_args(argv)
+    try:
+        args.bbox = tuple(float(v) for v in args.bbox.split(","))
+        args.zooms = tuple(int(v) for v in args.zooms.split(","))
+    except ValueError:
+        parser.error("--bbox needs 4 numbers and --zooms integers, comma separated")
+    if len(args.bbox) != 4 or args.bbox[0] > args.bbox[2] or args.bbox[1] > args.bbox[3]:
+        parser.error("--bbox must be min_lon,min_lat,max_lon,max_lat")
+    if as_utc(args.end) < as_utc(args.start):
+        parser.error("--end is before --start")
+    return args
+
+
+def main(argv: list[str] | None = None) -> dict | None:
+    args = parse_args(argv)
+    if args.sql_only:
+        tiles = TileRange.of(args.bbox, args.zoom) if args.zoom is not None else pick_zoom(args.bbox, args.zooms, args.max_tiles)
+        print(build_query(tiles, args.start, args.end, args.schema)[1])
+        return None
+    if trino is None:
+        raise SystemExit("querying Trino needs the `trino` package (pip install trino)")
+    conn = trino.dbapi.connect(host=args.trino_host, port=args.trino_port, user=args.trino_user)
+    try:
+        result = query_grid(args.bbox, args.start, args.end, conn, args.zoom, args.zooms, args.max_tiles, args.schema)
+    finally:
+        conn.close()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    else:
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: CPU cost vs bytes saved of RAW_COMPRESSION codecs/levels on the repo sample datasets.
+
+For each sample and codec/level it reports the compression ratio, the stored bytes and the
+compress / decompress throughput (MB/s of uncompressed data), using the same encoder the ingestors
+use (ingest_common.compression). The stream sample is one synthetic post, i.e. what the stream
+consumer writes per message: small objects compress far less than whole files.
+
+The committed samples are small; pass real exports with --files for representative numbers.
+
+Run from the repo root:
+    PYTHONPATH=services/common python services/common/bench/bench_compression.py [-n 200] [--files big.csv ...]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from ingest_common.compression import Compression, decode, zstandard
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+SAMPLES = [
+    REPO_ROOT / "analytics" / "dbt" / "poc_trino" / "exports" / "regions.geojson",
+    REPO_ROOT / "analytics" / "dbt" / "poc_trino" / "exports" / "regions_export.csv",
+    REPO_ROOT / "infra" / "mock" / "wiremock" / "__files" / "merchant_locations.json",
+]
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("zstd", 1), ("zstd", 3), ("zstd", 9), ("zstd", 19)]
+
+
+def stream_post() -> bytes:
+    # Shape of services/ingestor-stream/producer.py build_post(), as stored by the consumer
+    post = {
+        "dataset": "posts",
+        "source_event_id": "0b9f4c1e-7d3a-4d8e-9a57-2f1c6e0d4b21",
+        "event_time": "2026-01-24T09:12:34Z",
+        "text": "Roadworks causing slow traffic on the main avenue.",
+        "author": "simulator",
+        "location": {"lat": 41.6523, "lon": -4.7245},
+        "severity": "medium",
+    }
+    return json.dumps(post).encode("utf-8")
+
+
+def mb_per_s(nbytes: int, seconds: float) -> float:
+    return nbytes / seconds / 1e6 if seconds > 0 else float("inf")
+
+
+def measure(data: bytes, codec: Compression, n: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(n):
+        packed = codec.compress(data)
+    compress_s = (time.perf_counter() - started) / n
+
+    started = time.perf_counter()
+    for _ in range(n):
+        unpacked = b"".join(decode([packed], codec.codec))
+    decompress_s = (time.perf_counter() - started) / n
+    assert unpacked == data
+
+    return {
+        "stored": len(packed),
+        "ratio": len(data) / len(packed) if packed else 0.0,
+        "compress_mb_s": mb_per_s(len(data), compress_s),
+        "decompress_mb_s": mb_per_s(len(data), decompress_s),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=200, help="Repetitions per measurement")
+    parser.add_argument("--files", nargs="*", default=[], help="Extra files to measure (e.g. full-size exports)")
+    args = parser.parse_args()
+
+    levels = [(c, l) for c, l in LEVELS if c != "zstd" or zstandard is not None]
+    if len(levels) < len(LEVELS):
+        print("zstandard not installed: zstd levels skipped", file=sys.stderr)
+
+    samples = [(p.name, p.read_bytes()) for p in SAMPLES if p.exists()]
+    samples.append(("stream post (1 message)", stream_post()))
+    samples += [(Path(f).name, Path(f).read_bytes()) for f in args.files]
+
+    print(f"{'sample':<28} {'bytes':>10} {'codec':<8} {'stored':>10} {'ratio':>6} {'comp MB/s':>10} {'decomp MB/s':>12}")
+    for name, data in samples:
+        # Big inputs need fewer repetitions for a stable number
+        n = max(3, min(args.n, int(args.n * 1_000_000 / max(len(data), 1))))
+        for codec, level in levels:
+            r = measure(data, Compression(codec, level), n)
+            print(f"{name:<28} {len(data):>10} {codec + '-' + str(level):<8} {r['stored']:>10} {r['ratio']:>6.2f} "
+                  f"{r['compress_mb_s']:>10.1f} {r['decompress_mb_s']:>12.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
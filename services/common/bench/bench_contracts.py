@@ -0,0 +1,83 @@
+"""
+Micro-benchmark: per-event validation cost of the old code path vs the shared ContractRegistry.
+
+The old path (what validate_event_against_schema / validate_event did before) re-reads the schema and
+the envelope from disk, builds a RefResolver store and a new validator for every event.
+
+Run from the repo root:
+    PYTHONPATH=services/common python services/common/bench/bench_contracts.py [-n 2000]
+"""
+import argparse
+import json
+import time
+import warnings
+from pathlib import Path
+
+from jsonschema.validators import validator_for
+
+from ingest_common.contracts import ContractRegistry
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+EVENTS_DIR = REPO_ROOT / "contracts" / "events"
+EXAMPLES_DIR = REPO_ROOT / "contracts" / "examples"
+
+CASES = {
+    "ingest.file": ("ingest-file.v1.schema.json", "ingest-file.v1.json"),
+    "ingest.http": ("ingest-http.v1.schema.json", "ingest-http.v1.json"),
+    "ingest.stream": ("ingest-stream.v1.schema.json", "ingest-stream.v1.json"),
+}
+
+
+def legacy_validate(event: dict, schema_path: Path) -> bool:
+    from jsonschema import RefResolver
+
+    schema = json.loads(schema_path.read_text(encoding="utf-8"))
+    base_dir = schema_path.parent
+    store: dict[str, dict] = {}
+    envelope_path = base_dir / "envelope.v1.schema.json"
+    envelope_schema = json.loads(envelope_path.read_text(encoding="utf-8"))
+    store[envelope_schema["$id"]] = envelope_schema
+    store[envelope_path.resolve().as_uri()] = envelope_schema
+    store[schema["$id"]] = schema
+    store[schema_path.resolve().as_uri()] = schema
+    resolver = RefResolver(base_uri=base_dir.resolve().as_uri() + "/", referrer=schema, store=store)
+    validator = validator_for(schema)(schema, resolver=resolver)
+    return not list(validator.iter_errors(event))
+
+
+def per_event_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=2000, help="Events per measurement")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", DeprecationWarning)  # RefResolver is deprecated in jsonschema 4.18+
+
+    started = time.perf_counter()
+    registry = ContractRegistry(EVENTS_DIR)
+    registry.warm_up()
+    print(f"registry load + compile: {(time.perf_counter() - started) * 1000:.1f} ms ({len(registry.contracts)} contracts)")
+    print(f"{'event_type':<15} {'legacy us/ev':>13} {'is_valid us/ev':>15} {'validate_many us/ev':>20} {'speedup':>8}")
+
+    for event_type, (schema_file, example_file) in CASES.items():
+        schema_path = EVENTS_DIR / schema_file
+        event = json.loads((EXAMPLES_DIR / example_file).read_text(encoding="utf-8"))
+        assert legacy_validate(event, schema_path) and registry.is_valid(event), f"example for {event_type} is invalid"
+
+        legacy = per_event_us(lambda: legacy_validate(event, schema_path), max(1, args.n // 10))
+        fast = per_event_us(lambda: registry.is_valid(event), args.n)
+        batch = [event] * args.n
+        started = time.perf_counter()
+        registry.validate_many(batch)
+        many = (time.perf_counter() - started) / args.n * 1e6
+        print(f"{event_type:<15} {legacy:>13.1f} {fast:>15.1f} {many:>20.1f} {legacy / fast:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: JSON cost per event / per stream message, stdlib vs ingest_common.serialization.
+
+- "event dumps": encoding the contract examples to bytes, as the publisher does for every event.
+- "stream message": what the stream consumer does per source message. Before: json.loads of the
+  whole message and json.dumps back for the RAW payload. Now: one parse to read SOURCE_FIELDS,
+  and the message bytes are stored as they are.
+
+Run from the repo root:
+    PYTHONPATH=services/common python services/common/bench/bench_serialization.py [-n 20000]
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from ingest_common.serialization import BACKEND, dumps, loads
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+EXAMPLES_DIR = REPO_ROOT / "contracts" / "examples"
+SOURCE_FIELDS = ("dataset", "event_time", "source_event_id")  # as in services/ingestor-stream/consumer.py
+
+
+def per_item_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def legacy_message(value: bytes) -> bytes:
+    payload = json.loads(value.decode("utf-8"))
+    payload.get("dataset"), payload.get("event_time"), payload.get("source_event_id")
+    return json.dumps(payload).encode("utf-8")
+
+
+def passthrough_message(value: bytes) -> bytes:
+    doc = loads(value)
+    {name: doc.get(name) for name in SOURCE_FIELDS}
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=20000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    print(f"backend: {BACKEND}")
+    print(f"{'case':<28} {'stdlib us':>10} {'shared us':>10} {'speedup':>8}")
+
+    for path in sorted(EXAMPLES_DIR.glob("ingest-*.json")):
+        event = json.loads(path.read_text(encoding="utf-8"))
+        assert loads(dumps(event)) == event
+        old = per_item_us(lambda: json.dumps(event).encode("utf-8"), args.n)
+        new = per_item_us(lambda: dumps(event), args.n)
+        print(f"{'event dumps ' + path.stem:<28} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x")
+
+    post = {
+        "dataset": "posts",
+        "source_event_id": "0b9f4c1e-7d3a-4d8e-9a57-2f1c6e0d4b21",
+        "event_time": "2026-01-24T09:12:34Z",
+        "text": "Roadworks causing slow traffic on the main avenue.",
+        "author": "simulator",
+        "location": {"lat": 41.6523, "lon": -4.7245},
+        "severity": "medium",
+    }
+    value = json.dumps(post).encode("utf-8")
+    old = per_item_us(lambda: legacy_message(value), args.n)
+    new = per_item_us(lambda: passthrough_message(value), args.n)
+    print(f"{'stream message':<28} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Code shared by the ingestor services (copied into each image as the `ingest_common` package)."""
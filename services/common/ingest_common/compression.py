@@ -0,0 +1,205 @@
+"""
+Optional compression of RAW objects (gzip or zstd), shared by the three ingestors.
+
+Writers stream through an encoder, so compressing never needs the whole payload in memory:
+
+    codec = Compression.from_env()                       # RAW_COMPRESSION / RAW_COMPRESSION_LEVEL
+    counted = codec.encode(chunks)                       # iterator of compressed chunks
+    for part in rechunk(counted, part_size): ...         # fixed-size multipart parts
+    counted.raw_bytes, counted.stored_bytes              # sizes for the ingest event
+
+Objects get the codec suffix (`payload.json.gz`, `traffic.csv.zst`) and a matching Content-Encoding.
+The suffix is what Trino's Hive connector uses to decompress text files transparently; replay tools
+can use `decode()` / `open_raw_object()`, which pick the codec from the suffix or the
+Content-Encoding.
+
+Environment:
+    RAW_COMPRESSION        none (default) | gzip | zstd
+    RAW_COMPRESSION_LEVEL  codec level (gzip 1-9, default 6; zstd 1-22, default 3)
+"""
+from __future__ import annotations
+
+import io
+import os
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator
+
+try:
+    import zstandard
+except ImportError:  # only needed for RAW_COMPRESSION=zstd
+    zstandard = None
+
+CODECS = ("none", "gzip", "zstd")
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+@dataclass(frozen=True)
+class Compression:
+    codec: str = "none"
+    level: int | None = None
+
+    def __post_init__(self):
+        if self.codec not in CODECS:
+            raise SystemExit(f"RAW_COMPRESSION must be one of {', '.join(CODECS)} (got {self.codec!r})")
+        if self.codec == "zstd" and zstandard is None:
+            raise SystemExit("RAW_COMPRESSION=zstd requires the 'zstandard' package")
+
+    @classmethod
+    def from_env(cls) -> "Compression":
+        codec = os.getenv("RAW_COMPRESSION", "none").strip().lower() or "none"
+        level = os.getenv("RAW_COMPRESSION_LEVEL", "").strip()
+        return cls(codec, int(level) if level else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != "none"
+
+    @property
+    def suffix(self) -> str:
+        return SUFFIXES.get(self.codec, "")
+
+    @property
+    def content_encoding(self) -> str | None:
+        return self.codec if self.enabled else None
+
+    def object_key(self, key: str) -> str:
+        return key + self.suffix
+
+    def put_args(self) -> dict:
+        """Extra boto3 put_object / create_multipart_upload arguments."""
+        return {"ContentEncoding": self.content_encoding} if self.enabled else {}
+
+    def encode(self, chunks: Iterable[bytes]) -> "CountingStream":
+        return CountingStream(chunks, self)
+
+    def compress(self, data: bytes) -> bytes:
+        return b"".join(self.encode([data]))
+
+    def _encoder(self):
+        level = self.level if self.level is not None else DEFAULT_LEVELS.get(self.codec)
+        if self.codec == "gzip":
+            # wbits=31: gzip container, readable by gunzip / Trino / any HTTP client
+            return zlib.compressobj(level, zlib.DEFLATED, 31)
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=level).compressobj()
+        return None
+
+
+class CountingStream:
+    """Iterator of (optionally compressed) chunks that counts bytes in and out."""
+
+    def __init__(self, chunks: Iterable[bytes], compression: Compression):
+        self._chunks = chunks
+        self._encoder = compression._encoder()
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._chunks:
+            self.raw_bytes += len(chunk)
+            out = self._encoder.compress(chunk) if self._encoder is not None else chunk
+            if out:
+                self.stored_bytes += len(out)
+                yield out
+        if self._encoder is not None:
+            tail = self._encoder.flush()
+            if tail:
+                self.stored_bytes += len(tail)
+                yield tail
+
+
+class CompressingReader(io.RawIOBase):
+    """Read-only file object over `fileobj` that returns compressed bytes (for boto3 upload_fileobj)."""
+
+    def __init__(self, fileobj: BinaryIO, compression: Compression, chunk_size: int = 1024 * 1024):
+        self._stream = compression.encode(iter(lambda: fileobj.read(chunk_size), b""))
+        self._iter = iter(self._stream)
+        self._buf = bytearray()
+
+    @property
+    def raw_bytes(self) -> int:
+        return self._stream.raw_bytes
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._stream.stored_bytes
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buf) < size:
+            chunk = next(self._iter, None)
+            if chunk is None:
+                break
+            self._buf += chunk
+        if size < 0:
+            size = len(self._buf)
+        out = bytes(self._buf[:size])
+        del self._buf[:size]
+        return out
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+
+def rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Re-chunks a byte stream into `size` blocks (the last one may be shorter), e.g. multipart parts."""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+# ---- Readers ----
+
+def codec_for(key: str = "", content_encoding: str | None = None) -> str:
+    """Codec of a stored object, from its Content-Encoding or, failing that, its suffix."""
+    encoding = (content_encoding or "").strip().lower()
+    if encoding in ("gzip", "zstd"):
+        return encoding
+    for codec, suffix in SUFFIXES.items():
+        if key.endswith(suffix):
+            return codec
+    return "none"
+
+
+def decode(chunks: Iterable[bytes], codec: str) -> Iterator[bytes]:
+    """Streaming decompression of a stored object's chunks."""
+    if codec == "gzip":
+        decoder = zlib.decompressobj(31)
+        for chunk in chunks:
+            out = decoder.decompress(chunk)
+            if out:
+                yield out
+        tail = decoder.flush()
+        if tail:
+            yield tail
+    elif codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("reading .zst objects requires the 'zstandard' package")
+        decoder = zstandard.ZstdDecompressor().decompressobj()
+        for chunk in chunks:
+            out = decoder.decompress(chunk)
+            if out:
+                yield out
+    else:
+        yield from chunks
+
+
+def open_raw_object(s3, bucket: str, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Uncompressed content of a RAW object (boto3 client), whatever codec it was written with."""
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+    try:
+        yield from decode(iter(lambda: body.read(chunk_size), b""), codec_for(key, obj.get("ContentEncoding")))
+    finally:
+        body.close()
@@ -0,0 +1,202 @@
+"""
+Contract registry: every JSON Schema under contracts/events/ is loaded, resolved and compiled once.
+
+Validators are cached by (event_type, major schema_version), so validating an event in a loop or
+a stream costs one dict lookup plus the validation itself (no disk reads, no RefResolver store).
+
+Whole-document $refs (the envelope) are inlined at load time. When `fastjsonschema` is installed the
+inlined schema is compiled to Python code for the `is_valid` fast path; jsonschema is still used to
+report error messages, so both agree (formats are not asserted by either, as before).
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable
+from urllib.parse import urljoin
+
+from jsonschema.validators import validator_for
+from referencing import Registry, Resource
+
+try:
+    import fastjsonschema
+except ImportError:  # optional accelerator
+    fastjsonschema = None
+
+_VERSIONED_FILE = re.compile(r"\.v(\d+)\.schema\.json$")
+
+
+class ContractValidationError(ValueError):
+    def __init__(self, event_type: str, errors: list[str]):
+        self.event_type = event_type
+        self.errors = errors
+        super().__init__(f"{event_type} event failed contract validation: {'; '.join(errors)}")
+
+
+class UnknownContractError(KeyError):
+    pass
+
+
+class ContractRegistry:
+    def __init__(self, events_dir: str | Path):
+        self.events_dir = Path(events_dir)
+        if not self.events_dir.is_dir():
+            raise SystemExit(f"Contracts directory not found: {self.events_dir}")
+
+        resources: list[tuple[str, Resource]] = []
+        documents: dict[str, dict] = {}
+        # (event_type, major) -> schema document
+        self._schemas: dict[tuple[str, int], dict] = {}
+
+        for path in sorted(self.events_dir.glob("*.schema.json")):
+            schema = json.loads(path.read_text(encoding="utf-8"))
+            resource = Resource.from_contents(schema)
+            # Map by $id (https://example.local/...) and by file:// URI so both kinds of $ref resolve locally
+            for uri in (schema.get("$id"), path.resolve().as_uri()):
+                if uri:
+                    resources.append((uri, resource))
+                    documents[uri] = schema
+
+            event_type = _declared_event_type(schema)
+            m = _VERSIONED_FILE.search(path.name)
+            if event_type is not None and m is not None:
+                self._schemas[(event_type, int(m.group(1)))] = schema
+
+        self._documents = documents
+        self._registry = Registry().with_resources(resources).crawl()
+        self._validators: dict[tuple[str, int], object] = {}
+        self._checks: dict[tuple[str, int], Callable[[dict], bool]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def contracts(self) -> list[tuple[str, int]]:
+        return sorted(self._schemas)
+
+    def validator(self, event_type: str, schema_version: str = "1.0.0"):
+        key = (event_type, _major(schema_version))
+        validator = self._validators.get(key)
+        if validator is not None:
+            return validator
+
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is None:
+                schema = self._schemas.get(key)
+                if schema is None:
+                    raise UnknownContractError(f"No contract for event_type={event_type!r} schema_version={schema_version!r}")
+                inlined = _inline_refs(schema, schema.get("$id", ""), self._documents)
+                cls = validator_for(schema)
+                validator = cls(inlined, registry=self._registry)
+                self._checks[key] = _compile_check(inlined, validator)
+                self._validators[key] = validator
+        return validator
+
+    def check(self, event_type: str, schema_version: str = "1.0.0") -> Callable[[dict], bool]:
+        """Compiled `event -> bool` predicate for a contract."""
+        key = (event_type, _major(schema_version))
+        check = self._checks.get(key)
+        if check is None:
+            self.validator(event_type, schema_version)
+            check = self._checks[key]
+        return check
+
+    def warm_up(self) -> None:
+        """Compile every known validator now instead of on first use."""
+        for event_type, major in self.contracts:
+            self.validator(event_type, f"{major}.0.0")
+
+    def is_valid(self, event: dict) -> bool:
+        """Fast path: stops at the first error and does not build messages."""
+        try:
+            check = self.check(event.get("event_type", ""), event.get("schema_version", "1.0.0"))
+        except UnknownContractError:
+            return False
+        return check(event)
+
+    def errors(self, event: dict) -> list[str]:
+        try:
+            validator = self.validator(event.get("event_type", ""), event.get("schema_version", "1.0.0"))
+        except UnknownContractError as e:
+            return [str(e)]
+        errors = sorted(validator.iter_errors(event), key=lambda e: list(e.path))
+        return [f"{'.'.join(str(p) for p in err.path) or '<root>'}: {err.message}" for err in errors]
+
+    def validate(self, event: dict) -> None:
+        if self.is_valid(event):
+            return
+        raise ContractValidationError(str(event.get("event_type")), self.errors(event))
+
+    def is_valid_many(self, events: Iterable[dict]) -> list[bool]:
+        return [self.is_valid(ev) for ev in events]
+
+    def validate_many(self, events: Iterable[dict]) -> list[list[str]]:
+        """Error messages per event (empty list = valid); only invalid events pay for error reporting."""
+        return [[] if self.is_valid(ev) else self.errors(ev) for ev in events]
+
+
+def _declared_event_type(schema: dict) -> str | None:
+    """event_type const of a per-type schema ({"allOf": [envelope, {"properties": {"event_type": {"const": ...}}}]})."""
+    for part in [schema, *schema.get("allOf", [])]:
+        const = part.get("properties", {}).get("event_type", {}).get("const")
+        if isinstance(const, str):
+            return const
+    return None
+
+
+def _inline_refs(node, base_uri: str, documents: dict[str, dict]):
+    """Copy of `node` where every whole-document $ref known to the registry is replaced by that document."""
+    if isinstance(node, list):
+        return [_inline_refs(item, base_uri, documents) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    ref = node.get("$ref")
+    if isinstance(ref, str) and "#" not in ref:
+        target_uri = urljoin(base_uri, ref)
+        target = documents.get(target_uri)
+        if target is not None and len(node) == 1:
+            inlined = {k: v for k, v in copy.deepcopy(target).items() if k not in ("$id", "$schema")}
+            return _inline_refs(inlined, target.get("$id", target_uri), documents)
+
+    return {k: _inline_refs(v, base_uri, documents) for k, v in node.items()}
+
+
+def _compile_check(inlined: dict, validator) -> Callable[[dict], bool]:
+    if fastjsonschema is None or "$ref" in json.dumps(inlined):
+        return validator.is_valid
+
+    compiled = fastjsonschema.compile(inlined, use_default=False, use_formats=False)
+
+    def check(event: dict) -> bool:
+        try:
+            compiled(event)
+            return True
+        except fastjsonschema.JsonSchemaException:
+            return False
+
+    return check
+
+
+def _major(schema_version: str) -> int:
+    head = str(schema_version).split(".", 1)[0]
+    return int(head) if head.isdigit() else -1
+
+
+def default_events_dir() -> Path:
+    return Path(os.getenv("CONTRACTS_DIR", "/contracts/events"))
+
+
+@lru_cache(maxsize=None)
+def _registry_for(events_dir: str) -> ContractRegistry:
+    return ContractRegistry(events_dir)
+
+
+def get_registry(events_dir: str | Path | None = None) -> ContractRegistry:
+    """Process-wide registry for a contracts directory (built on first use)."""
+    path = Path(events_dir) if events_dir is not None else default_events_dir()
+    return _registry_for(str(path.resolve()))
@@ -0,0 +1,155 @@
+"""
+Registers the partitions of new RAW objects in the Hive metastore, through Trino.
+
+The RAW external tables (analytics/dbt/poc_trino/models/sources.yml) are partitioned, so a query on
+one `dt` lists and reads only that day's objects instead of every file under the table. A partition
+only exists once it is in the metastore; the ingestor registers it right after the upload:
+
+    registrar = PartitionRegistrar.from_env()    # None when HIVE_REGISTER_PARTITIONS is off
+    registrar.register("traffic_csv", {"dt": "2026-01-30", "sha256": sha},
+                       "s3://raw/source=file/dt=2026-01-30/<sha>/")
+    registrar.register("traffic_parquet", {"dt": "2026-01-30"})   # default location: <table>/dt=2026-01-30
+
+`CALL <catalog>.system.register_partition` needs `hive.allow-register-partition-procedure=true` in
+the catalog. A partition that already exists is not an error (same file again, retry after a
+failure), and partitions registered by this process are remembered, so each costs one call.
+A registration that fails (Trino or the metastore down) still raises, but is kept and retried by
+`retry_failed()`; the ingestor calls it before each file's registrations, so an outage only delays
+them. Failures still pending when the process exits are registered when the file is ingested again.
+
+Environment:
+    HIVE_REGISTER_PARTITIONS  (default false)
+    HIVE_PARTITION_TABLES     (default "traffic=traffic_csv") dataset -> RAW table of its source copies
+    HIVE_CATALOG              (default hive)
+    HIVE_RAW_SCHEMA           (default raw_s3)
+    TRINO_HOST / TRINO_PORT / TRINO_USER  (default trino / 8080 / ingestor)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass, field
+
+try:
+    import trino
+except ImportError:  # optional: only needed with HIVE_REGISTER_PARTITIONS
+    trino = None
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def parse_tables(spec: str) -> dict[str, str]:
+    """"dataset=table,dataset=table" -> {dataset: table}."""
+    tables = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        dataset, sep, table = item.partition("=")
+        if not sep or not dataset.strip() or not table.strip():
+            raise SystemExit(f"HIVE_PARTITION_TABLES: expected 'dataset=table' entries, got {item!r}")
+        tables[dataset.strip()] = table.strip()
+    return tables
+
+
+@dataclass(frozen=True)
+class PartitionConfig:
+    host: str = "trino"
+    port: int = 8080
+    user: str = "ingestor"
+    catalog: str = "hive"
+    schema: str = "raw_s3"
+    tables: dict[str, str] = field(default_factory=lambda: {"traffic": "traffic_csv"})
+
+    @classmethod
+    def from_env(cls) -> "PartitionConfig":
+        return cls(
+            host=os.getenv("TRINO_HOST", "trino"),
+            port=int(os.getenv("TRINO_PORT", "8080")),
+            user=os.getenv("TRINO_USER", "ingestor"),
+            catalog=os.getenv("HIVE_CATALOG", "hive"),
+            schema=os.getenv("HIVE_RAW_SCHEMA", "raw_s3"),
+            tables=parse_tables(os.getenv("HIVE_PARTITION_TABLES", "traffic=traffic_csv")),
+        )
+
+
+class PartitionRegistrar:
+    def __init__(self, config: PartitionConfig):
+        if trino is None:
+            raise SystemExit("HIVE_REGISTER_PARTITIONS needs the trino client (pip install trino)")
+        self.config = config
+        self._known: set[tuple[str, tuple]] = set()
+        # Registrations that failed, in order: key -> (table, partition, location)
+        self._failed: dict[tuple[str, tuple], tuple[str, dict[str, str], str | None]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_env(cls) -> "PartitionRegistrar | None":
+        if os.getenv("HIVE_REGISTER_PARTITIONS", "false").strip().lower() not in ("1", "true", "yes"):
+            return None
+        return cls(PartitionConfig.from_env())
+
+    def table_for(self, dataset: str) -> str | None:
+        """RAW table holding the source copies of `dataset`, if it has one."""
+        return self.config.tables.get(dataset)
+
+    def register(self, table: str, partition: dict[str, str], location: str | None = None) -> bool:
+        """Adds the partition (columns in table order) unless it exists; True if it was added now."""
+        key = (table, tuple(partition.items()))
+        if key in self._known:
+            return False
+        args = [
+            f"schema_name => {_quote(self.config.schema)}",
+            f"table_name => {_quote(table)}",
+            f"partition_columns => ARRAY[{', '.join(_quote(c) for c in partition)}]",
+            f"partition_values => ARRAY[{', '.join(_quote(v) for v in partition.values())}]",
+        ]
+        if location is not None:
+            args.append(f"location => {_quote(location)}")
+        sql = f"CALL {self.config.catalog}.system.register_partition({', '.join(args)})"
+        # One connection, one statement at a time: registrations are rare next to uploads
+        with self._lock:
+            added = True
+            try:
+                cursor = self._connection().cursor()
+                cursor.execute(sql)
+                cursor.fetchall()
+            except trino.exceptions.TrinoUserError as e:
+                if e.error_name != "ALREADY_EXISTS":
+                    self._failed[key] = (table, dict(partition), location)
+                    raise
+                added = False
+            except Exception:
+                self._failed[key] = (table, dict(partition), location)
+                raise
+            self._failed.pop(key, None)
+            self._known.add(key)
+        return added
+
+    def retry_failed(self) -> int:
+        """Retries the registrations that failed, oldest first, until one fails again; returns how many are left."""
+        with self._lock:
+            failed = list(self._failed.values())
+        for table, partition, location in failed:
+            try:
+                self.register(table, partition, location)
+            except Exception:
+                break
+        return len(self._failed)
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = trino.dbapi.connect(
+                host=self.config.host,
+                port=self.config.port,
+                user=self.config.user,
+                catalog=self.config.catalog,
+                schema=self.config.schema,
+            )
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,189 @@
+"""
+Long-lived, batched Kafka publisher shared by the ingestors.
+
+One librdkafka producer per process: messages are queued with `publish()`, which returns a
+`concurrent.futures.Future` resolved by the delivery report. librdkafka groups messages per
+partition (linger / batch size / compression), so many events share one broker round trip instead
+of paying a connect + flush each.
+
+A background thread serves delivery callbacks, so callers can:
+  - block on one message:       publisher.publish(topic, event).result(timeout=10)
+  - pipeline and collect later: futures = publisher.publish_many(topic, events); wait(futures)
+  - await from asyncio:         await asyncio.wrap_future(publisher.publish(topic, event))
+
+`get_publisher()` returns the process-wide instance and registers `close()` with atexit so queued
+messages are drained on shutdown; long-running services can also call `close()` from their own
+signal handling.
+
+Environment (all optional):
+    KAFKA_LINGER_MS           (default 20)      time to wait for more messages before sending a batch
+    KAFKA_BATCH_SIZE          (default 1048576) max bytes per partition batch
+    KAFKA_COMPRESSION         (default zstd)    none | gzip | snappy | lz4 | zstd
+    KAFKA_ENABLE_IDEMPOTENCE  (default true)    no duplicates / reordering on producer retries (forces acks=all)
+    KAFKA_ACKS                (default all)
+    KAFKA_DELIVERY_TIMEOUT_MS (default 30000)   local queue + retries budget per message
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from confluent_kafka import KafkaError, Producer
+
+from ingest_common.log import get_logger
+from ingest_common.serialization import dumps
+
+
+class KafkaDeliveryError(RuntimeError):
+    def __init__(self, error: KafkaError):
+        self.error = error
+        super().__init__(f"Kafka delivery failed: {error}")
+
+
+@dataclass(frozen=True)
+class Delivery:
+    topic: str
+    partition: int
+    offset: int
+
+
+@dataclass(frozen=True)
+class PublisherConfig:
+    bootstrap_servers: str
+    client_id: str
+    linger_ms: int = 20
+    batch_size: int = 1024 * 1024
+    compression: str = "zstd"
+    idempotent: bool = True
+    acks: str = "all"
+    delivery_timeout_ms: int = 30000
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls, client_id: str, bootstrap_servers: str) -> "PublisherConfig":
+        return cls(
+            bootstrap_servers=bootstrap_servers,
+            client_id=client_id,
+            linger_ms=int(os.getenv("KAFKA_LINGER_MS", "20")),
+            batch_size=int(os.getenv("KAFKA_BATCH_SIZE", str(1024 * 1024))),
+            compression=os.getenv("KAFKA_COMPRESSION", "zstd").strip().lower(),
+            idempotent=os.getenv("KAFKA_ENABLE_IDEMPOTENCE", "true").strip().lower() in ("1", "true", "yes"),
+            acks=os.getenv("KAFKA_ACKS", "all").strip(),
+            delivery_timeout_ms=int(os.getenv("KAFKA_DELIVERY_TIMEOUT_MS", "30000")),
+        )
+
+    def to_librdkafka(self) -> dict:
+        conf = {
+            "bootstrap.servers": self.bootstrap_servers,
+            "client.id": self.client_id,
+            "linger.ms": self.linger_ms,
+            "batch.size": self.batch_size,
+            "compression.type": self.compression,
+            "enable.idempotence": self.idempotent,
+            "acks": "all" if self.idempotent else self.acks,
+            "delivery.timeout.ms": self.delivery_timeout_ms,
+            # Make broker outages visible fast in a POC
+            "socket.timeout.ms": 5000,
+        }
+        conf.update(self.extra)
+        return conf
+
+
+class KafkaPublisher:
+    def __init__(self, config: PublisherConfig):
+        self.config = config
+        self._producer = Producer(config.to_librdkafka())
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.failed = 0
+        # Delivery callbacks only run inside poll()/flush(): serve them continuously
+        self._poller = threading.Thread(target=self._poll_loop, name="kafka-publisher-poll", daemon=True)
+        self._poller.start()
+
+    def publish(self, topic: str, value: dict | bytes, key: str | bytes | None = None, headers: dict | None = None) -> Future:
+        """Queue one message; the future resolves to a `Delivery` or raises `KafkaDeliveryError`."""
+        if self._closed.is_set():
+            raise RuntimeError("KafkaPublisher is closed")
+        if isinstance(value, dict):
+            value = dumps(value)
+
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+
+        def on_delivery(err, msg):
+            if err is not None:
+                with self._lock:
+                    self.failed += 1
+                future.set_exception(KafkaDeliveryError(err))
+            else:
+                with self._lock:
+                    self.delivered += 1
+                future.set_result(Delivery(msg.topic(), msg.partition(), msg.offset()))
+
+        while True:
+            try:
+                self._producer.produce(topic=topic, key=key, value=value, headers=headers, on_delivery=on_delivery)
+                return future
+            except BufferError:
+                # Local queue full: back-pressure until librdkafka has sent some batches
+                self._producer.poll(0.1)
+
+    def publish_many(self, topic: str, events: list[dict], key_field: str = "idempotency_key") -> list[Future]:
+        return [self.publish(topic, ev, key=ev.get(key_field)) for ev in events]
+
+    def check(self, timeout: float = 5) -> bool:
+        """Broker reachable (metadata request); librdkafka reconnects by itself, this only reports."""
+        try:
+            self._producer.list_topics(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def flush(self, timeout: float = 10) -> int:
+        """Wait for queued messages; returns how many are still undelivered."""
+        return self._producer.flush(timeout)
+
+    def close(self, timeout: float = 10) -> int:
+        """Drain queued messages and stop the poll thread (idempotent)."""
+        if self._closed.is_set():
+            return 0
+        self._closed.set()
+        remaining = self._producer.flush(timeout)
+        self._poller.join(timeout=1)
+        if remaining:
+            get_logger(self.config.client_id).warning("kafka publisher closed with undelivered messages", remaining=remaining)
+        return remaining
+
+    def _poll_loop(self) -> None:
+        while not self._closed.is_set():
+            self._producer.poll(0.1)
+
+
+_publisher: KafkaPublisher | None = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher(config: PublisherConfig | None = None) -> KafkaPublisher:
+    """
+    Process-wide publisher, built from `config` on first call (later configs are ignored). Once it
+    is closed the next call builds a new one, from `config` or else the closed one's config.
+    """
+    global _publisher
+    publisher = _publisher
+    if publisher is not None and not publisher.closed:
+        return publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher.closed:
+            if config is None and _publisher is None:
+                raise RuntimeError("get_publisher() needs a PublisherConfig on first use")
+            _publisher = KafkaPublisher(config or _publisher.config)
+            atexit.register(_publisher.close)
+    return _publisher
@@ -0,0 +1,280 @@
+"""
+JSON-line logging for the ingestors, kept off the hot path.
+
+    log = get_logger("ingestor-stream", rate_limits={"ingest.stream done": 20})   # process-wide
+    log.info("ingest.stream done", kafka_topic="t", partition=0, offset=42)
+    log.error("ingestor-http error", error=str(e))       # warnings / errors are never sampled
+    with log_context(poll_id="..."):                     # added to every line of this thread / task
+        ...
+
+Lines are queued and written to stdout by one writer thread, so a caller pays for a dict and a
+queue put, not for encoding and a blocking write. Each line stays one JSON object with `msg` plus
+`ts`, `level` and `service` (and `trace_id` / `span_id` inside an OpenTelemetry span), which is
+what Loki's json parsing expects.
+
+Per message type (`msg`), info lines can be sampled (keep a fraction) and rate limited (lines per
+second). What is not written still counts: every LOG_SUMMARY_SECONDS in which lines were left
+out, a `log.summary` line gives, per message type, how many lines there were and how many were
+written, the error count, lines dropped on a full queue, and the offset range seen per
+`topic[partition]` (from the `offset`, `first_offset` and `last_offset` fields).
+
+Environment (entries override the defaults passed to get_logger):
+    LOG_SAMPLE           e.g. "ingest.stream done=0.01,delivered=0"
+    LOG_RATE_LIMIT       e.g. "ingest.stream done=20"          lines per second
+    LOG_SUMMARY_SECONDS  (default 10; 0 = no summaries)
+    LOG_QUEUE_SIZE       (default 10000) lines waiting for the writer; beyond that they are dropped
+    LOG_ASYNC            (default true) false writes on the caller thread
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from ingest_common.serialization import dumps
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional: no trace fields without the OpenTelemetry API
+    trace = None
+
+OFFSET_FIELDS = ("offset", "first_offset", "last_offset")
+WRITE_BATCH = 512
+
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("ingest_log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Correlation fields (run / poll / event ids) added to every line logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def parse_limits(spec: str, name: str) -> dict[str, float]:
+    """"msg=value,msg=value" -> {msg: value}; message types may contain spaces and dots."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        msg, _, value = item.rpartition("=")
+        try:
+            if not msg.strip():
+                raise ValueError
+            limits[msg.strip()] = float(value)
+        except ValueError:
+            raise SystemExit(f"{name}: expected 'message=number' entries, got {item!r}") from None
+    return limits
+
+
+class _Bucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = self.capacity = max(1.0, rate)
+        self.at = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _Summary:
+    """Counters of one interval (guarded by the logger lock)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lines: dict[str, list[int]] = {}  # msg -> [count, written]
+        self.errors = 0
+        self.dropped = 0
+        self.offsets: dict[str, list[int]] = {}  # "topic[partition]" -> [min, max]
+
+    def add(self, msg: str, level: str, fields: dict, written: bool) -> None:
+        counts = self.lines.get(msg)
+        if counts is None:
+            counts = self.lines[msg] = [0, 0]
+        counts[0] += 1
+        counts[1] += written
+        if level == "error":
+            self.errors += 1
+        partition = fields.get("partition")
+        if partition is None:
+            return
+        offsets = [fields[f] for f in OFFSET_FIELDS if isinstance(fields.get(f), int)]
+        if offsets:
+            tp = f"{fields.get('kafka_topic') or fields.get('topic')}[{partition}]"
+            seen = self.offsets.get(tp)
+            low, high = min(offsets), max(offsets)
+            if seen is None:
+                self.offsets[tp] = [low, high]
+            else:
+                seen[0], seen[1] = min(seen[0], low), max(seen[1], high)
+
+    def record(self) -> dict | None:
+        """None when every line of the interval was written: the log already holds all of it."""
+        if not self.dropped and all(c == w for c, w in self.lines.values()):
+            return None
+        return {
+            "msg": "log.summary",
+            "interval_s": round(time.monotonic() - self.started, 1),
+            "lines": {msg: {"count": c, "written": w} for msg, (c, w) in self.lines.items()},
+            "errors": self.errors,
+            "dropped": self.dropped,
+            **({"offsets": self.offsets} if self.offsets else {}),
+        }
+
+
+class IngestLogger:
+    def __init__(self, service: str, sample: dict[str, float] | None = None, rate_limits: dict[str, float] | None = None,
+                 summary_seconds: float = 10.0, queue_size: int = 10000, asynchronous: bool = True):
+        self.service = service
+        self.sample = dict(sample or {})
+        self.rate_limits = dict(rate_limits or {})
+        self.summary_seconds = summary_seconds
+        self._buckets = {msg: _Bucket(rate) for msg, rate in self.rate_limits.items()}
+        self._summary = _Summary()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+        self.queue_size = max(1, queue_size)
+        self._queue: queue.SimpleQueue | None = queue.SimpleQueue() if asynchronous else None
+        self._writer = None
+        if self._queue is not None or summary_seconds > 0:
+            self._writer = threading.Thread(target=self._write_loop, name="ingest-log-writer", daemon=True)
+            self._writer.start()
+
+    @classmethod
+    def from_env(cls, service: str, sample: dict[str, float] | None = None,
+                 rate_limits: dict[str, float] | None = None) -> "IngestLogger":
+        return cls(
+            service,
+            sample={**(sample or {}), **parse_limits(os.getenv("LOG_SAMPLE", ""), "LOG_SAMPLE")},
+            rate_limits={**(rate_limits or {}), **parse_limits(os.getenv("LOG_RATE_LIMIT", ""), "LOG_RATE_LIMIT")},
+            summary_seconds=max(0.0, float(os.getenv("LOG_SUMMARY_SECONDS", "10"))),
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            asynchronous=os.getenv("LOG_ASYNC", "true").lower() == "true",
+        )
+
+    def info(self, msg: str, **fields) -> None:
+        self.log("info", msg, fields)
+
+    def warning(self, msg: str, **fields) -> None:
+        self.log("warning", msg, fields)
+
+    def error(self, msg: str, **fields) -> None:
+        self.log("error", msg, fields)
+
+    def log(self, level: str, msg: str, fields: dict) -> None:
+        with self._lock:
+            write = level != "info" or self._keep(msg)
+            self._summary.add(msg, level, fields, write)
+        if not write:
+            return
+        line = {"ts": time.time(), "level": level, "service": self.service, "msg": msg, **_context.get(), **fields}
+        if trace is not None:
+            span = trace.get_current_span().get_span_context()
+            if span.is_valid:
+                line["trace_id"] = format(span.trace_id, "032x")
+                line["span_id"] = format(span.span_id, "016x")
+        if self._queue is None or self._closed:
+            self._write([line])
+            return
+        if self._queue.qsize() >= self.queue_size:
+            with self._lock:
+                self._summary.dropped += 1
+            return
+        self._queue.put(line)
+
+    def _keep(self, msg: str) -> bool:
+        rate = self.sample.get(msg)
+        if rate is not None and (rate <= 0 or random.random() >= rate):
+            return False
+        bucket = self._buckets.get(msg)
+        return bucket is None or bucket.allow()
+
+    def summarize(self) -> None:
+        """Writes the summary of the interval so far and starts a new one."""
+        with self._lock:
+            summary, self._summary = self._summary, _Summary()
+        record = summary.record()
+        if record is not None:
+            self._write([{"ts": time.time(), "level": "info", "service": self.service, **record}])
+
+    def _write_loop(self) -> None:
+        next_summary = time.monotonic() + self.summary_seconds if self.summary_seconds > 0 else None
+        while True:
+            timeout = 1.0 if next_summary is None else max(0.0, next_summary - time.monotonic())
+            lines, stop = [], False
+            if self._queue is None:
+                stop = self._stop.wait(timeout)
+            else:
+                try:
+                    item = self._queue.get(timeout=timeout)
+                    while item is not None:
+                        lines.append(item)
+                        if len(lines) >= WRITE_BATCH:
+                            break
+                        item = self._queue.get_nowait()
+                    stop = item is None
+                except queue.Empty:
+                    pass
+            if lines:
+                self._write(lines)
+            if next_summary is not None and time.monotonic() >= next_summary:
+                self.summarize()
+                next_summary = time.monotonic() + self.summary_seconds
+            if stop:
+                return
+
+    def _write(self, lines: list[dict]) -> None:
+        for line in lines:
+            line["ts"] = datetime.fromtimestamp(line["ts"], timezone.utc).isoformat(timespec="milliseconds")
+        text = "".join(dumps(line).decode("utf-8") + "\n" for line in lines)
+        with self._write_lock:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def close(self, timeout: float = 5) -> None:
+        """Writes what is queued and the last summary."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._writer is not None:
+            if self._queue is not None:
+                self._queue.put(None)
+            self._writer.join(timeout)
+        if self.summary_seconds > 0:
+            self.summarize()
+
+
+_logger: IngestLogger | None = None
+_logger_lock = threading.Lock()
+
+
+def get_logger(service: str | None = None, sample: dict[str, float] | None = None,
+               rate_limits: dict[str, float] | None = None) -> IngestLogger:
+    """Process-wide logger, built from the environment on first call (later arguments are ignored)."""
+    global _logger
+    if _logger is not None:
+        return _logger
+    with _logger_lock:
+        if _logger is None:
+            if service is None:
+                raise RuntimeError("get_logger() needs a service name on first use")
+            _logger = IngestLogger.from_env(service, sample, rate_limits)
+            atexit.register(_logger.close)
+    return _logger
@@ -0,0 +1,188 @@
+"""
+Ingest metrics shared by the three ingestors, exported with OpenTelemetry.
+
+    metrics = get_metrics("ingestor-http")          # process-wide, like get_publisher()
+    with metrics.stage("fetch", dataset="x"):       # stage latency; a raised exception counts as a failure
+        ...
+    metrics.observe("publish", seconds, dataset="x")
+    metrics.processed(nbytes, dataset="x")          # one event / unit done, and its bytes
+    metrics.failed("upload", dataset="x")
+    with metrics.in_flight(dataset="x"):            # units being worked on
+        ...
+    metrics.gauge("ingest.consumer.lag", "Messages behind the high watermark", read)  # read() -> [(value, attrs)]
+
+Names as they reach Prometheus (through the collector): ingest_events_total, ingest_bytes_total,
+ingest_failures_total, ingest_stage_duration_seconds (histogram), ingest_in_flight and any gauge
+(e.g. ingest_consumer_lag). Every point carries a `service` label.
+
+Environment:
+    METRICS_EXPORTER   otlp | prometheus | none   (default: otlp if OTEL_EXPORTER_OTLP_ENDPOINT is set, else none)
+                       otlp pushes over OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT every
+                       OTEL_METRIC_EXPORT_INTERVAL ms; prometheus serves /metrics on METRICS_PORT
+                       (needs opentelemetry-exporter-prometheus)
+    METRICS_PORT       (default 9464)
+
+Without the OpenTelemetry SDK, or with METRICS_EXPORTER=none, every instrument is a no-op, so
+instrumented code costs a method call.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from ingest_common.log import get_logger
+
+try:
+    from opentelemetry.metrics import Observation
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+    from opentelemetry.sdk.resources import Resource
+except ImportError:  # optional: metrics are no-ops without the SDK
+    MeterProvider = None
+
+EXPORTERS = ("otlp", "prometheus", "none")
+# Seconds: from a small S3 PUT / Kafka ack up to a multi-GB upload
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+GaugeReader = Callable[[], Iterable[tuple[float, dict]]]
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    exporter: str = "none"
+    port: int = 9464
+
+    @classmethod
+    def from_env(cls) -> "MetricsConfig":
+        default = "otlp" if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") else "none"
+        exporter = os.getenv("METRICS_EXPORTER", default).strip().lower()
+        if exporter not in EXPORTERS:
+            raise SystemExit(f"METRICS_EXPORTER must be one of {', '.join(EXPORTERS)}")
+        return cls(exporter=exporter, port=int(os.getenv("METRICS_PORT", "9464")))
+
+
+class _NoopInstrument:
+    def add(self, amount, attributes=None) -> None:
+        pass
+
+    def record(self, amount, attributes=None) -> None:
+        pass
+
+
+class IngestMetrics:
+    def __init__(self, service: str, config: MetricsConfig = MetricsConfig()):
+        self.service = service
+        self._provider = None
+        meter = None
+        if config.exporter != "none":
+            if MeterProvider is None:
+                get_logger(service).warning("metrics disabled: opentelemetry-sdk not installed")
+            else:
+                self._provider = _build_provider(service, config)
+                meter = self._provider.get_meter("ingest_common")
+        self.enabled = meter is not None
+        self._meter = meter
+
+        if meter is None:
+            noop = _NoopInstrument()
+            self._events = self._bytes = self._failures = self._in_flight = self._duration = noop
+            return
+        self._events = meter.create_counter("ingest.events", unit="{event}", description="Units ingested (events published, files, batches)")
+        self._bytes = meter.create_counter("ingest.bytes", unit="By", description="Payload bytes ingested (uncompressed)")
+        self._failures = meter.create_counter("ingest.failures", unit="{failure}", description="Failed units, by stage")
+        self._in_flight = meter.create_up_down_counter("ingest.in_flight", unit="{unit}", description="Units being processed")
+        self._duration = meter.create_histogram("ingest.stage.duration", unit="s", description="Duration of one stage of one unit")
+
+    def _attrs(self, attrs: dict) -> dict:
+        return {"service": self.service, **{k: v for k, v in attrs.items() if v is not None}}
+
+    def processed(self, nbytes: int = 0, events: int = 1, **attrs) -> None:
+        attributes = self._attrs(attrs)
+        self._events.add(events, attributes)
+        if nbytes:
+            self._bytes.add(nbytes, attributes)
+
+    def failed(self, stage: str, **attrs) -> None:
+        self._failures.add(1, self._attrs({"stage": stage, **attrs}))
+
+    def observe(self, stage: str, seconds: float, **attrs) -> None:
+        self._duration.record(seconds, self._attrs({"stage": stage, **attrs}))
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed(name, **attrs)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, **attrs)
+
+    @contextmanager
+    def in_flight(self, **attrs):
+        attributes = self._attrs(attrs)
+        self._in_flight.add(1, attributes)
+        try:
+            yield
+        finally:
+            self._in_flight.add(-1, attributes)
+
+    def gauge(self, name: str, description: str, read: GaugeReader, unit: str = "1") -> None:
+        """Observable gauge: `read()` is called at each export and returns (value, attributes) pairs."""
+        if self._meter is None:
+            return
+
+        def callback(_options):
+            return [Observation(value, self._attrs(attrs)) for value, attrs in read()]
+
+        self._meter.create_observable_gauge(name, callbacks=[callback], unit=unit, description=description)
+
+    def close(self, timeout: float = 5) -> None:
+        """Exports what is pending (one-shot runs end before the next periodic export)."""
+        if self._provider is not None:
+            provider, self._provider = self._provider, None
+            provider.shutdown(timeout_millis=int(timeout * 1000))
+
+
+def _build_provider(service: str, config: MetricsConfig):
+    if config.exporter == "prometheus":
+        from opentelemetry.exporter.prometheus import PrometheusMetricReader
+        from prometheus_client import start_http_server
+
+        start_http_server(config.port)
+        reader = PrometheusMetricReader()
+    else:
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+        # Endpoint and interval from the standard OTEL_EXPORTER_OTLP_* / OTEL_METRIC_EXPORT_INTERVAL variables
+        reader = PeriodicExportingMetricReader(OTLPMetricExporter())
+    return MeterProvider(
+        metric_readers=[reader],
+        resource=Resource.create({"service.name": service}),
+        views=[View(instrument_name="ingest.stage.duration", aggregation=ExplicitBucketHistogramAggregation(STAGE_BUCKETS))],
+    )
+
+
+_metrics: IngestMetrics | None = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(service: str | None = None) -> IngestMetrics:
+    """Process-wide metrics, built from the environment on first call (later service names are ignored)."""
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            if service is None:
+                raise RuntimeError("get_metrics() needs a service name on first use")
+            _metrics = IngestMetrics(service, MetricsConfig.from_env())
+            atexit.register(_metrics.close)
+    return _metrics
@@ -0,0 +1,47 @@
+"""
+Per-phase wall-clock timing for one unit of work (an iteration, a file, a batch).
+
+    timer = PhaseTimer()
+    with timer.phase("fetch"):
+        ...
+    timer.add("store", seconds)          # when the duration is measured elsewhere
+    log_json("timings", **timer.record(dataset="x"))
+    # {"phases_ms": {"fetch": 12.3, "store": 40.1}, "total_ms": 55.0, "dataset": "x"}
+
+Phases with the same name add up (e.g. several pages), and a timer can be shared by worker threads.
+`on_phase(name, seconds)` is called for every measurement, e.g. to feed a latency histogram
+(ingest_common.metrics) with each page instead of the per-iteration sum.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+class PhaseTimer:
+    def __init__(self, on_phase: Callable[[str, float], None] | None = None):
+        self.started = time.perf_counter()
+        self._on_phase = on_phase
+        self._seconds: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+        if self._on_phase is not None:
+            self._on_phase(name, seconds)
+
+    def record(self, **fields) -> dict:
+        with self._lock:
+            phases = {name: round(s * 1000, 1) for name, s in self._seconds.items()}
+        return {"phases_ms": phases, "total_ms": round((time.perf_counter() - self.started) * 1000, 1), **fields}
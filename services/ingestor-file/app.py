@@ -1,8 +1,12 @@
 import argparse
+import glob
 import hashlib
 import os
 import json
 import mimetypes
+import signal
+import threading
+import time
 import uuid
 import boto3
 import shutil
@@ -10,86 +14,453 @@ import shutil
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
-from jsonschema import RefResolver
-from jsonschema.validators import validator_for
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import date, datetime, timezone
 from pathlib import Path
-from confluent_kafka import Producer
+
+from hash_cache import HashCache
+from parquet_stage import convert_and_upload, should_convert
+from profiling import make_profiler
+from ingest_common.compression import Compression, CompressingReader, rechunk
+from ingest_common.contracts import get_registry
+from ingest_common.hive_partitions import PartitionRegistrar
+from ingest_common.kafka_publisher import KafkaPublisher, PublisherConfig, get_publisher
+from ingest_common.metrics import IngestMetrics, get_metrics
+from ingest_common.serialization import dumps
+
+
+SUPPORTED_EXTENSIONS = (".csv", ".json", ".geojson")
+
+
+@dataclass
+class IngestContext:
+    """Clients shared by every file handled in this process (one S3 client, one producer, one metrics set)."""
+    source: str
+    raw_bucket: str
+    kafka_topic: str
+    schema_path: Path
+    dry_run: bool
+    verbose: bool = True
+    emit_on_duplicate: bool = False
+    profile: bool = True
+    # Hash while uploading to a staging key (one read) instead of hashing first (UPLOAD_SINGLE_PASS)
+    single_pass_upload: bool = False
+    compression: Compression = field(default_factory=Compression)
+    s3: object | None = None
+    producer: KafkaPublisher | None = None
+    hash_cache: HashCache | None = None
+    # Registers the dt partitions of new objects in the metastore (HIVE_REGISTER_PARTITIONS)
+    partitions: PartitionRegistrar | None = None
+    metrics: IngestMetrics = field(default_factory=lambda: IngestMetrics("ingestor-file"))  # no-op until build_context
+
+
+@dataclass
+class IngestStats:
+    started: float = field(default_factory=time.perf_counter)
+    files: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    bytes: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, nbytes: int, ok: bool, duplicate: bool = False) -> None:
+        with self._lock:
+            if ok:
+                self.files += 1
+                self.bytes += nbytes
+                self.duplicates += int(duplicate)
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = max(time.perf_counter() - self.started, 1e-9)
+            return {
+                "files": self.files,
+                "failed": self.failed,
+                "duplicates": self.duplicates,
+                "bytes": self.bytes,
+                "elapsed_s": round(elapsed, 3),
+                "files_per_s": round(self.files / elapsed, 3),
+                "bytes_per_s": round(self.bytes / elapsed, 1),
+            }
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(description="POC file ingestor (run-once)")
-    parser.add_argument("--input", required=True, help="Path to the input file inside the container (e.g., /incoming/example.csv)")
-    parser.add_argument("--dt", default=str(date.today()), help="Business date for RAW partition (YYYY-MM-DD). Defaults to today.")
+    parser = argparse.ArgumentParser(description="POC file ingestor (run-once, batch or watch mode)")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--input", help="Path to the input file inside the container (e.g., /incoming/example.csv)")
+    mode.add_argument("--inputs", nargs="+", metavar="PATH_OR_GLOB", help="Batch mode: files and/or glob patterns (e.g., '/incoming/*.csv')")
+    mode.add_argument("--watch", metavar="DIR", help="Daemon mode: keep polling DIR (e.g., /incoming) and ingest new files until stopped")
+    parser.add_argument("--dt", default=None, help="Business date for RAW partition (YYYY-MM-DD). Defaults to today (evaluated per file).")
     parser.add_argument("--dry-run", action="store_true", help="Do not write to MinIO/Kafka; just print what would happen.")
+    parser.add_argument("--emit-on-duplicate", action="store_true", default=env_flag("EMIT_ON_DUPLICATE"), help="Still publish the ingest event when the content is already in RAW (upload is skipped either way).")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "4")), help="Concurrent files in batch/watch mode.")
+    parser.add_argument("--poll-seconds", type=float, default=float(os.getenv("WATCH_POLL_SECONDS", "2")), help="Watch mode: directory scan interval.")
+    parser.add_argument("--settle-seconds", type=float, default=float(os.getenv("WATCH_SETTLE_SECONDS", "5")), help="Watch mode: only pick files not modified for this long (still being copied otherwise).")
+    parser.add_argument("--report-seconds", type=float, default=float(os.getenv("STATS_REPORT_SECONDS", "30")), help="Watch mode: interval between throughput reports.")
     args = parser.parse_args()
 
-    source = os.getenv("SOURCE", "file")
-    input_path = args.input
+    if args.input is not None:
+        if not os.path.isfile(args.input):
+            raise SystemExit(f"Input file does not exist: {args.input}")
+        ctx = build_context(args.dry_run, verbose=True, emit_on_duplicate=args.emit_on_duplicate)
+        try:
+            ingest_file(ctx, args.input, args.dt or str(date.today()))
+        finally:
+            close_context(ctx)
+        return 0
+
+    if args.workers < 1:
+        raise SystemExit("--workers must be >= 1")
+
+    ctx = build_context(args.dry_run, verbose=False, emit_on_duplicate=args.emit_on_duplicate)
+    stats = IngestStats()
+    try:
+        if args.inputs is not None:
+            paths = expand_inputs(args.inputs)
+            if not paths:
+                raise SystemExit(f"No input files matched: {args.inputs}")
+            run_batch(ctx, paths, args.dt, args.workers, stats)
+        else:
+            run_watch(ctx, args.watch, args.dt, args.workers, args.poll_seconds, args.settle_seconds, args.report_seconds, stats)
+    finally:
+        close_context(ctx)
+        log_stats("ingest.file stats (final)", stats)
+
+    return 0 if stats.failed == 0 else 1
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes")
+
+
+def build_context(dry_run: bool, verbose: bool, emit_on_duplicate: bool = False) -> IngestContext:
+    ctx = IngestContext(
+        source=os.getenv("SOURCE", "file"),
+        raw_bucket=os.getenv("MINIO_BUCKET_RAW", "raw"),
+        kafka_topic=os.getenv("KAFKA_TOPIC", "ingest.file.v1"),
+        schema_path=Path(os.getenv("EVENT_SCHEMA_PATH", "./contracts/events/ingest-file.v1.schema.json")),
+        dry_run=dry_run,
+        verbose=verbose,
+        emit_on_duplicate=emit_on_duplicate,
+        profile=env_flag("PROFILE_ENABLED", "true"),
+        single_pass_upload=env_flag("UPLOAD_SINGLE_PASS"),
+        compression=Compression.from_env(),
+        metrics=get_metrics("ingestor-file"),
+    )
+
+    cache_path = os.getenv("HASH_CACHE_PATH", "").strip()
+    if cache_path:
+        ctx.hash_cache = HashCache(cache_path)
+
+    if dry_run:
+        return ctx
+
+    # Built once per process: boto3 clients and the Kafka publisher are thread-safe
+    ctx.s3 = build_s3_client_from_env()
+    ensure_bucket_exists(ctx.s3, ctx.raw_bucket)
+    ctx.producer = build_kafka_producer()
+    ctx.partitions = PartitionRegistrar.from_env()
+    return ctx
 
-    if not os.path.isfile(input_path):
-        raise SystemExit(f"Input file does not exist: {input_path}")
 
+def close_context(ctx: IngestContext) -> None:
+    if ctx.producer is not None:
+        ctx.producer.close(10)
+    if ctx.hash_cache is not None:
+        ctx.hash_cache.close()
+    if ctx.partitions is not None:
+        ctx.partitions.close()
+    ctx.metrics.close()
+
+
+def ingest_file(ctx: IngestContext, input_path: str, dt: str) -> tuple[int, bool]:
+    """
+    Ingest one file (RAW upload + Kafka event + move).
+    Returns (bytes ingested, duplicate) where duplicate means the content was already in RAW.
+    """
     original_name = os.path.basename(input_path)
     dataset = os.getenv("DATASET", Path(original_name).stem)
     if len(dataset) < 2:
         raise SystemExit("Dataset must have at least 2 characters (set DATASET env var or use a longer file name).")
-    sha = sha256_file(input_path)
-    raw_key = build_raw_key(source, args.dt, sha, original_name)
+    # "file" is the whole unit; hash / upload / validate / publish are recorded inside
+    with ctx.metrics.in_flight(dataset=dataset), ctx.metrics.stage("file", dataset=dataset):
+        size, duplicate = _ingest_file(ctx, input_path, dt, dataset, original_name)
+    ctx.metrics.processed(0 if duplicate else size, dataset=dataset)
+    return size, duplicate
 
-    raw_bucket = os.getenv("MINIO_BUCKET_RAW", "raw")
-    raw_uri = f"s3://{raw_bucket}/{raw_key}"
 
+def _ingest_file(ctx: IngestContext, input_path: str, dt: str, dataset: str, original_name: str) -> tuple[int, bool]:
     ctype = contract_content_type(input_path)
+    size = os.path.getsize(input_path)
+
+    # Unchanged file (same path/size/mtime/inode): reuse the sha256 and profile instead of re-reading it
+    fingerprint = HashCache.fingerprint(input_path) if ctx.hash_cache is not None else None
+    cached = ctx.hash_cache.get(input_path) if ctx.hash_cache is not None else None
+    sha, profile = cached if cached is not None else (None, None)
+    # Record count + column stats are computed from the same chunks as the sha256
+    profiler = make_profiler(ctype) if sha is None and ctx.profile else None
+    on_chunk = profiler.feed if profiler is not None else None
+
+    if ctx.dry_run:
+        if sha is None:
+            with ctx.metrics.stage("hash", dataset=dataset):
+                sha = sha256_file(input_path, on_chunk)
+            profile = profiler.result() if profiler is not None else None
+            remember_hash(ctx, input_path, fingerprint, sha, profile)
+        plan_ingest_event(ctx, dataset, original_name, ctype, dt, sha, size, profile)
+        print("dry_run      : true (no MinIO/Kafka writes)")
+        return size, False
+
+    staged = None
+    try:
+        if sha is None and ctx.single_pass_upload:
+            # 1) Hash while uploading to a staging key: the file is read from disk only once,
+            # but a duplicate is only detected after it has been uploaded in full
+            with ctx.metrics.stage("upload", dataset=dataset):
+                staged = stage_upload_to_minio_raw(ctx.s3, ctx.raw_bucket, input_path, on_chunk, ctx.compression)
+            sha = staged.sha256
+            profile = profiler.result() if profiler is not None else None
+            remember_hash(ctx, input_path, fingerprint, sha, profile)
+        elif sha is None:
+            # 1) Hash locally first: a duplicate then costs one read and one HEAD, no upload
+            with ctx.metrics.stage("hash", dataset=dataset):
+                sha = sha256_file(input_path, on_chunk)
+            profile = profiler.result() if profiler is not None else None
+            remember_hash(ctx, input_path, fingerprint, sha, profile)
+
+        event = plan_ingest_event(ctx, dataset, original_name, ctype, dt, sha, size, profile)
+        raw_key = raw_key_for(ctx, dt, sha, original_name)
+
+        # 2) Content-addressed key: if it already exists the same bytes are already in RAW
+        stored_size = raw_object_size(ctx.s3, ctx.raw_bucket, raw_key)
+        duplicate = stored_size is not None
+        if duplicate:
+            print(f"♻️ Already in RAW, skipping upload: s3://{ctx.raw_bucket}/{raw_key}")
+        elif staged is not None:
+            with ctx.metrics.stage("promote", dataset=dataset):
+                promote_staged_upload(ctx.s3, ctx.raw_bucket, staged, raw_key)
+            stored_size = staged.stored_size
+        else:
+            # Hash known (cache or local pass): stream the file straight to its final key
+            with ctx.metrics.stage("upload", dataset=dataset):
+                stored_size = upload_to_minio_raw(ctx.s3, ctx.raw_bucket, raw_key, input_path, ctx.compression)
+        if ctx.compression.enabled:
+            # Only known once written; optional in the contract, so the validated plan stays valid
+            event["payload"]["stored_bytes"] = stored_size
+        if not duplicate:
+            # 2b) Optional typed Parquet copy (PARQUET_DATASETS), partitioned by dt
+            parquet_uri = None
+            if should_convert(dataset, ctype):
+                with ctx.metrics.stage("parquet", dataset=dataset):
+                    parquet_uri = convert_and_upload(ctx.s3, ctx.raw_bucket, input_path, dataset, dt, sha)
+            write_metadata_sidecar(ctx.s3, ctx.raw_bucket, raw_key, event, size, profile, parquet_uri)
+
+        # 2c) Partitions of the RAW tables (also for a duplicate: it may follow a failed registration).
+        # The file is already stored: a failure is counted and retried later, not a reason to quarantine it
+        if ctx.partitions is not None:
+            try:
+                with ctx.metrics.stage("register", dataset=dataset):
+                    register_partitions(ctx, dataset, ctype, dt, sha, raw_key)
+            except Exception as e:
+                print(f"⚠️ Partition registration failed, retried with the next file: {e}")
+
+        # 3) Publish event to Kafka
+        if not duplicate or ctx.emit_on_duplicate:
+            with ctx.metrics.stage("publish", dataset=dataset):
+                publish_kafka_event(ctx.producer, ctx.kafka_topic, event)
+
+        # 4) Mark processed
+        move_to_processed(input_path)
+        return size, duplicate
+
+    except Exception as e:
+        # In a POC we keep it simple: quarantine on any failure
+        move_to_quarantine(input_path, str(e))
+        raise
+    finally:
+        if staged is not None:
+            discard_staged_upload(ctx.s3, ctx.raw_bucket, staged)
+
+
+def register_partitions(ctx: IngestContext, dataset: str, ctype: str, dt: str, sha: str, raw_key: str) -> None:
+    """
+    The source copy is one (dt, sha256) partition of the dataset's RAW table, located at its own
+    prefix (other datasets share the dt= prefix); the Parquet copy is the dt partition of <dataset>_parquet.
+    """
+    pending = ctx.partitions.retry_failed()
+    if pending:
+        print(f"⚠️ {pending} partition registration(s) still failing")
+    table = ctx.partitions.table_for(dataset)
+    if table is not None:
+        prefix = raw_key.rsplit("/", 1)[0]
+        if ctx.partitions.register(table, {"dt": dt, "sha256": sha}, f"s3://{ctx.raw_bucket}/{prefix}/"):
+            print(f"🗂️ Registered partition {table} dt={dt} sha256={sha[:12]}…")
+    if should_convert(dataset, ctype):
+        if ctx.partitions.register(f"{dataset}_parquet", {"dt": dt}):
+            print(f"🗂️ Registered partition {dataset}_parquet dt={dt}")
+
+
+def remember_hash(ctx: IngestContext, input_path: str, fingerprint: tuple | None, sha: str, profile: dict | None) -> None:
+    if ctx.hash_cache is None or fingerprint is None:
+        return
+    # Only trust the hash if the file did not change while we were reading it
+    if HashCache.fingerprint(input_path) == fingerprint:
+        ctx.hash_cache.put(fingerprint, sha, profile)
+
+
+def plan_ingest_event(
+    ctx: IngestContext, dataset: str, original_name: str, ctype: str, dt: str, sha: str, size: int, profile: dict | None = None
+) -> dict:
+    raw_key = raw_key_for(ctx, dt, sha, original_name)
 
     meta = {
-        "source": source,
+        "source": ctx.source,
         "dataset": dataset,
         "original_name": original_name,
         "sha256": sha,
-        "raw_uri": raw_uri,
-        "raw_bucket": raw_bucket,
+        "raw_uri": f"s3://{ctx.raw_bucket}/{raw_key}",
+        "raw_bucket": ctx.raw_bucket,
         "raw_key": raw_key,
         "content_type": ctype,
+        "bytes": size,
+        "compression": ctx.compression.codec,
         "ingest_time": now_utc_iso(),
         "event_time": now_utc_iso(),
     }
+    if profile is not None:
+        meta["record_count"] = profile["record_count"]
+        meta["profile"] = profile
 
     event = build_ingest_event(meta)
 
-    schema_path = Path(os.getenv("EVENT_SCHEMA_PATH", "./contracts/events/ingest-file.v1.schema.json"))
-    validate_event_against_schema(event, schema_path)
+    with ctx.metrics.stage("validate", dataset=dataset):
+        validate_event_against_schema(event, ctx.schema_path)
 
     print("== Ingest plan ==")
-    print(json.dumps(event, indent=2))
-
-    if args.dry_run:
-        print("dry_run      : true (no MinIO/Kafka writes)")
-        return 0
-
+    print(json.dumps(event, indent=2 if ctx.verbose else None))
+    return event
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    seen: dict[str, None] = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                seen.setdefault(path, None)
+    return list(seen)
+
+
+def scan_ready_files(directory: str, settle_seconds: float) -> list[str]:
+    """Files with a supported extension that have not been modified for `settle_seconds`."""
+    now = time.time()
+    ready = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            if Path(entry.name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            if now - entry.stat().st_mtime < settle_seconds:
+                continue
+            ready.append(entry.path)
+    return sorted(ready)
+
+
+def _ingest_and_record(ctx: IngestContext, path: str, dt: str | None, stats: IngestStats) -> bool:
     try:
-        # 1) Upload to RAW
-        s3 = build_s3_client_from_env()
-        ensure_bucket_exists(s3, meta["raw_bucket"])
-        upload_to_minio_raw(s3, meta["raw_bucket"], meta["raw_key"], input_path)
-
-        # 2) Publish event to Kafka
-        publish_kafka_event(event)
-
-        # 3) Mark processed
-        move_to_processed(input_path)
-        return 0
-
-    except Exception as e:
-        # In a POC we keep it simple: quarantine on any failure
-        move_to_quarantine(input_path, str(e))
-        raise
-
-def sha256_file(path: str) -> str:
+        nbytes, duplicate = ingest_file(ctx, path, dt or str(date.today()))
+    except BaseException as e:  # SystemExit is used for validation errors
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        print(json.dumps({"msg": "ingest.file failed", "input": path, "error": str(e)}))
+        stats.record(0, ok=False)
+        return False
+    stats.record(nbytes, ok=True, duplicate=duplicate)
+    return True
+
+
+def run_batch(ctx: IngestContext, paths: list[str], dt: str | None, workers: int, stats: IngestStats) -> None:
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        for path in paths:
+            pool.submit(_ingest_and_record, ctx, path, dt, stats)
+
+
+def run_watch(
+    ctx: IngestContext,
+    directory: str,
+    dt: str | None,
+    workers: int,
+    poll_seconds: float,
+    settle_seconds: float,
+    report_seconds: float,
+    stats: IngestStats,
+) -> None:
+    if not os.path.isdir(directory):
+        raise SystemExit(f"Watch directory does not exist: {directory}")
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    # Bounded queue: never submit more than 2x workers files at a time
+    max_pending = workers * 2
+    lock = threading.Lock()
+    pending: set[str] = set()
+    # Files that failed before being moved (e.g. validation) are remembered by (path, mtime) so we don't retry forever
+    failed: set[tuple[str, float]] = set()
+
+    def _done(path: str, mtime: float, ok: bool) -> None:
+        with lock:
+            pending.discard(path)
+            if not ok and os.path.exists(path):
+                failed.add((path, mtime))
+
+    def _task(path: str, mtime: float) -> None:
+        ok = False
+        try:
+            ok = _ingest_and_record(ctx, path, dt, stats)
+        finally:
+            _done(path, mtime, ok)
+
+    print(json.dumps({"msg": "ingest.file watching", "dir": directory, "workers": workers}))
+    last_report = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        while not stop.is_set():
+            for path in scan_ready_files(directory, settle_seconds):
+                try:
+                    mtime = os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                with lock:
+                    if len(pending) >= max_pending:
+                        break
+                    if path in pending or (path, mtime) in failed:
+                        continue
+                    pending.add(path)
+                pool.submit(_task, path, mtime)
+
+            if time.monotonic() - last_report >= report_seconds:
+                log_stats("ingest.file stats", stats)
+                last_report = time.monotonic()
+            stop.wait(poll_seconds)
+
+    print(json.dumps({"msg": "ingest.file watch stopped", "dir": directory}))
+
+
+def log_stats(message: str, stats: IngestStats) -> None:
+    print(json.dumps({"msg": message, **stats.snapshot()}))
+
+def sha256_file(path: str, on_chunk=None) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
         for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
     return h.hexdigest()
 
 def sanitize_filename(name: str) -> str:
@@ -99,6 +470,10 @@ def sanitize_filename(name: str) -> str:
 def build_raw_key(source: str, dt: str, sha: str, original_name: str) -> str:
     return f"source={source}/dt={dt}/{sha}/{sanitize_filename(original_name)}"
 
+def raw_key_for(ctx: IngestContext, dt: str, sha: str, original_name: str) -> str:
+    # RAW_COMPRESSION adds the codec suffix (.gz / .zst), which is also how Trino detects it
+    return ctx.compression.object_key(build_raw_key(ctx.source, dt, sha, original_name))
+
 def guess_content_type(path: str) -> str:
     ct, _ = mimetypes.guess_type(path)
     return ct or "application/octet-stream"
@@ -129,10 +504,21 @@ def build_ingest_event(meta: dict) -> dict:
     if "record_count" in meta and isinstance(meta["record_count"], int):
         payload["record_count"] = meta["record_count"]
 
+    # Optional (schema 1.2): uncompressed size, and the codec when RAW_COMPRESSION is on
+    if isinstance(meta.get("bytes"), int):
+        payload["bytes"] = meta["bytes"]
+    if meta.get("compression", "none") != "none":
+        payload["compression"] = meta["compression"]
+
+    # Optional (schema 1.1): column stats / bbox computed while hashing
+    profile = {k: meta["profile"][k] for k in ("columns", "bbox") if k in meta.get("profile", {})}
+    if profile:
+        payload["profile"] = profile
+
     return {
         "event_id": str(uuid.uuid4()),
         "event_type": "ingest.file",
-        "schema_version": "1.0.0",
+        "schema_version": "1.2.0",
         "source": meta["source"],
         "event_time": meta["event_time"],
         "ingest_time": meta["ingest_time"],
@@ -140,65 +526,196 @@ def build_ingest_event(meta: dict) -> dict:
         "payload": payload,
     }
 
-def load_json(path: Path) -> dict:
-    return json.loads(path.read_text(encoding="utf-8"))
-
 def validate_event_against_schema(event: dict, schema_path: Path) -> None:
     if not schema_path.exists():
         raise SystemExit(f"Schema file not found: {schema_path}")
 
-    schema = load_json(schema_path)
+    # Compiled once per process for every contract in the directory, then cached
+    registry = get_registry(schema_path.parent)
+    if not registry.is_valid(event):
+        print("❌ Event validation failed:")
+        for err in registry.errors(event):
+            print(f" - {err}")
+        raise SystemExit(2)
 
-    # Base URI for resolving local $ref, allOf, etc.
-    base_dir = schema_path.parent
-    store: dict[str, dict] = {}
+    print("✅ Event validated against JSON Schema")
 
-    # Load the envelope schema (required by ingest-file.v1.schema.json)
-    envelope_path = base_dir / "envelope.v1.schema.json"
-    if envelope_path.exists():
-        envelope_schema = load_json(envelope_path)
+@dataclass
+class StagedUpload:
+    """File contents hashed and (for multi-part files) already uploaded under a staging key."""
+    sha256: str
+    size: int  # uncompressed bytes
+    content_type: str
+    stored_size: int = 0  # bytes written (compressed size with RAW_COMPRESSION)
+    compression: Compression = field(default_factory=Compression)
+    staging_key: str | None = None
+    body: bytes | None = None  # single-part objects are kept in memory (<= part size) and written once
+
+
+def upload_part_size() -> int:
+    # S3 requires >= 5 MiB for every part but the last one
+    return max(5, int(os.getenv("UPLOAD_PART_SIZE_MB", "16"))) * 1024 * 1024
+
+
+def stage_upload_to_minio_raw(
+    s3, bucket: str, file_path: str, on_chunk=None, compression: Compression | None = None
+) -> StagedUpload:
+    """
+    Single pass over the file: each chunk feeds the sha256 and is uploaded as a multipart part to
+    `_staging/<uuid>/<name>`. The content-addressed key is only known at the end, so the object is
+    moved there afterwards with a server-side copy (see promote_staged_upload).
+
+    Memory stays bounded to (UPLOAD_CONCURRENCY + 1) parts whatever the file size.
+    `on_chunk` sees every chunk in order (e.g. the record profiler). With `compression` the parts
+    are compressed on the fly; sha256 / size stay those of the original file.
+    """
+    if compression is None:
+        compression = Compression()
+    mime_type = guess_content_type(file_path)
+    part_size = upload_part_size()
+    h = hashlib.sha256()
 
-        # Map by $id (https://example.local/...) so remote resolution is satisfied locally
-        if "$id" in envelope_schema:
-            store[envelope_schema["$id"]] = envelope_schema
+    def _read(f):
+        for chunk in iter(lambda: f.read(part_size), b""):
+            h.update(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            yield chunk
+
+    with open(file_path, "rb") as f:
+        encoded = compression.encode(_read(f))
+        parts_iter = rechunk(encoded, part_size)
+
+        def _staged(**fields) -> StagedUpload:
+            return StagedUpload(sha256=h.hexdigest(), size=encoded.raw_bytes, content_type=mime_type,
+                                stored_size=encoded.stored_bytes, compression=compression, **fields)
+
+        first = next(parts_iter, b"")
+        if len(first) < part_size:
+            # Fits in a single part: no staging object, one put_object on promotion
+            return _staged(body=first)
+
+        staging_key = compression.object_key(f"_staging/{uuid.uuid4()}/{sanitize_filename(os.path.basename(file_path))}")
+        upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=staging_key, ContentType=mime_type, **compression.put_args()
+        )["UploadId"]
+        print(f"Uploading to MinIO (staging): s3://{bucket}/{staging_key}")
+
+        concurrency = max(1, int(os.getenv("UPLOAD_CONCURRENCY", "4")))
+        slots = threading.BoundedSemaphore(concurrency)
+        failed = threading.Event()
+
+        def _upload_part(number: int, data: bytes) -> dict:
+            try:
+                resp = s3.upload_part(Bucket=bucket, Key=staging_key, UploadId=upload_id, PartNumber=number, Body=data)
+                return {"PartNumber": number, "ETag": resp["ETag"]}
+            except BaseException:
+                failed.set()
+                raise
+            finally:
+                slots.release()
+
+        try:
+            futures = []
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload-part") as pool:
+                part, number = first, 1
+                while part and not failed.is_set():
+                    slots.acquire()
+                    futures.append(pool.submit(_upload_part, number, part))
+                    part = next(parts_iter, b"")
+                    number += 1
+                parts = [fut.result() for fut in futures]
+
+            s3.complete_multipart_upload(
+                Bucket=bucket, Key=staging_key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            s3.abort_multipart_upload(Bucket=bucket, Key=staging_key, UploadId=upload_id)
+            raise
 
-        # Also map by file:// URI (useful if refs resolve to file URIs)
-        store[envelope_path.resolve().as_uri()] = envelope_schema
+        return _staged(staging_key=staging_key)
 
-    # Map the main schema too (same idea)
-    if "$id" in schema:
-        store[schema["$id"]] = schema
-    store[schema_path.resolve().as_uri()] = schema
 
-    # Base URI for resolving relative refs (envelope.v1.schema.json)
-    base_uri = base_dir.resolve().as_uri() + "/"
-    resolver = RefResolver(base_uri=base_uri, referrer=schema, store=store)
+def promote_staged_upload(s3, bucket: str, staged: StagedUpload, key: str) -> None:
+    print(f"Uploading to MinIO: s3://{bucket}/{key}")
+    object_args = {"ContentType": staged.content_type, **staged.compression.put_args()}
+    if staged.body is not None:
+        s3.put_object(Bucket=bucket, Key=key, Body=staged.body, **object_args)
+    else:
+        # Managed copy: server-side multipart copy when the object is larger than 5 GiB.
+        # Headers are set explicitly, a multipart copy would not carry them over.
+        s3.copy({"Bucket": bucket, "Key": staged.staging_key}, bucket, key,
+                ExtraArgs={**object_args, "MetadataDirective": "REPLACE"})
+    print("✅ Upload completed")
 
-    Validator = validator_for(schema)
-    validator = Validator(schema, resolver=resolver)
 
-    errors = sorted(validator.iter_errors(event), key=lambda e: list(e.path))
-    if errors:
-        print("❌ Event validation failed:")
-        for err in errors:
-            where = ".".join([str(p) for p in err.path]) or "<root>"
-            print(f" - {where}: {err.message}")
-        raise SystemExit(2)
+def upload_to_minio_raw(s3, bucket: str, key: str, file_path: str, compression: Compression | None = None) -> int:
+    """Streams the file to `key` (compressed on the fly if enabled); returns the bytes written."""
+    if compression is None:
+        compression = Compression()
+    print(f"Uploading to MinIO: s3://{bucket}/{key}")
+    extra_args = {"ContentType": guess_content_type(file_path), **compression.put_args()}
+    if not compression.enabled:
+        s3.upload_file(Filename=file_path, Bucket=bucket, Key=key, ExtraArgs=extra_args)
+        print("✅ Upload completed")
+        return os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        reader = CompressingReader(f, compression)
+        s3.upload_fileobj(reader, bucket, key, ExtraArgs=extra_args)
+    print("✅ Upload completed")
+    return reader.stored_bytes
+
+
+def metadata_key_for(raw_key: str) -> str:
+    # Leading underscore: Hive/Trino skip it when the folder is read as an external table
+    return f"{raw_key.rsplit('/', 1)[0]}/_metadata.json"
+
+
+def write_metadata_sidecar(
+    s3, bucket: str, raw_key: str, event: dict, size: int, profile: dict | None, parquet_uri: str | None = None
+) -> None:
+    payload = event["payload"]
+    sidecar = {
+        "dataset": payload["dataset"],
+        "source": event["source"],
+        "source_file_name": payload.get("source_file_name"),
+        "content_type": payload["content_type"],
+        "sha256": payload["checksum"],
+        "bytes": size,
+        "stored_bytes": payload.get("stored_bytes", size),
+        "compression": payload.get("compression", "none"),
+        "raw_uri": payload["raw_uri"],
+        "event_id": event["event_id"],
+        "ingest_time": event["ingest_time"],
+        **(profile or {}),
+    }
+    if parquet_uri is not None:
+        sidecar["parquet_uri"] = parquet_uri
+    key = metadata_key_for(raw_key)
+    s3.put_object(Bucket=bucket, Key=key, Body=dumps(sidecar), ContentType="application/json")
+    print(f"✅ Metadata written: s3://{bucket}/{key}")
 
-    print("✅ Event validated against JSON Schema")
 
-def upload_to_minio_raw(s3, bucket: str, key: str, file_path: str) -> None:
-    mime_type, _ = mimetypes.guess_type(file_path)
-    mime_type = mime_type or "application/octet-stream"
+def raw_object_size(s3, bucket: str, key: str) -> int | None:
+    """Stored size of the object, None if it does not exist."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def discard_staged_upload(s3, bucket: str, staged: StagedUpload) -> None:
+    if staged.staging_key is None:
+        return
+    try:
+        s3.delete_object(Bucket=bucket, Key=staged.staging_key)
+    except ClientError as e:
+        print(f"⚠️ Could not delete staging object s3://{bucket}/{staged.staging_key}: {e}")
+    staged.staging_key = None
 
-    print(f"Uploading to MinIO: s3://{bucket}/{key}")
-    s3.upload_file(
-        Filename=file_path,
-        Bucket=bucket,
-        Key=key,
-        ExtraArgs={"ContentType": mime_type},
-    )
-    print("✅ Upload completed")
 
 def build_s3_client_from_env():
     endpoint = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
@@ -234,28 +751,16 @@ def ensure_bucket_exists(s3, bucket: str) -> None:
     print(f"Bucket '{bucket}' not found. Creating it...")
     s3.create_bucket(Bucket=bucket)
 
-def publish_kafka_event(event: dict) -> None:
+def build_kafka_producer() -> KafkaPublisher:
     bootstrap = os.getenv("KAFKA_BOOTSTRAP", "kafka:9092")
-    topic = os.getenv("KAFKA_TOPIC", "ingest.file.v1")
-
-    producer = Producer({
-        "bootstrap.servers": bootstrap,
-        "client.id": "ingestor-file",
-        # Make failures visible fast in a POC
-        "socket.timeout.ms": 5000,
-        "message.timeout.ms": 10000,
-    })
-
-    key = event.get("idempotency_key", "")
-    value = json.dumps(event).encode("utf-8")
-
-    def delivery_report(err, msg):
-        if err is not None:
-            raise SystemExit(f"Kafka delivery failed: {err}")
-        print(f"✅ Kafka delivered to {msg.topic()} [{msg.partition()}] @ offset {msg.offset()}")
-
-    producer.produce(topic=topic, key=key, value=value, callback=delivery_report)
-    producer.flush(10)
+    # Linger/batch/compression/idempotence from KAFKA_* env vars (see ingest_common.kafka_publisher)
+    return get_publisher(PublisherConfig.from_env("ingestor-file", bootstrap))
+
+def publish_kafka_event(producer: KafkaPublisher, topic: str, event: dict) -> None:
+    # Workers wait for their own message only; concurrent workers share broker batches
+    future = producer.publish(topic, event, key=event.get("idempotency_key", ""))
+    delivery = future.result(timeout=producer.config.delivery_timeout_ms / 1000 + 5)
+    print(f"✅ Kafka delivered to {delivery.topic} [{delivery.partition}] @ offset {delivery.offset}")
 
 def move_to_processed(input_path: str) -> None:
     src = Path(input_path)
@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class HashCache:
+    """
+    Persistent index of file fingerprints -> sha256, backed by SQLite.
+
+    A fingerprint is (path, size, mtime_ns, inode): if none of them changed since the file was
+    hashed we trust the stored sha256 (and the profile computed in the same pass) and skip
+    re-reading the file.
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker threads, serialized by our own lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path     TEXT    NOT NULL,
+                size     INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode    INTEGER NOT NULL,
+                sha256   TEXT    NOT NULL,
+                profile  TEXT,
+                PRIMARY KEY (path, size, mtime_ns, inode)
+            )
+            """
+        )
+        # Indexes created before profiles were stored
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(file_hashes)")}
+        if "profile" not in columns:
+            self._conn.execute("ALTER TABLE file_hashes ADD COLUMN profile TEXT")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(file_path: str) -> tuple[str, int, int, int]:
+        st = os.stat(file_path)
+        return os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino
+
+    def get(self, file_path: str) -> tuple[str, dict | None] | None:
+        """(sha256, profile) for an unchanged file, None if unknown or modified."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, profile FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                self.fingerprint(file_path),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], (json.loads(row[1]) if row[1] else None)
+
+    def put(self, fingerprint: tuple[str, int, int, int], sha256: str, profile: dict | None = None) -> None:
+        """Store the sha256 under the fingerprint taken *before* the file was read."""
+        with self._lock:
+            # Keep a single entry per path: older fingerprints can never match again
+            self._conn.execute("DELETE FROM file_hashes WHERE path = ?", (fingerprint[0],))
+            self._conn.execute(
+                "INSERT INTO file_hashes (path, size, mtime_ns, inode, sha256, profile) VALUES (?, ?, ?, ?, ?, ?)",
+                (*fingerprint, sha256, json.dumps(profile) if profile is not None else None),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
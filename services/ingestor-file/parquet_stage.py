@@ -0,0 +1,220 @@
+"""
+Optional CSV -> Parquet stage.
+
+Converts an incoming CSV into typed, zstd-compressed Parquet whose columns match the corresponding
+dbt staging model, so Trino reads typed columns (pruning + predicate pushdown) instead of re-parsing
+text with try_cast on every query.
+
+The CSV is streamed in blocks and written one row group at a time; casts follow Trino's `try_cast`
+semantics (unparseable values become NULL instead of failing the file).
+
+Layout (RAW bucket, next to the immutable `source=...` copies, Hive-partitioned by dt):
+    parquet/<dataset>/dt=<dt>/part-<sha256>.parquet
+The file name is derived from the sha256, so re-ingesting the same bytes overwrites the same object.
+"""
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Column -> (Arrow type name, source CSV column). Mirrors analytics/dbt/poc_trino/models/stg/stg_traffic.sql.
+TRAFFIC_COLUMNS: dict[str, tuple[str, str]] = {
+    "reading_id": ("string", "reading_id"),
+    "sensor_id": ("string", "sensor_id"),
+    "road": ("string", "road"),
+    "direction": ("string", "direction"),
+    "road_segment_id": ("string", "road_segment_id"),
+    "city": ("string", "city"),
+    "lat": ("double", "lat"),
+    "lon": ("double", "lon"),
+    "measured_at_utc_raw": ("string", "measured_at_utc"),
+    "measured_at_ts": ("timestamp", "measured_at_utc"),
+    "vehicle_count": ("int32", "vehicle_count"),
+    "avg_speed_kmh": ("double", "avg_speed_kmh"),
+    "occupancy_pct": ("double", "occupancy_pct"),
+    "congestion_level": ("upper", "congestion_level"),
+    "congestion_level_rank": ("congestion_rank", "congestion_level"),
+    "incident_flag": ("upper", "incident_flag"),
+    "source_system": ("string", "source_system"),
+}
+
+# dataset -> column mapping. The dataset is the DATASET env var or the file stem (see app.py).
+DATASET_SCHEMAS: dict[str, dict[str, tuple[str, str]]] = {
+    "traffic": TRAFFIC_COLUMNS,
+}
+
+# Same ranks as the CASE in stg_traffic
+CONGESTION_RANKS = {"LOW": 1, "MEDIUM": 2}
+
+# The forms Trino's from_iso8601_timestamp accepts (calendar dates, optional 'T' time and offset);
+# anything else (a space instead of 'T', surrounding blanks, ...) is NULL in stg_traffic, so here too
+ISO_8601_TIMESTAMP = (
+    r"^(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?"
+    r"(?:T(\d{2})(?::(\d{2})(?::(\d{2})(?:[.,](\d{1,9}))?)?)?"
+    r"(Z|[+-]\d{2}(?::?\d{2})?)?)?$"
+)
+_ISO_8601_TIMESTAMP = re.compile(ISO_8601_TIMESTAMP)
+
+
+def enabled_datasets() -> set[str]:
+    """Datasets to convert, from PARQUET_DATASETS (comma separated, empty = stage disabled)."""
+    raw = os.getenv("PARQUET_DATASETS", "")
+    return {d.strip() for d in raw.split(",") if d.strip()}
+
+
+def should_convert(dataset: str, content_type: str) -> bool:
+    return content_type == "csv" and dataset in DATASET_SCHEMAS and dataset in enabled_datasets()
+
+
+def build_parquet_key(dataset: str, dt: str, sha: str) -> str:
+    return f"parquet/{dataset}/dt={dt}/part-{sha}.parquet"
+
+
+def csv_to_parquet(csv_path: str, parquet_path: str, dataset: str) -> int:
+    """Streams `csv_path` into `parquet_path`; returns the number of rows written."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SystemExit("PARQUET_DATASETS is set but pyarrow is not installed") from e
+
+    columns = DATASET_SCHEMAS[dataset]
+    schema = pa.schema([(name, _arrow_type(pa, kind)) for name, (kind, _) in columns.items()])
+    row_group_rows = int(os.getenv("PARQUET_ROW_GROUP_ROWS", "128000"))
+    source_columns = sorted({src for _, src in columns.values()})
+
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=8 * 1024 * 1024),
+        # Everything is read as text, casting is done below with try_cast semantics. Empty fields stay
+        # '' as in the CSV table (they only become NULL where a cast fails)
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: pa.string() for c in source_columns},
+            include_columns=source_columns,
+            include_missing_columns=True,
+            strings_can_be_null=False,
+        ),
+    )
+
+    rows = 0
+    pending: list = []
+    pending_rows = 0
+    with pq.ParquetWriter(parquet_path, schema, compression="zstd") as writer:
+        for batch in reader:
+            pending.append(_convert_batch(pa, batch, columns, schema))
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_rows:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+                rows += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+            rows += pending_rows
+    return rows
+
+
+def convert_and_upload(s3, bucket: str, csv_path: str, dataset: str, dt: str, sha: str) -> str:
+    """Runs the stage for one file and uploads the result; returns the s3:// URI."""
+    key = build_parquet_key(dataset, dt, sha)
+    with tempfile.TemporaryDirectory(prefix="parquet-") as tmp:
+        local = os.path.join(tmp, "part.parquet")
+        rows = csv_to_parquet(csv_path, local, dataset)
+        s3.upload_file(Filename=local, Bucket=bucket, Key=key, ExtraArgs={"ContentType": "application/vnd.apache.parquet"})
+    print(f"✅ Parquet written: s3://{bucket}/{key} ({rows} rows)")
+    return f"s3://{bucket}/{key}"
+
+
+def _arrow_type(pa, kind: str):
+    return {
+        "string": pa.string(),
+        "upper": pa.string(),
+        "double": pa.float64(),
+        "int32": pa.int32(),
+        "congestion_rank": pa.int32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }[kind]
+
+
+def _convert_batch(pa, batch, columns: dict[str, tuple[str, str]], schema):
+    import pyarrow.compute as pc
+
+    arrays = []
+    for name, (kind, src) in columns.items():
+        values = batch.column(batch.schema.get_field_index(src))
+        if kind == "string":
+            arrays.append(values)
+        elif kind == "upper":
+            arrays.append(pc.utf8_upper(pc.utf8_trim_whitespace(values)))
+        elif kind == "congestion_rank":
+            level = pc.utf8_upper(pc.utf8_trim_whitespace(values))
+            ranks = pa.scalar(None, pa.int32())
+            for label, rank in CONGESTION_RANKS.items():
+                ranks = pc.if_else(pc.equal(level, label), pa.scalar(rank, pa.int32()), ranks)
+            arrays.append(ranks)
+        else:
+            arrays.append(_try_cast(pa, pc, values, schema.field(name).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _try_cast(pa, pc, values, target):
+    """Vectorized cast; falls back to per-value parsing (bad value -> NULL) only if the batch has bad values."""
+    if pa.types.is_timestamp(target):
+        return _cast_timestamp(pa, pc, values, target)
+    trimmed = pc.utf8_trim_whitespace(values)
+    # '' is NULL for try_cast, not a bad value: keeps batches with empty fields on the fast path
+    trimmed = pc.if_else(pc.equal(trimmed, ""), pa.scalar(None, pa.string()), trimmed)
+    try:
+        return pc.cast(trimmed, target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+    parse = _parse_number(target, pa)
+    return pa.array([parse(v) for v in trimmed.to_pylist()], type=target)
+
+
+def _cast_timestamp(pa, pc, values, target):
+    """try(from_iso8601_timestamp(value)): values Trino would reject are NULL, precision is milliseconds."""
+    iso = pc.if_else(pc.match_substring_regex(values, ISO_8601_TIMESTAMP), values, pa.scalar(None, pa.string()))
+    try:
+        # Arrow parses the values with an offset; a batch with others goes through _parse_timestamp
+        parsed = pc.cast(iso, target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        parsed = pa.array([_parse_timestamp(v) for v in iso.to_pylist()], type=target)
+    return pc.floor_temporal(parsed, unit="millisecond")
+
+
+def _parse_number(target, pa):
+    convert = int if pa.types.is_integer(target) else float
+
+    def parse(value: str | None):
+        if value is None:
+            return None
+        try:
+            return convert(value)
+        except ValueError:
+            return None
+
+    return parse
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    match = _ISO_8601_TIMESTAMP.match(value) if value else None
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    # Values without an offset are taken as UTC (the POC's Trino session time zone)
+    tz = timezone.utc
+    if offset and offset != "Z":
+        digits = offset[1:].replace(":", "")
+        delta = timedelta(hours=int(digits[:2]), minutes=int(digits[2:] or 0))
+        tz = timezone(delta if offset[0] == "+" else -delta)
+    try:
+        ts = datetime(
+            int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0),
+            int((fraction or "").ljust(6, "0")[:6]), tzinfo=tz,
+        )
+    except ValueError:  # month 13, hour 25, ...
+        return None
+    return ts.astimezone(timezone.utc)
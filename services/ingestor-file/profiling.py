@@ -0,0 +1,353 @@
+"""
+Streaming record counting and cheap column profiling.
+
+Profilers are fed the same byte chunks that go into the sha256 (see app.py), so profiling never
+re-reads the file and memory stays bounded by the largest record, not by the file size.
+
+Result shape (goes to the ingest event and the `_metadata.json` sidecar):
+    {
+      "record_count": 1532,
+      "columns": {"vehicle_count": {"nulls": 0, "min": 0, "max": 412}, "city": {"nulls": 3}},
+      "bbox": [min_lon, min_lat, max_lon, max_lat]          # only when coordinates were found
+    }
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import math
+import os
+import re
+from abc import ABC, abstractmethod
+from itertools import zip_longest
+
+NULL_TOKENS = frozenset({"", "null", "NULL", "Null", "None", "NaN", "nan", "NA", "N/A", "n/a"})
+LON_COLUMNS = frozenset({"lon", "lng", "long", "longitude", "x"})
+LAT_COLUMNS = frozenset({"lat", "latitude", "y"})
+WKT_COLUMNS = frozenset({"geom_wkt", "wkt", "geometry_wkt", "geom", "geometry"})
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+# A JSON string (group 1 is empty if it is cut by the end of the buffer) or a structural character
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*("?)|[\[\]{},:]')
+
+
+class ColumnStats:
+    __slots__ = ("nulls", "min", "max", "numeric")
+
+    def __init__(self):
+        self.nulls = 0
+        self.min: float | None = None
+        self.max: float | None = None
+        self.numeric = True  # until a non-null, non-numeric value is seen
+
+    def add_numbers(self, values: list[float]) -> None:
+        # inf / nan parse as floats but are no bounds (and not valid JSON in the event)
+        values = [v for v in values if math.isfinite(v)]
+        if not values:
+            return
+        lo, hi = min(values), max(values)
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def to_dict(self) -> dict:
+        out = {"nulls": self.nulls}
+        if self.numeric and self.min is not None:
+            out["min"] = _json_number(self.min)
+            out["max"] = _json_number(self.max)
+        return out
+
+
+class BBox:
+    __slots__ = ("minx", "miny", "maxx", "maxy")
+
+    def __init__(self):
+        self.minx = self.miny = math.inf
+        self.maxx = self.maxy = -math.inf
+
+    def add(self, x: float, y: float) -> None:
+        if x < self.minx:
+            self.minx = x
+        if x > self.maxx:
+            self.maxx = x
+        if y < self.miny:
+            self.miny = y
+        if y > self.maxy:
+            self.maxy = y
+
+    def add_coordinates(self, coords) -> None:
+        """Any GeoJSON `coordinates` value (nested lists ending in [x, y, ...])."""
+        if not isinstance(coords, list) or not coords:
+            return
+        if isinstance(coords[0], (int, float)) and not isinstance(coords[0], bool):
+            if len(coords) >= 2 and math.isfinite(coords[0]) and math.isfinite(coords[1]):
+                self.add(float(coords[0]), float(coords[1]))
+            return
+        for c in coords:
+            self.add_coordinates(c)
+
+    def add_wkt(self, text: str) -> None:
+        nums = _NUMBER.findall(text)
+        for i in range(0, len(nums) - 1, 2):
+            self.add(float(nums[i]), float(nums[i + 1]))
+
+    def merge(self, other: "BBox") -> None:
+        if not other.empty:
+            self.add(other.minx, other.miny)
+            self.add(other.maxx, other.maxy)
+
+    @property
+    def empty(self) -> bool:
+        return self.minx == math.inf
+
+    def to_list(self) -> list[float] | None:
+        return None if self.empty else [self.minx, self.miny, self.maxx, self.maxy]
+
+
+class _Profiler(ABC):
+    def __init__(self, profile_columns: bool, max_columns: int):
+        self.profile_columns = profile_columns
+        self.max_columns = max_columns
+        self.record_count = 0
+        self.columns: dict[str, ColumnStats] = {}
+        self.bbox = BBox()
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+
+    def feed(self, chunk: bytes) -> None:
+        self._consume(self._decoder.decode(chunk), final=False)
+
+    def result(self) -> dict:
+        self._consume(self._decoder.decode(b"", final=True), final=True)
+
+        bbox = BBox()
+        bbox.merge(self.bbox)
+        # Point columns: their numeric min/max are the bbox
+        lon = next((c for n, c in self.columns.items() if n.lower() in LON_COLUMNS and c.numeric and c.min is not None), None)
+        lat = next((c for n, c in self.columns.items() if n.lower() in LAT_COLUMNS and c.numeric and c.min is not None), None)
+        if lon is not None and lat is not None:
+            bbox.add(lon.min, lat.min)
+            bbox.add(lon.max, lat.max)
+
+        out: dict = {"record_count": self.record_count}
+        if self.profile_columns:
+            out["columns"] = {name: stats.to_dict() for name, stats in self.columns.items()}
+        if not bbox.empty:
+            out["bbox"] = bbox.to_list()
+        return out
+
+    @abstractmethod
+    def _consume(self, text: str, final: bool) -> None:
+        """Decoded text of the next chunk; `final` on the last call (the end of the file)."""
+
+    def _column(self, name: str) -> ColumnStats | None:
+        stats = self.columns.get(name)
+        if stats is None and len(self.columns) < self.max_columns:
+            stats = self.columns[name] = ColumnStats()
+        return stats
+
+
+class CsvProfiler(_Profiler):
+    def __init__(self, profile_columns: bool = True, max_columns: int = 200):
+        super().__init__(profile_columns, max_columns)
+        self._pending = ""
+        self._header: list[str] | None = None
+
+    def _consume(self, text: str, final: bool) -> None:
+        text = self._pending + text
+        records = []
+        start = pos = quotes = 0
+        while True:
+            nl = text.find("\n", pos)
+            if nl == -1:
+                break
+            quotes += text.count('"', pos, nl)
+            pos = nl + 1
+            # A newline inside a quoted field does not end the record (escaped quotes come in pairs)
+            if quotes % 2 == 0:
+                if text[start:pos].strip("\r\n"):
+                    records.append(text[start:pos])
+                start = pos
+                quotes = 0
+        self._pending = text[start:]
+        if final and self._pending.strip("\r\n"):
+            records.append(self._pending)
+            self._pending = ""
+
+        if not records:
+            return
+        if self._header is None:
+            self._header = next(csv.reader(records[:1]))
+            records = records[1:]
+        self.record_count += len(records)
+        if self.profile_columns and records:
+            self._profile(list(csv.reader(records)))
+
+    def _profile(self, rows: list[list[str]]) -> None:
+        header = self._header
+        # Column-wise: one list per column, so min/max/float conversion run in C
+        for name, values in zip(header, zip_longest(*rows, fillvalue="")):
+            stats = self._column(name)
+            if stats is None:
+                continue
+            present = [v for v in values if v not in NULL_TOKENS]
+            stats.nulls += len(values) - len(present)
+            if name.lower() in WKT_COLUMNS:
+                stats.numeric = False
+                for v in present:
+                    self.bbox.add_wkt(v)
+                continue
+            if stats.numeric and present:
+                try:
+                    stats.add_numbers([float(v) for v in present])
+                except ValueError:
+                    stats.numeric = False
+        # Header columns missing from every row of this batch (short rows)
+        width = max(len(r) for r in rows)
+        for name in header[width:]:
+            stats = self._column(name)
+            if stats is not None:
+                stats.nulls += len(rows)
+
+
+class JsonProfiler(_Profiler):
+    """
+    Counts records in JSON / GeoJSON without building the document:
+      - top-level array: one record per element
+      - GeoJSON FeatureCollection: one record per element of `features`
+      - otherwise (single object, NDJSON): one record per top-level value
+    Records that are objects (and smaller than `max_record_chars`) are decoded one at a time for column stats.
+    """
+
+    def __init__(self, geojson: bool, profile_columns: bool = True, max_columns: int = 200, max_record_chars: int = 16 * 1024 * 1024):
+        super().__init__(profile_columns, max_columns)
+        self.geojson = geojson
+        self.max_record_chars = max_record_chars
+        self._buf = ""
+        self._depth = 0
+        self._record_depth: int | None = None  # container depth whose direct children are records
+        self._elem_start: int | None = None  # buffer offset of the record being read
+        self._elem_capture = False  # False: too large (or not needed), only counted
+        self._prev_end = 0  # buffer offset right after the last token
+        self._last_string: str | None = None
+        self._key: str | None = None  # last key seen directly inside the top-level object
+
+    def _consume(self, text: str, final: bool) -> None:
+        buf = self._buf + text
+        pos = self._prev_end
+        for m in _JSON_TOKEN.finditer(buf, pos):
+            tok = m.group(0)
+            start = m.start()
+            if tok[0] == '"':
+                if m.group(1) == "":
+                    pos = start  # string cut by the chunk boundary: resume from its opening quote
+                    break
+                if self._depth == self._record_depth and self._elem_start is None:
+                    if self._record_depth == 0:
+                        self._record(None)  # NDJSON line that is a bare string
+                    else:
+                        self._begin_record(start)
+                self._last_string = tok
+            elif tok == ":":
+                if self._depth == 1:
+                    self._key = self._last_string
+            elif tok in "[{":
+                self._open(tok, start)
+            elif tok in "]}":
+                self._close(buf, start)
+            else:  # ","
+                if self._depth == self._record_depth:
+                    self._end_scalar(buf, start)
+            pos = m.end()
+            self._prev_end = pos
+        else:
+            pos = len(buf)
+
+        if final:
+            if self._record_depth == 0 and self._elem_start is None and buf[self._prev_end:].strip():
+                self.record_count += 1  # trailing top-level scalar
+            self._buf = ""
+            return
+
+        # Keep only what is still needed: the record being captured, or the unparsed tail
+        keep = self._prev_end
+        if self._elem_start is not None and self._elem_capture:
+            if len(buf) - self._elem_start > self.max_record_chars:
+                self._elem_capture = False
+            else:
+                keep = min(keep, self._elem_start)
+        keep = min(keep, pos)
+        self._buf = buf[keep:]
+        self._prev_end -= keep
+        if self._elem_start is not None:
+            self._elem_start = max(self._elem_start - keep, 0)
+
+    def _begin_record(self, start: int) -> None:
+        self._elem_start = start
+        self._elem_capture = self.profile_columns
+
+    def _open(self, tok: str, start: int) -> None:
+        if self._depth == 0 and self._record_depth is None:
+            self._record_depth = 1 if tok == "[" else 0
+        elif (
+            self.geojson and tok == "[" and self._depth == 1 and self._record_depth == 0
+            and self._key == '"features"'
+        ):
+            # FeatureCollection: the features are the records, not the top-level object
+            self._record_depth = 2
+            self._elem_start = None
+        if self._depth == self._record_depth and self._elem_start is None:
+            self._begin_record(start)
+        self._depth += 1
+
+    def _close(self, buf: str, start: int) -> None:
+        if self._depth == self._record_depth:
+            self._end_scalar(buf, start)  # "]" closing the records container
+        self._depth -= 1
+        if self._depth == self._record_depth and self._elem_start is not None:
+            text = buf[self._elem_start:start + 1] if self._elem_capture else None
+            self._elem_start = None
+            self._record(text)
+
+    def _end_scalar(self, buf: str, start: int) -> None:
+        if self._elem_start is not None:  # string record
+            self._elem_start = None
+            self._record(None)
+        elif buf[self._prev_end:start].strip():  # number / true / false / null record
+            self._record(None)
+
+    def _record(self, text: str | None) -> None:
+        self.record_count += 1
+        if not text or text[0] != "{":
+            return
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return
+        if self.geojson and obj.get("type") == "Feature":
+            geometry = obj.get("geometry") or {}
+            self.bbox.add_coordinates(geometry.get("coordinates"))
+            props = obj.get("properties") or {}
+        else:
+            props = obj
+        for name, value in props.items():
+            stats = self._column(name)
+            if stats is None:
+                continue
+            if value is None or value == "":
+                stats.nulls += 1
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                stats.add_numbers([value])
+            else:
+                stats.numeric = False
+
+
+def make_profiler(content_type: str) -> _Profiler:
+    profile_columns = os.getenv("PROFILE_COLUMNS", "true").strip().lower() in ("1", "true", "yes")
+    max_columns = int(os.getenv("PROFILE_MAX_COLUMNS", "200"))
+    if content_type == "csv":
+        return CsvProfiler(profile_columns, max_columns)
+    return JsonProfiler(content_type == "geojson", profile_columns, max_columns)
+
+
+def _json_number(value: float):
+    return int(value) if float(value).is_integer() and abs(value) < 2**53 else value
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 import os
 
+from ingest_common.compression import Compression
+
 
 @dataclass(frozen=True)
 class Config:
@@ -16,6 +18,7 @@ class Config:
     s3_access_key: str
     s3_secret_key: str
     s3_bucket_raw: str
+    raw_compression: Compression
 
     # Kafka
     kafka_bootstrap_servers: str
@@ -29,6 +32,13 @@ class Config:
     validate_schema: bool
     schema_path: str
 
+    # Conditional fetch / change detection state ("" = in memory only)
+    state_path: str
+
+    # Multi-endpoint mode ("" = single HTTP_URL)
+    endpoints_file: str
+    max_in_flight: int
+
 
 def _get_env(name: str, default: str | None = None) -> str:
     val = os.getenv(name, default)
@@ -50,9 +60,13 @@ def load_config() -> Config:
 
     validate_schema = os.getenv("VALIDATE_SCHEMA", "false").strip().lower() in ("1", "true", "yes")
 
+    # With an endpoints file, HTTP_URL / HTTP_DATASET are only defaults for entries that omit them
+    endpoints_file = os.getenv("HTTP_ENDPOINTS_FILE", "").strip()
+    http_url = os.getenv("HTTP_URL", "").strip() if endpoints_file else _get_env("HTTP_URL")
+
     return Config(
         dataset=_get_env("HTTP_DATASET", "merchant_locations"),
-        http_url=_get_env("HTTP_URL"),
+        http_url=http_url,
         http_timeout_seconds=int(os.getenv("HTTP_TIMEOUT_SECONDS", "10")),
         poll_seconds=int(os.getenv("HTTP_POLL_SECONDS", "60")),
         run_mode=run_mode,
@@ -61,6 +75,7 @@ def load_config() -> Config:
         s3_access_key=access_key,
         s3_secret_key=secret_key,
         s3_bucket_raw=_get_env("MINIO_BUCKET_RAW", "raw"),
+        raw_compression=Compression.from_env(),
 
         kafka_bootstrap_servers=_get_env("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092"),
         kafka_topic=_get_env("KAFKA_TOPIC_INGEST_HTTP", "ingest.http.v1"),
@@ -70,4 +85,9 @@ def load_config() -> Config:
 
         validate_schema=validate_schema,
         schema_path=os.getenv("SCHEMA_PATH", "/contracts/events/ingest-http.v1.schema.json"),
+
+        state_path=os.getenv("HTTP_STATE_PATH", "").strip(),
+
+        endpoints_file=endpoints_file,
+        max_in_flight=max(1, int(os.getenv("HTTP_MAX_IN_FLIGHT", "16"))),
     )
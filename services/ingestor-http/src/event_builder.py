@@ -33,20 +33,28 @@ class EventInput:
     window_end: str | None
     env: str
     tenant: str
+    content_sha256: str | None = None
+    bytes: int | None = None
+    stored_bytes: int | None = None
+    compression: str = "none"
 
 
 def build_event(inp: EventInput) -> dict:
     event_time = utc_now_iso()
     ingest_time = utc_now_iso()
 
-    # Simple idempotency: dataset + endpoint (+ cursor if you later add it)
+    # Simple idempotency: dataset + endpoint (+ page position and content for paginated fetches)
     cursor_part = f":cursor={inp.cursor}" if inp.cursor else ""
-    idempotency_key = f"ingest-http:{inp.dataset}:{inp.endpoint}{cursor_part}"
+    window_part = f":window={inp.window_start}/{inp.window_end}" if inp.window_start else ""
+    # Paginated fetches: a page that changed between polls is a new ingestion
+    paged = inp.cursor is not None or inp.window_start is not None
+    sha_part = f":sha256={inp.content_sha256}" if paged and inp.content_sha256 else ""
+    idempotency_key = f"ingest-http:{inp.dataset}:{inp.endpoint}{cursor_part}{window_part}{sha_part}"
 
     event = {
         "event_id": inp.event_id,
         "event_type": "ingest.http",
-        "schema_version": "1.0.0",
+        "schema_version": "1.1.0",
         "source": "ingestor-http",
         "event_time": event_time,
         "ingest_time": ingest_time,
@@ -73,5 +81,12 @@ def build_event(inp: EventInput) -> dict:
         event["payload"]["window_start"] = inp.window_start
     if inp.window_end is not None:
         event["payload"]["window_end"] = inp.window_end
+    if inp.content_sha256 is not None:
+        event["payload"]["content_sha256"] = inp.content_sha256
+    if inp.bytes is not None:
+        event["payload"]["bytes"] = inp.bytes
+    if inp.compression != "none":
+        event["payload"]["compression"] = inp.compression
+        event["payload"]["stored_bytes"] = inp.stored_bytes
 
     return event
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class FetchStateStore:
+    """
+    Per-endpoint fetch state persisted in SQLite, so it survives restarts:
+        (dataset, url) -> {"etag": ..., "last_modified": ..., "sha256": ..., "raw_uri": ..., "checkpoint": ...}
+
+    Endpoints are keyed by dataset and URL: two datasets may poll the same URL (e.g. a full
+    snapshot and a paginated feed) without overwriting each other's state.
+    Each update writes only its own row (page checkpoints are frequent), not the whole state.
+    An empty path keeps the state in memory only.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._state: dict[tuple[str, str], dict] = {}
+        self._conn = None
+        if not path:
+            return
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        _move_legacy_json(path)
+        # One connection shared by the endpoint threads, serialized by our own lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fetch_state (
+                dataset TEXT NOT NULL,
+                url     TEXT NOT NULL,
+                state   TEXT NOT NULL,
+                PRIMARY KEY (dataset, url)
+            )
+            """
+        )
+        for dataset, url, state in self._conn.execute("SELECT dataset, url, state FROM fetch_state"):
+            self._state[(dataset, url)] = json.loads(state)
+
+    def get(self, dataset: str, url: str) -> dict:
+        with self._lock:
+            return dict(self._state.get((dataset, url), {}))
+
+    def update(self, dataset: str, url: str, **fields) -> None:
+        with self._lock:
+            entry = self._state.setdefault((dataset, url), {})
+            entry.update({k: v for k, v in fields.items() if v is not None})
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_state (dataset, url, state) VALUES (?, ?, ?)",
+                (dataset, url, json.dumps(entry, sort_keys=True)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _move_legacy_json(path: str) -> None:
+    # Older versions kept a JSON file keyed by URL only: it is set aside (one full re-fetch per endpoint)
+    try:
+        with open(path, "rb") as f:
+            header = f.read(16)
+    except FileNotFoundError:
+        return
+    if header and header != b"SQLite format 3\x00":
+        os.replace(path, path + ".legacy")
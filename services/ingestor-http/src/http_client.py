@@ -1,6 +1,10 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
+import threading
 import time
+from typing import Iterator
 import requests
+from requests.adapters import HTTPAdapter
 
 
 @dataclass(frozen=True)
@@ -10,11 +14,116 @@ class HttpResult:
     content_type: str
     duration_ms: int
     rate_limit_remaining: int | None
+    # Validators for the next conditional request
+    etag: str | None = None
+    last_modified: str | None = None
 
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
 
-def fetch_once(url: str, timeout_seconds: int) -> HttpResult:
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+# Connection pool size of every session built in this process (set once from HTTP_MAX_IN_FLIGHT)
+_pool_maxsize = 10
+
+
+def get_session(pool_maxsize: int | None = None) -> requests.Session:
+    """Process-wide keep-alive session: TCP/TLS connections are reused across polls."""
+    global _session, _pool_maxsize
+    if _session is None or pool_maxsize is not None:
+        with _session_lock:
+            if pool_maxsize is not None:
+                _pool_maxsize = pool_maxsize
+            if _session is None:
+                _session = _new_session(_pool_maxsize)
+    return _session
+
+
+def _new_session(pool_maxsize: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Refused / reset / stale keep-alive connections, as opposed to HTTP status or body errors."""
+    return isinstance(error, requests.ConnectionError)
+
+
+def reset_connections() -> None:
+    """
+    Swap in a fresh session (same pool size) after connection errors.
+    The old one is not closed: requests other threads are running on it finish normally and its
+    connections are released once it is no longer referenced.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session = _new_session(_pool_maxsize)
+
+
+def close_session() -> None:
+    """Close the pooled connections at shutdown; a later call builds a new session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def fetch_once(
+    url: str,
+    timeout_seconds: int,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    params: dict[str, str] | None = None,
+) -> HttpResult:
+    """Buffered GET (the whole body in `content`): for small responses such as API pages."""
+    started = time.perf_counter()
+    resp = get_session().get(url, params=params, timeout=timeout_seconds, headers=_conditional_headers(etag, last_modified))
+    return _result(resp, started, resp.content, etag, last_modified)
+
+
+@contextmanager
+def fetch_stream(
+    url: str,
+    timeout_seconds: int,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    chunk_size: int = 1024 * 1024,
+):
+    """
+    Streaming GET: yields (HttpResult without content, iterator of body chunks).
+    The body is read from the socket as the iterator is consumed, so memory does not grow with the
+    response size. `duration_ms` is the time to the response headers.
+    """
     started = time.perf_counter()
-    resp = requests.get(url, timeout=timeout_seconds)
+    resp = get_session().get(
+        url, timeout=timeout_seconds, headers=_conditional_headers(etag, last_modified), stream=True
+    )
+    try:
+        res = _result(resp, started, b"", etag, last_modified)
+        chunks: Iterator[bytes] = resp.iter_content(chunk_size=chunk_size)
+        yield res, chunks
+    finally:
+        resp.close()
+
+
+def _conditional_headers(etag: str | None, last_modified: str | None) -> dict:
+    # Conditional GET: the server answers 304 with an empty body if nothing changed
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _result(resp, started: float, content: bytes, etag: str | None, last_modified: str | None) -> HttpResult:
     duration_ms = int((time.perf_counter() - started) * 1000)
 
     content_type = resp.headers.get("Content-Type", "application/json")
@@ -22,12 +131,15 @@ def fetch_once(url: str, timeout_seconds: int) -> HttpResult:
     rate_limit_remaining = int(rlr) if (rlr is not None and rlr.isdigit()) else None
 
     # For Day 4 you want "fail fast" if not 2xx
-    resp.raise_for_status()
+    if resp.status_code != 304:
+        resp.raise_for_status()
 
     return HttpResult(
         status=resp.status_code,
-        content=resp.content,
+        content=content,
         content_type=content_type,
         duration_ms=duration_ms,
         rate_limit_remaining=rate_limit_remaining,
+        etag=resp.headers.get("ETag") or etag,
+        last_modified=resp.headers.get("Last-Modified") or last_modified,
     )
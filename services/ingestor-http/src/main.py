@@ -1,44 +1,157 @@
 from __future__ import annotations
 
-import json
+import asyncio
 from pathlib import Path
+import signal
+import threading
 import time
 import uuid
+from dataclasses import replace
 from datetime import datetime, timezone
 
 from config import load_config
-from http_client import fetch_once
-from raw_store import put_raw_json
+from http_client import fetch_once, fetch_stream
+from raw_store import StoredObject, stream_raw_object
 from event_builder import build_event, build_raw_key, EventInput
-from confluent_kafka import Producer
+from pagination import PageRequest, PaginationConfig, load_pagination_config, run_incremental
+from resources import Resources
+from scheduler import Endpoint, load_endpoints, run_scheduler
 from schema_validation import validate_event
+from ingest_common.log import get_logger, log_context
+from ingest_common.timing import PhaseTimer
+
+
+# Per-page lines: at most this many per second (LOG_RATE_LIMIT overrides), the rest only counted
+LOG_RATE_LIMITS = {"ingest.http delivered": 20}
 
 
 def log_json(message: str, **fields) -> None:
-    payload = {"msg": message, **fields}
-    print(json.dumps(payload, ensure_ascii=False))
+    # Queued on the shared writer (ingest_common.log); lines carrying an error are logged as errors
+    log = get_logger("ingestor-http", rate_limits=LOG_RATE_LIMITS)
+    (log.error if "error" in fields else log.info)(message, **fields)
 
 
-def run_once(cfg) -> None:
+def run_once(cfg, resources: Resources, timer: PhaseTimer) -> int | None:
+    """Fetch + store + publish one endpoint; returns X-RateLimit-Remaining of the response."""
     now_utc = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    state = resources.state
 
-    # 1) Fetch
-    res = fetch_once(cfg.http_url, cfg.http_timeout_seconds)
+    # 1) Fetch (conditional: ETag / Last-Modified from the previous poll), streamed
+    prev = state.get(cfg.dataset, cfg.http_url)
+    with fetch_stream(cfg.http_url, cfg.http_timeout_seconds, etag=prev.get("etag"), last_modified=prev.get("last_modified")) as (res, chunks):
+        timer.add("fetch", res.duration_ms / 1000)  # up to the response headers
+        # Unchanged upstream: no RAW object, no event. raw_uri points to the copy we already have.
+        if res.not_modified:
+            log_json("ingest.http unchanged", reason="http_304", dataset=cfg.dataset, http_url=cfg.http_url,
+                     raw_uri=prev.get("raw_uri"), duration_ms=res.duration_ms)
+            return res.rate_limit_remaining
 
-    # 2) Store RAW
-    event_id = str(uuid.uuid4())
+        # 2) Store RAW: the body goes straight from the socket to S3, hashed on the way.
+        # Same body as the last stored one (known only at the end): the upload is discarded.
+        event_id = str(uuid.uuid4())
+        raw_key = build_raw_key(cfg.dataset, "ingestor-http", event_id, now_utc)
+        with timer.phase("store"):  # body download + upload, interleaved
+            stored = stream_raw_object(
+                s3=resources.s3,
+                bucket=cfg.s3_bucket_raw,
+                key=raw_key,
+                chunks=chunks,
+                content_type=res.content_type,
+                keep=lambda sha: sha != prev.get("sha256"),
+                compression=cfg.raw_compression,
+            )
+    res = replace(res, duration_ms=int((time.perf_counter() - started) * 1000))
 
-    raw_key = build_raw_key(cfg.dataset, "ingestor-http", event_id, now_utc)
-    raw_uri = put_raw_json(
-        endpoint_url=cfg.s3_endpoint,
-        access_key=cfg.s3_access_key,
-        secret_key=cfg.s3_secret_key,
-        bucket=cfg.s3_bucket_raw,
-        key=raw_key,
-        body=res.content,
-        content_type=res.content_type,
+    if stored.uri is None:
+        state.update(cfg.dataset, cfg.http_url, etag=res.etag, last_modified=res.last_modified)
+        log_json("ingest.http unchanged", reason="same_sha256", dataset=cfg.dataset, http_url=cfg.http_url,
+                 raw_uri=prev.get("raw_uri"), duration_ms=res.duration_ms)
+        return res.rate_limit_remaining
+
+    publish_ingest_event(cfg, resources, timer, res, event_id, stored)
+
+    # Only after a successful publish: a failed run is retried in full on the next poll
+    state.update(cfg.dataset, cfg.http_url, etag=res.etag, last_modified=res.last_modified, sha256=stored.sha256, raw_uri=stored.uri)
+
+    log_json(
+        "ingest.http done",
+        dataset=cfg.dataset,
+        http_url=cfg.http_url,
+        raw_uri=stored.uri,
+        kafka_topic=cfg.kafka_topic,
+        http_status=res.status,
+        duration_ms=res.duration_ms,
+        bytes=stored.size,
+        stored_bytes=stored.stored_size,
     )
+    return res.rate_limit_remaining
+
+
+def run_incremental_once(cfg, pcfg: PaginationConfig, resources: Resources, timer: PhaseTimer) -> int | None:
+    """One poll of a paginated endpoint: only pages/windows after the stored checkpoint are fetched."""
+    now_utc = datetime.now(timezone.utc)
+    state = resources.state
+    remaining: list[int] = []
+
+    def fetch(params: dict[str, str]):
+        with timer.phase("fetch"):
+            res = fetch_once(cfg.http_url, cfg.http_timeout_seconds, params=params)
+        if res.rate_limit_remaining is not None:
+            remaining.append(res.rate_limit_remaining)
+        return res
 
+    def ingest(res, req: PageRequest, sha: str) -> str:
+        raw_uri = store_and_publish(cfg, resources, timer, res, now_utc, req.cursor, req.window_start, req.window_end)
+        log_json("ingest.http page done", dataset=cfg.dataset, http_url=cfg.http_url, raw_uri=raw_uri,
+                 cursor=req.cursor, window_start=req.window_start, window_end=req.window_end,
+                 duration_ms=res.duration_ms)
+        return raw_uri
+
+    checkpoint = state.get(cfg.dataset, cfg.http_url).get("checkpoint", {})
+    stored = run_incremental(pcfg, checkpoint, fetch, ingest, lambda cp: state.update(cfg.dataset, cfg.http_url, checkpoint=cp))
+    log_json("ingest.http done", dataset=cfg.dataset, http_url=cfg.http_url, pagination=pcfg.strategy,
+             pages_stored=stored, checkpoint=state.get(cfg.dataset, cfg.http_url).get("checkpoint"))
+    return min(remaining) if remaining else None
+
+
+def store_and_publish(
+    cfg,
+    resources: Resources,
+    timer: PhaseTimer,
+    res,
+    now_utc: datetime,
+    cursor: str | None = None,
+    window_start: str | None = None,
+    window_end: str | None = None,
+) -> str:
+    """Buffered page: same RAW write path as streamed bodies, fed from memory."""
+    event_id = str(uuid.uuid4())
+    raw_key = build_raw_key(cfg.dataset, "ingestor-http", event_id, now_utc)
+    with timer.phase("store"):
+        stored = stream_raw_object(
+            s3=resources.s3,
+            bucket=cfg.s3_bucket_raw,
+            key=raw_key,
+            chunks=[res.content],
+            content_type=res.content_type,
+            compression=cfg.raw_compression,
+        )
+    publish_ingest_event(cfg, resources, timer, res, event_id, stored, cursor, window_start, window_end)
+    return stored.uri
+
+
+def publish_ingest_event(
+    cfg,
+    resources: Resources,
+    timer: PhaseTimer,
+    res,
+    event_id: str,
+    stored: StoredObject,
+    cursor: str | None = None,
+    window_start: str | None = None,
+    window_end: str | None = None,
+) -> None:
     # 3) Build event (matches ingest-http.v1.schema.json)
     ev = build_event(
         EventInput(
@@ -46,62 +159,99 @@ def run_once(cfg) -> None:
             dataset=cfg.dataset,
             endpoint=cfg.http_url,
             http_status=res.status,
-            raw_uri=raw_uri,
+            raw_uri=stored.uri,
             http_method="GET",
             duration_ms=res.duration_ms,
             rate_limit_remaining=res.rate_limit_remaining,
-            cursor=None,
-            window_start=None,
-            window_end=None,
+            cursor=cursor,
+            window_start=window_start,
+            window_end=window_end,
             env=cfg.env,
             tenant=cfg.tenant,
+            content_sha256=stored.sha256,
+            bytes=stored.size,
+            stored_bytes=stored.stored_size,
+            compression=stored.compression,
         )
     )
 
     if cfg.validate_schema:
-        validate_event(Path(cfg.schema_path), ev)
-
-    # 4) Publish Kafka (use idempotency_key as message key)
-    producer = Producer({
-        "bootstrap.servers": cfg.kafka_bootstrap_servers,
-        "client.id": "ingestor-file",
-        # Make failures visible fast in a POC
-        "socket.timeout.ms": 5000,
-        "message.timeout.ms": 10000,
-    })
-    def delivery_report(err, msg):
-        if err is not None:
-            raise SystemExit(f"Kafka delivery failed: {err}")
-        print(f"✅ Kafka delivered to {msg.topic()} [{msg.partition()}] @ offset {msg.offset()}")
-
-    producer.produce(topic=cfg.kafka_topic, key=ev.get("idempotency_key"), value=json.dumps(ev).encode("utf-8"), callback=delivery_report)
-    producer.flush(10)
+        with timer.phase("validate"):
+            validate_event(Path(cfg.schema_path), ev)
 
-    log_json(
-        "ingest.http done",
-        dataset=cfg.dataset,
-        http_url=cfg.http_url,
-        raw_uri=raw_uri,
-        kafka_topic=cfg.kafka_topic,
-        http_status=res.status,
-        duration_ms=res.duration_ms,
-    )
+    # 4) Publish Kafka (use idempotency_key as message key) on the process-wide producer
+    with timer.phase("publish"):
+        delivery = resources.publisher.publish(cfg.kafka_topic, ev, key=ev.get("idempotency_key")).result(timeout=30)
+    resources.metrics.processed(stored.size, dataset=cfg.dataset)
+    log_json("ingest.http delivered", kafka_topic=delivery.topic, partition=delivery.partition, offset=delivery.offset)
+
+
+def poll_endpoint(ep: Endpoint, resources: Resources) -> int | None:
+    """One iteration for one endpoint, followed by its timing record."""
+    metrics = resources.metrics
+    # Every fetch / store / validate / publish also lands in the stage latency histogram
+    timer = PhaseTimer(on_phase=lambda name, seconds: metrics.observe(name, seconds, dataset=ep.cfg.dataset))
+    ok = False
+    # poll_id ties together every line of this poll (pages, errors, timings)
+    with log_context(poll_id=uuid.uuid4().hex[:12]):
+        try:
+            with metrics.in_flight(dataset=ep.cfg.dataset), metrics.stage("poll", dataset=ep.cfg.dataset):
+                if ep.pagination.strategy == "none":
+                    remaining = run_once(ep.cfg, resources, timer)
+                else:
+                    remaining = run_incremental_once(ep.cfg, ep.pagination, resources, timer)
+            ok = True
+            return remaining
+        except Exception as e:
+            resources.recover(e)
+            raise
+        finally:
+            log_json("ingest.http timings", **timer.record(dataset=ep.cfg.dataset, http_url=ep.cfg.http_url, ok=ok))
 
 
 def main() -> None:
     cfg = load_config()
-    log_json("ingestor-http starting", run_mode=cfg.run_mode, dataset=cfg.dataset, http_url=cfg.http_url)
+    log_json("ingestor-http starting", run_mode=cfg.run_mode, dataset=cfg.dataset, http_url=cfg.http_url,
+             endpoints_file=cfg.endpoints_file or None)
+
+    # Clients are built and connected once, then shared by every iteration and endpoint
+    resources = Resources(cfg)
+    resources.warm_up()
+    pcfg = load_pagination_config()
 
+    if cfg.endpoints_file:
+        # Many endpoints on one event loop; RUN_MODE=once polls each of them once
+        endpoints = load_endpoints(cfg.endpoints_file, cfg, pcfg)
+        try:
+            asyncio.run(run_scheduler(endpoints, lambda ep: poll_endpoint(ep, resources),
+                                      cfg.max_in_flight, once=cfg.run_mode == "once", log=log_json))
+        finally:
+            resources.close()
+        log_json("ingestor-http stopped")
+        return
+
+    single = Endpoint(cfg, pcfg, jitter_seconds=0)
     if cfg.run_mode == "once":
-        run_once(cfg)
+        try:
+            poll_endpoint(single, resources)
+        finally:
+            resources.close()
         return
 
-    while True:
+    # SIGTERM/SIGINT end the loop after the current iteration, then queued messages are drained
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    while not stop.is_set():
         try:
-            run_once(cfg)
+            poll_endpoint(single, resources)
         except Exception as e:
             log_json("ingestor-http error", error=str(e))
-        time.sleep(cfg.poll_seconds)
+        stop.wait(cfg.poll_seconds)
+
+    resources.close()
+    log_json("ingestor-http stopped")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+"""
+Incremental fetch strategies for paginated endpoints (HTTP_PAGINATION != "none").
+
+Every page (or time window) is stored as its own RAW object with its own event; the position reached
+is checkpointed in the fetch state (see fetch_state.py) after each page, so the next poll only asks
+for new data:
+
+  page    ?page=N&per_page=S     resumes at the last page that was not full (it may have grown)
+  cursor  ?cursor=C              follows `next_cursor` from the body; resumes at the last cursor
+  window  ?since=T0&until=T1     fixed-size windows from the checkpoint up to now - lag
+
+Pages of the "page" strategy and windows are independent requests, so up to HTTP_PAGE_CONCURRENCY
+of them are fetched at once; cursors are inherently sequential.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from ingest_common.serialization import loads
+
+STRATEGIES = ("none", "page", "cursor", "window")
+
+
+@dataclass(frozen=True)
+class PaginationConfig:
+    strategy: str
+    concurrency: int
+    max_pages: int  # per poll, 0 = unlimited
+    items_field: str  # dot path of the record list in the body ("" = the body is the list)
+    # page
+    page_param: str
+    page_size_param: str
+    page_size: int
+    first_page: int
+    # cursor
+    cursor_param: str
+    next_cursor_field: str
+    # window
+    window_start_param: str
+    window_end_param: str
+    window_minutes: int
+    window_lag_seconds: int
+    initial_window_start: str
+
+
+def load_pagination_config() -> PaginationConfig:
+    strategy = os.getenv("HTTP_PAGINATION", "none").strip().lower()
+    if strategy not in STRATEGIES:
+        raise ValueError(f"HTTP_PAGINATION must be one of {', '.join(STRATEGIES)}")
+
+    return PaginationConfig(
+        strategy=strategy,
+        concurrency=max(1, int(os.getenv("HTTP_PAGE_CONCURRENCY", "1"))),
+        max_pages=int(os.getenv("HTTP_MAX_PAGES", "0")),
+        items_field=os.getenv("HTTP_ITEMS_FIELD", "").strip(),
+
+        page_param=os.getenv("HTTP_PAGE_PARAM", "page"),
+        page_size_param=os.getenv("HTTP_PAGE_SIZE_PARAM", "per_page"),
+        page_size=int(os.getenv("HTTP_PAGE_SIZE", "100")),
+        first_page=int(os.getenv("HTTP_FIRST_PAGE", "1")),
+
+        cursor_param=os.getenv("HTTP_CURSOR_PARAM", "cursor"),
+        next_cursor_field=os.getenv("HTTP_NEXT_CURSOR_FIELD", "next_cursor"),
+
+        window_start_param=os.getenv("HTTP_WINDOW_START_PARAM", "since"),
+        window_end_param=os.getenv("HTTP_WINDOW_END_PARAM", "until"),
+        window_minutes=int(os.getenv("HTTP_WINDOW_MINUTES", "60")),
+        window_lag_seconds=int(os.getenv("HTTP_WINDOW_LAG_SECONDS", "60")),
+        initial_window_start=os.getenv("HTTP_WINDOW_START", "").strip(),
+    )
+
+
+@dataclass(frozen=True)
+class PageRequest:
+    params: dict[str, str]
+    # What ends up in the event payload / idempotency key
+    cursor: str | None = None
+    window_start: str | None = None
+    window_end: str | None = None
+
+
+@dataclass(frozen=True)
+class PageResult:
+    request: PageRequest
+    body: object  # parsed JSON
+    sha256: str
+    raw_uri: str | None  # None when the page was identical to the checkpointed one
+
+
+# fetch(params) -> HttpResult ; ingest(HttpResult, PageRequest, sha256) -> raw_uri
+FetchFn = Callable[[dict[str, str]], object]
+IngestFn = Callable[[object, PageRequest, str], str]
+
+
+def run_incremental(pcfg: PaginationConfig, checkpoint: dict, fetch: FetchFn, ingest: IngestFn,
+                    save_checkpoint: Callable[[dict], None]) -> int:
+    """Fetches everything after `checkpoint`; returns the number of pages stored."""
+    runner = {"page": _run_pages, "cursor": _run_cursor, "window": _run_windows}[pcfg.strategy]
+    return runner(pcfg, checkpoint, fetch, ingest, save_checkpoint)
+
+
+def _fetch_and_ingest(req: PageRequest, fetch: FetchFn, ingest: IngestFn, skip_sha: str | None, items_field: str) -> PageResult:
+    res = fetch(req.params)
+    sha = hashlib.sha256(res.content).hexdigest()
+    body = loads(res.content) if res.content else None
+    # Re-fetched tail page that did not change since the last poll, or an empty page: nothing to store
+    if sha == skip_sha or _items(body, items_field) == []:
+        return PageResult(req, body, sha, None)
+    return PageResult(req, body, sha, ingest(res, req, sha))
+
+
+def _run_pages(pcfg, checkpoint, fetch, ingest, save_checkpoint) -> int:
+    page = resume_page = int(checkpoint.get("page", pcfg.first_page))
+    stored = fetched = 0
+
+    def request(n: int) -> PageRequest:
+        return PageRequest({pcfg.page_param: str(n), pcfg.page_size_param: str(pcfg.page_size)}, cursor=f"page={n}")
+
+    with ThreadPoolExecutor(max_workers=pcfg.concurrency, thread_name_prefix="page") as pool:
+        while True:
+            batch = [page + i for i in range(_budget(pcfg, fetched, pcfg.concurrency))]
+            if not batch:
+                return stored
+            futures = [
+                pool.submit(_fetch_and_ingest, request(n), fetch, ingest,
+                            checkpoint.get("sha256") if n == resume_page else None, pcfg.items_field)
+                for n in batch
+            ]
+            # Results are consumed in page order, so the checkpoint never skips a page
+            for n, fut in zip(batch, futures):
+                result = fut.result()
+                fetched += 1
+                stored += result.raw_uri is not None
+                items = _items(result.body, pcfg.items_field) or []
+                if len(items) < pcfg.page_size:
+                    # Last (partial) page: keep it as the resume point, with its hash to skip it if unchanged
+                    save_checkpoint({"page": n, "sha256": result.sha256})
+                    for later in futures:
+                        later.result()  # speculative pages past the end are empty; surface errors anyway
+                    return stored
+                save_checkpoint({"page": n + 1})
+            page = batch[-1] + 1
+
+
+def _run_cursor(pcfg, checkpoint, fetch, ingest, save_checkpoint) -> int:
+    cursor = checkpoint.get("cursor")
+    skip_sha = checkpoint.get("sha256")
+    stored = fetched = 0
+    while _budget(pcfg, fetched, 1):
+        params = {pcfg.cursor_param: cursor} if cursor else {}
+        result = _fetch_and_ingest(PageRequest(params, cursor=cursor or "start"), fetch, ingest, skip_sha, pcfg.items_field)
+        fetched += 1
+        stored += result.raw_uri is not None
+        next_cursor = _dig(result.body, pcfg.next_cursor_field)
+        if not next_cursor or next_cursor == cursor:
+            # End of the stream for now: resume from this cursor, skipping the page if it did not change
+            save_checkpoint({"cursor": cursor, "sha256": result.sha256})
+            break
+        cursor, skip_sha = str(next_cursor), None
+        save_checkpoint({"cursor": cursor, "sha256": None})
+    return stored
+
+
+def _run_windows(pcfg, checkpoint, fetch, ingest, save_checkpoint) -> int:
+    now = datetime.now(timezone.utc) - timedelta(seconds=pcfg.window_lag_seconds)
+    size = timedelta(minutes=pcfg.window_minutes)
+    start = _parse_ts(checkpoint.get("window_end") or pcfg.initial_window_start) or (now - size)
+
+    windows = []
+    while start + size <= now and _budget(pcfg, len(windows), 1):
+        windows.append((start, start + size))
+        start += size
+
+    def request(w: tuple[datetime, datetime]) -> PageRequest:
+        ws, we = _iso(w[0]), _iso(w[1])
+        return PageRequest({pcfg.window_start_param: ws, pcfg.window_end_param: we}, window_start=ws, window_end=we)
+
+    stored = 0
+    with ThreadPoolExecutor(max_workers=pcfg.concurrency, thread_name_prefix="window") as pool:
+        futures = [pool.submit(_fetch_and_ingest, request(w), fetch, ingest, None, pcfg.items_field) for w in windows]
+        # Advance only over the contiguous prefix of completed windows: a failed window is retried next poll
+        for w, fut in zip(windows, futures):
+            stored += fut.result().raw_uri is not None
+            save_checkpoint({"window_end": _iso(w[1])})
+    return stored
+
+
+def _budget(pcfg: PaginationConfig, fetched: int, want: int) -> int:
+    if pcfg.max_pages <= 0:
+        return want
+    return max(0, min(want, pcfg.max_pages - fetched))
+
+
+def _items(body, items_field: str) -> list | None:
+    value = _dig(body, items_field) if items_field else body
+    return value if isinstance(value, list) else None
+
+
+def _dig(body, path: str):
+    for part in path.split(".") if path else []:
+        if not isinstance(body, dict):
+            return None
+        body = body.get(part)
+    return body
+
+
+def _parse_ts(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _iso(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
@@ -1,17 +1,31 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
 import boto3
 
+from ingest_common.compression import Compression, rechunk
 
-def put_raw_json(
-    *,
-    endpoint_url: str,
-    access_key: str,
-    secret_key: str,
-    bucket: str,
-    key: str,
-    body: bytes,
-    content_type: str,
-) -> str:
-    s3 = boto3.client(
+# S3 minimum for every multipart part but the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    uri: str | None  # None when the upload was discarded (see `keep`)
+    sha256: str  # of the uncompressed body
+    size: int  # uncompressed bytes
+    stored_size: int  # bytes written to S3 (== size without compression)
+    compression: str = "none"
+
+
+def build_s3_client(*, endpoint_url: str, access_key: str, secret_key: str):
+    return boto3.client(
         "s3",
         endpoint_url=endpoint_url,
         aws_access_key_id=access_key,
@@ -19,11 +33,98 @@ def put_raw_json(
         region_name="us-east-1",
     )
 
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=body,
-        ContentType=content_type,
-    )
 
-    return f"s3://{bucket}/{key}"
+def upload_part_size() -> int:
+    return max(MIN_PART_SIZE, int(os.getenv("UPLOAD_PART_SIZE_MB", "8")) * 1024 * 1024)
+
+
+def stream_raw_object(
+    *,
+    s3,
+    bucket: str,
+    key: str,
+    chunks: Iterable[bytes],
+    content_type: str,
+    keep: Callable[[str], bool] = lambda sha256: True,
+    compression: Compression | None = None,
+) -> StoredObject:
+    """
+    Pipes `chunks` (e.g. an HTTP response body) into s3://bucket/key, hashing and counting as it goes.
+
+    Bodies smaller than one part are sent with a single put_object; larger ones as a multipart
+    upload with at most UPLOAD_CONCURRENCY parts in flight, so memory stays bounded to
+    (UPLOAD_CONCURRENCY + 1) parts whatever the body size.
+    `keep(sha256)` is asked once the whole body has been read: if it returns False nothing is
+    written (the multipart upload is aborted).
+
+    Limitation: the sha256 is only known at the end, so for a body larger than one part an
+    unchanged response is still uploaded in full before it is discarded; only bodies below
+    UPLOAD_PART_SIZE_MB skip the upload. Holding the body back (memory or a temp file) until the
+    hash is known would give up the bounded memory / no local disk use; conditional GETs
+    (ETag / Last-Modified) are what avoid re-downloading unchanged content in the first place.
+
+    With `compression` enabled the body is compressed on the fly, the key gets the codec suffix
+    and the object its Content-Encoding; sha256 and size still describe the uncompressed body.
+    """
+    if compression is None:
+        compression = Compression()
+    part_size = upload_part_size()
+    h = hashlib.sha256()
+    key = compression.object_key(key)
+
+    def _hashed(stream: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in stream:
+            h.update(chunk)
+            yield chunk
+
+    encoded = compression.encode(_hashed(chunks))
+    parts_iter = rechunk(encoded, part_size)
+
+    def _stored(uri: str | None) -> StoredObject:
+        return StoredObject(uri, h.hexdigest(), encoded.raw_bytes, encoded.stored_bytes, compression.codec)
+
+    first = next(parts_iter, b"")
+    if len(first) < part_size:
+        if not keep(h.hexdigest()):
+            return _stored(None)
+        s3.put_object(Bucket=bucket, Key=key, Body=first, ContentType=content_type, **compression.put_args())
+        return _stored(f"s3://{bucket}/{key}")
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType=content_type, **compression.put_args()
+    )["UploadId"]
+    concurrency = max(1, int(os.getenv("UPLOAD_CONCURRENCY", "4")))
+    slots = threading.BoundedSemaphore(concurrency)
+    failed = threading.Event()
+
+    def _upload_part(number: int, data: bytes) -> dict:
+        try:
+            resp = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data)
+            return {"PartNumber": number, "ETag": resp["ETag"]}
+        except BaseException:
+            failed.set()
+            raise
+        finally:
+            slots.release()
+
+    try:
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload-part") as pool:
+            part, number = first, 1
+            while part and not failed.is_set():
+                slots.acquire()
+                futures.append(pool.submit(_upload_part, number, part))
+                part = next(parts_iter, b"")
+                number += 1
+            parts = [fut.result() for fut in futures]
+
+        if not keep(h.hexdigest()):
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            return _stored(None)
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return _stored(f"s3://{bucket}/{key}")
+
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from fetch_state import FetchStateStore
+from http_client import close_session, get_session, is_connection_error, reset_connections
+from raw_store import build_s3_client
+from ingest_common.contracts import get_registry
+from ingest_common.log import get_logger
+from ingest_common.kafka_publisher import KafkaPublisher, PublisherConfig, get_publisher
+from ingest_common.metrics import IngestMetrics, get_metrics
+
+
+class Resources:
+    """
+    Clients built once per process and reused by every iteration / endpoint:
+    S3 client, Kafka publisher, HTTP session, compiled contracts, the fetch state and the metrics.
+
+    `warm_up()` opens the connections at start-up so the first iteration does not pay for them;
+    `recover()` re-checks them after a failed iteration and rebuilds what is broken.
+    """
+
+    # Minimum interval between two health probes triggered by failures (they block for up to 5 s)
+    PROBE_INTERVAL_S = 30.0
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.publisher: KafkaPublisher = get_publisher(PublisherConfig.from_env("ingestor-http", cfg.kafka_bootstrap_servers))
+        self.state = FetchStateStore(cfg.state_path)
+        self.metrics: IngestMetrics = get_metrics("ingestor-http")
+        self._s3 = None
+        self._lock = threading.Lock()
+        self._probed_at: float | None = None
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            with self._lock:
+                if self._s3 is None:
+                    self._s3 = build_s3_client(
+                        endpoint_url=self.cfg.s3_endpoint, access_key=self.cfg.s3_access_key, secret_key=self.cfg.s3_secret_key
+                    )
+        return self._s3
+
+    def warm_up(self) -> dict:
+        """Connect everything once; returns per-component duration (ms) or the error."""
+        report = {}
+        for name, step in (
+            ("http", lambda: get_session(pool_maxsize=self.cfg.max_in_flight)),
+            ("s3", lambda: self.s3.head_bucket(Bucket=self.cfg.s3_bucket_raw)),
+            ("kafka", self._check_kafka),
+            ("contracts", self._warm_contracts),
+        ):
+            started = time.perf_counter()
+            try:
+                step()
+                report[name] = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                # Not fatal: the iteration will fail (and be retried) with a precise error
+                report[name] = f"error: {e}"
+        _log("ingestor-http resources warmed up", **report)
+        return report
+
+    def health(self) -> dict[str, bool]:
+        checks = {"kafka": self.publisher.check(timeout=5)}
+        try:
+            self.s3.head_bucket(Bucket=self.cfg.s3_bucket_raw)
+            checks["s3"] = True
+        except Exception:
+            checks["s3"] = False
+        return checks
+
+    def recover(self, error: BaseException) -> dict[str, bool] | None:
+        """
+        After a failed iteration: drop the pooled HTTP connections on connection errors, and
+        rebuild the S3 client if a health probe finds it broken. HTTP status and validation errors
+        say nothing about S3 / Kafka, so they are not probed; other failures probe at most once
+        per PROBE_INTERVAL_S. Returns the checks, None when not probed.
+        """
+        if is_connection_error(error):
+            reset_connections()
+        if isinstance(error, (requests.RequestException, ValueError)):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._probed_at is not None and now - self._probed_at < self.PROBE_INTERVAL_S:
+                return None
+            self._probed_at = now
+        checks = self.health()
+        if not checks["s3"]:
+            with self._lock:
+                self._s3 = None
+        _log("ingestor-http resources checked", **checks)
+        return checks
+
+    def close(self) -> None:
+        self.publisher.close()
+        self.metrics.close()
+        self.state.close()
+        close_session()
+
+    def _check_kafka(self) -> None:
+        if not self.publisher.check(timeout=5):
+            raise RuntimeError(f"Kafka not reachable at {self.cfg.kafka_bootstrap_servers}")
+
+    def _warm_contracts(self) -> None:
+        if self.cfg.validate_schema:
+            get_registry(Path(self.cfg.schema_path).parent).warm_up()
+
+
+def _log(message: str, **fields) -> None:
+    get_logger("ingestor-http").info(message, **fields)
@@ -0,0 +1,140 @@
+"""
+Multi-endpoint scheduler: one asyncio event loop drives many endpoint definitions in one process.
+
+Endpoints come from a JSON file (HTTP_ENDPOINTS_FILE), a list of objects:
+    [
+      {"dataset": "merchant_locations", "url": "http://mock-api:8080/api/merchant-locations",
+       "poll_seconds": 60, "jitter_seconds": 5, "timeout_seconds": 10},
+      {"dataset": "orders", "url": "https://api.example.com/orders", "poll_seconds": 300,
+       "pagination": {"strategy": "cursor", "next_cursor_field": "meta.next"}}
+    ]
+Missing keys fall back to the HTTP_* env vars; "pagination" keys override PaginationConfig fields.
+
+Each endpoint is a coroutine that sleeps between polls; the blocking poll itself (requests, boto3,
+Kafka) runs in a thread. A global semaphore (HTTP_MAX_IN_FLIGHT) caps concurrent polls, and a
+per-host throttle stretches the intervals while X-RateLimit-Remaining is low (or requests fail),
+then relaxes them again.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlparse
+
+from config import Config
+from pagination import PaginationConfig
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    cfg: Config
+    pagination: PaginationConfig
+    jitter_seconds: float
+
+
+def load_endpoints(path: str, base_cfg: Config, base_pcfg: PaginationConfig) -> list[Endpoint]:
+    entries = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty JSON list of endpoints")
+
+    endpoints = []
+    for i, entry in enumerate(entries):
+        if "url" not in entry or "dataset" not in entry:
+            raise ValueError(f"{path}[{i}]: 'url' and 'dataset' are required")
+        cfg = replace(
+            base_cfg,
+            dataset=entry["dataset"],
+            http_url=entry["url"],
+            poll_seconds=int(entry.get("poll_seconds", base_cfg.poll_seconds)),
+            http_timeout_seconds=int(entry.get("timeout_seconds", base_cfg.http_timeout_seconds)),
+        )
+        pcfg = replace(base_pcfg, **entry.get("pagination", {}))
+        endpoints.append(Endpoint(cfg, pcfg, float(entry.get("jitter_seconds", 0))))
+    return endpoints
+
+
+class RateLimitThrottle:
+    """
+    Per-host interval multiplier driven by X-RateLimit-Remaining:
+      remaining <= low watermark (or an error)  -> factor doubles, up to max_factor
+      remaining above the watermark             -> factor halves back towards 1
+    """
+
+    def __init__(self, low_watermark: int, max_factor: float):
+        self.low_watermark = low_watermark
+        self.max_factor = max_factor
+        self._factors: dict[str, float] = {}
+
+    def factor(self, url: str) -> float:
+        return self._factors.get(urlparse(url).netloc, 1.0)
+
+    def observe(self, url: str, remaining: int | None, failed: bool = False) -> float:
+        host = urlparse(url).netloc
+        factor = self._factors.get(host, 1.0)
+        if failed or (remaining is not None and remaining <= self.low_watermark):
+            factor = min(factor * 2, self.max_factor)
+        else:
+            factor = max(factor / 2, 1.0)
+        self._factors[host] = factor
+        return factor
+
+
+# poll(endpoint) -> X-RateLimit-Remaining of the last response (None if the header was absent)
+PollFn = Callable[[Endpoint], "int | None"]
+
+
+async def run_scheduler(endpoints: list[Endpoint], poll: PollFn, max_in_flight: int, once: bool, log) -> None:
+    loop = asyncio.get_running_loop()
+    # Threads for the blocking polls: never more than the in-flight limit
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="poll"))
+    in_flight = asyncio.Semaphore(max_in_flight)
+    throttle = RateLimitThrottle(
+        low_watermark=int(os.getenv("HTTP_RATE_LIMIT_LOW", "10")),
+        max_factor=float(os.getenv("HTTP_RATE_LIMIT_MAX_BACKOFF", "16")),
+    )
+
+    stop = asyncio.Event()
+    if not once:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+    async def poll_endpoint(ep: Endpoint) -> None:
+        # Spread the first polls so hundreds of endpoints do not all fire at start-up
+        if not once and await _sleep_or_stop(stop, random.uniform(0, ep.jitter_seconds)):
+            return
+        while True:
+            failed, remaining = False, None
+            async with in_flight:
+                try:
+                    remaining = await asyncio.to_thread(poll, ep)
+                except Exception as e:
+                    failed = True
+                    log("ingestor-http error", dataset=ep.cfg.dataset, http_url=ep.cfg.http_url, error=str(e))
+            factor = throttle.observe(ep.cfg.http_url, remaining, failed)
+            if once:
+                return
+            delay = ep.cfg.poll_seconds * factor + random.uniform(0, ep.jitter_seconds)
+            if factor > 1:
+                log("ingestor-http throttled", http_url=ep.cfg.http_url, rate_limit_remaining=remaining,
+                    factor=factor, next_poll_seconds=round(delay, 1))
+            if await _sleep_or_stop(stop, delay):
+                return
+
+    log("ingestor-http scheduler starting", endpoints=len(endpoints), max_in_flight=max_in_flight)
+    await asyncio.gather(*(poll_endpoint(ep) for ep in endpoints))
+
+
+async def _sleep_or_stop(stop: asyncio.Event, seconds: float) -> bool:
+    """Sleeps `seconds`; True if the scheduler was asked to stop meanwhile."""
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds)
+        return True
+    except asyncio.TimeoutError:
+        return False
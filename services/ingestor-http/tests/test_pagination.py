@@ -0,0 +1,133 @@
+import json
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from pagination import PaginationConfig, run_incremental
+
+BASE = PaginationConfig(
+    strategy="page",
+    concurrency=1,
+    max_pages=0,
+    items_field="items",
+    page_param="page",
+    page_size_param="per_page",
+    page_size=2,
+    first_page=1,
+    cursor_param="cursor",
+    next_cursor_field="next_cursor",
+    window_start_param="since",
+    window_end_param="until",
+    window_minutes=60,
+    window_lag_seconds=0,
+    initial_window_start="",
+)
+
+
+class FakeApi:
+    """Serves `pages(params)` bodies and records what was requested and stored."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests: list[dict] = []
+        self.stored: list = []
+        self.checkpoints: list[dict] = []
+
+    def fetch(self, params):
+        self.requests.append(dict(params))
+        return SimpleNamespace(content=json.dumps(self.pages(params)).encode())
+
+    def ingest(self, res, req, sha):
+        self.stored.append(req.cursor or req.window_start)
+        return f"s3://raw/{sha}"
+
+    def run(self, pcfg, checkpoint):
+        stored = run_incremental(pcfg, checkpoint, self.fetch, self.ingest, self.checkpoints.append)
+        return stored, (self.checkpoints[-1] if self.checkpoints else checkpoint)
+
+
+def paged(records: int, size: int = 2):
+    def pages(params):
+        start = (int(params["page"]) - 1) * size
+        return {"items": list(range(records))[start:start + size]}
+    return pages
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_pages_stop_at_the_partial_page_and_checkpoint_it(concurrency):
+    api = FakeApi(paged(5))
+    stored, checkpoint = api.run(replace(BASE, concurrency=concurrency), {})
+    assert stored == 3
+    assert api.stored == ["page=1", "page=2", "page=3"]
+    assert checkpoint["page"] == 3 and checkpoint["sha256"]
+    # Checkpoints only move forward, in page order
+    assert [c["page"] for c in api.checkpoints] == [2, 3, 3]
+
+
+def test_pages_resume_skips_the_unchanged_tail_page():
+    api = FakeApi(paged(5))
+    _, checkpoint = api.run(BASE, {})
+
+    again = FakeApi(paged(5))
+    assert again.run(BASE, checkpoint) == (0, checkpoint)
+    assert again.requests[0]["page"] == "3"
+
+    grown = FakeApi(paged(7))
+    stored, after = grown.run(BASE, checkpoint)
+    assert grown.stored == ["page=3", "page=4"]
+    assert stored == 2 and after["page"] == 4
+
+
+def test_pages_respect_max_pages():
+    api = FakeApi(paged(100))
+    stored, checkpoint = api.run(replace(BASE, max_pages=3, concurrency=2), {})
+    assert stored == 3 and len(api.requests) == 3
+    assert checkpoint == {"page": 4}
+
+
+def test_cursor_follows_next_cursor_and_resumes_at_the_last_one():
+    chain = {None: "b", "b": "c", "c": None}
+
+    def pages(params):
+        cursor = params.get("cursor")
+        return {"items": [cursor or "a"], "next_cursor": chain[cursor]}
+
+    api = FakeApi(pages)
+    stored, checkpoint = api.run(replace(BASE, strategy="cursor"), {})
+    assert stored == 3
+    assert checkpoint["cursor"] == "c" and checkpoint["sha256"]
+
+    again = FakeApi(pages)
+    assert again.run(replace(BASE, strategy="cursor"), checkpoint)[0] == 0
+    assert again.requests == [{"cursor": "c"}]
+
+
+def test_windows_advance_over_the_completed_prefix_only():
+    start = (datetime.now(timezone.utc) - timedelta(hours=3, minutes=30)).replace(microsecond=0)
+    pcfg = replace(BASE, strategy="window", concurrency=3, initial_window_start=start.isoformat())
+
+    def pages(params):
+        if params["since"] == api.windows[1]:
+            raise ConnectionError("timeout")
+        return {"items": [params["since"]]}
+
+    api = FakeApi(pages)
+    api.windows = [(start + timedelta(hours=h)).isoformat().replace("+00:00", "Z") for h in range(3)]
+    with pytest.raises(ConnectionError):
+        api.run(pcfg, {})
+    # The first window is done; the failed second one (and the third behind it) is retried next poll
+    assert api.checkpoints == [{"window_end": api.windows[1]}]
+
+    retry = FakeApi(lambda params: {"items": [params["since"]]})
+    stored, checkpoint = retry.run(pcfg, api.checkpoints[-1])
+    assert retry.stored == api.windows[1:]
+    assert stored == 2 and checkpoint == {"window_end": (start + timedelta(hours=3)).isoformat().replace("+00:00", "Z")}
+
+
+def test_empty_pages_are_not_stored():
+    api = FakeApi(lambda params: {"items": []})
+    stored, checkpoint = api.run(BASE, {})
+    assert stored == 0 and api.stored == []
+    assert checkpoint["page"] == 1
@@ -0,0 +1,157 @@
+"""
+Micro-batching for the stream consumer (STREAM_MODE=batch).
+
+Messages are collected per (topic, partition) and a batch is closed when it reaches
+STREAM_BATCH_MAX_MESSAGES, STREAM_BATCH_MAX_BYTES or is STREAM_BATCH_MAX_MS old. A closed batch
+becomes one NDJSON RAW object (one line per message) whose metadata.json carries an offset index,
+so any single message can still be located (`line`, `byte_start`, `byte_len`) without a scan.
+
+A batch always covers a contiguous offset range of its partition (messages skipped as bad JSON
+or as already-persisted replays included), so committing `last_offset + 1` after the batch is written never skips a message.
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+
+from latency import BenchStamp
+
+
+@dataclass(frozen=True)
+class BatchConfig:
+    max_messages: int
+    max_bytes: int
+    max_ms: int
+    events: str  # "batch": one ingest.stream event per batch, "message": one per message
+
+    @classmethod
+    def from_env(cls) -> "BatchConfig":
+        events = os.getenv("STREAM_BATCH_EVENTS", "batch").strip().lower()
+        if events not in ("batch", "message"):
+            raise SystemExit("STREAM_BATCH_EVENTS must be 'batch' or 'message'")
+        return cls(
+            max_messages=max(1, int(os.getenv("STREAM_BATCH_MAX_MESSAGES", "1000"))),
+            max_bytes=max(1, int(os.getenv("STREAM_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))),
+            max_ms=max(1, int(os.getenv("STREAM_BATCH_MAX_MS", "1000"))),
+            events=events,
+        )
+
+
+@dataclass
+class Record:
+    offset: int
+    key: str | None
+    line: bytes  # one NDJSON line, without the trailing newline
+    source_event_id: str | None
+    event_time: str | None
+    timestamp_ms: int | None = None  # Kafka message timestamp (RAW object date)
+    bench: BenchStamp | None = None  # producer.py bench headers (latency.py)
+    location: tuple[float, float] | None = None  # (lon, lat) of the post, for region tagging (regions.py)
+    region_id: str | None = None  # set by the worker before the batch is written
+
+
+@dataclass
+class Batch:
+    topic: str
+    partition: int
+    dataset: str
+    first_offset: int
+    last_offset: int = -1
+    records: list[Record] = field(default_factory=list)
+    skipped_offsets: list[int] = field(default_factory=list)  # not stored: bad JSON
+    replayed_offsets: list[int] = field(default_factory=list)  # not stored: already persisted (dedup index)
+    nbytes: int = 0
+    opened_at: float = field(default_factory=time.monotonic)
+    regions_version: str | None = None  # regions file the records were tagged with (None: not tagged)
+
+    def add(self, record: Record) -> None:
+        self.records.append(record)
+        self.nbytes += len(record.line) + 1
+        self.last_offset = record.offset
+
+    def skip(self, offset: int, replayed: bool = False) -> None:
+        """Offset consumed but not stored (bad JSON, or a replay of a persisted one): still covered by the batch commit."""
+        (self.replayed_offsets if replayed else self.skipped_offsets).append(offset)
+        self.last_offset = offset
+
+    def ndjson(self) -> bytes:
+        return b"".join(r.line + b"\n" for r in self.records)
+
+    def offset_index(self) -> list[dict]:
+        index, pos = [], 0
+        for i, r in enumerate(self.records):
+            index.append({
+                "offset": r.offset,
+                "line": i,
+                "byte_start": pos,
+                "byte_len": len(r.line),
+                "key": r.key,
+                "source_event_id": r.source_event_id,
+                **({"region_id": r.region_id} if self.regions_version is not None else {}),
+            })
+            pos += len(r.line) + 1
+        return index
+
+
+class BatchCollector:
+    """Open batches, one per (topic, partition)."""
+
+    def __init__(self, config: BatchConfig):
+        self.config = config
+        self._open: dict[tuple[str, int], Batch] = {}
+
+    def add(self, topic: str, partition: int, dataset: str, record: Record) -> list[Batch]:
+        """Adds one message; returns the batches this closed (0, 1 or 2)."""
+        closed = []
+        batch = self._open.get((topic, partition))
+        if batch is not None and batch.records and batch.dataset != dataset:
+            # RAW objects are per dataset: a dataset switch closes the batch (offsets stay contiguous)
+            closed.append(self._open.pop((topic, partition)))
+            batch = None
+        if batch is None:
+            batch = self._open[(topic, partition)] = Batch(topic, partition, dataset, first_offset=record.offset)
+        batch.dataset = dataset
+        batch.add(record)
+        if self._full(batch):
+            closed.append(self._open.pop((topic, partition)))
+        return closed
+
+    def skip(self, topic: str, partition: int, dataset: str, offset: int, replayed: bool = False) -> None:
+        batch = self._open.get((topic, partition))
+        if batch is None:
+            batch = self._open[(topic, partition)] = Batch(topic, partition, dataset, first_offset=offset)
+        batch.skip(offset, replayed)
+
+    def due(self, now: float | None = None) -> list[Batch]:
+        """Batches older than max_ms: closed and returned."""
+        now = time.monotonic() if now is None else now
+        keys = [k for k, b in self._open.items() if (now - b.opened_at) * 1000 >= self.config.max_ms]
+        return [self._open.pop(k) for k in keys]
+
+    def drain(self, partitions: set[tuple[str, int]] | None = None) -> list[Batch]:
+        """Closes every open batch (or only those of `partitions`, e.g. on revoke)."""
+        keys = [k for k in self._open if partitions is None or k in partitions]
+        return [self._open.pop(k) for k in keys]
+
+    def next_deadline(self, now: float | None = None) -> float | None:
+        """Seconds until the oldest open batch is due (None if nothing is open)."""
+        if not self._open:
+            return None
+        now = time.monotonic() if now is None else now
+        oldest = min(b.opened_at for b in self._open.values())
+        return max(0.0, oldest + self.config.max_ms / 1000 - now)
+
+    def _full(self, batch: Batch) -> bool:
+        return len(batch.records) >= self.config.max_messages or batch.nbytes >= self.config.max_bytes
+
+
+def ndjson_line(value: bytes) -> bytes:
+    """
+    One JSON document as one NDJSON line, normally the message bytes unchanged. JSON strings cannot
+    hold raw line breaks, so any CR/LF is whitespace between tokens (pretty-printed source) and is
+    replaced by a space instead of re-encoding the document.
+    """
+    if b"\n" in value or b"\r" in value:
+        return value.replace(b"\r", b" ").replace(b"\n", b" ")
+    return value
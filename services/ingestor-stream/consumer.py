@@ -1,22 +1,84 @@
 import io
-import json
 import os
+import signal
+import threading
+import time
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
-from confluent_kafka import Consumer, Producer, KafkaException
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, Consumer, KafkaException, TopicPartition
 from minio import Minio
 
+from batching import Batch, BatchCollector, BatchConfig, Record, ndjson_line
+from dedup import ProcessedIndex
+from ingest_common.compression import Compression
+from ingest_common.kafka_publisher import KafkaPublisher, PublisherConfig, get_publisher
+from ingest_common.log import IngestLogger, get_logger
+from ingest_common.metrics import IngestMetrics, get_metrics
+from ingest_common.serialization import dumps, loads
+from latency import BenchStamp, LatencyRecorder, bench_stamp
+from regions import Point, RegionTagger, location_of
+from transactions import TransactionalCommitter
+from worker_pool import TP, PartitionWorkerPool
+
+SCHEMA_VERSION = "1.3.0"
+# event_id = uuid5(namespace, idempotency_key): a replayed message gets the same id (and RAW key)
+EVENT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "ingestor-stream")
+# The only fields read from a source message (plus `location`, see regions.py); the message bytes
+# themselves are stored unchanged
+SOURCE_FIELDS = ("dataset", "event_time", "source_event_id")
+# Consumer lag is read from librdkafka's cached watermarks, refreshed at most this often
+LAG_REFRESH_SECONDS = 5.0
+# Per-unit lines (lines/s); what is left out shows up in the periodic log.summary
+LOG_RATE_LIMITS = {"ingest.stream done": 20, "ingest.stream batch done": 20}
+
+
+@dataclass(frozen=True)
+class StreamContext:
+    """Settings and clients shared by both consumer modes and by every worker thread."""
+    minio: Minio
+    bucket: str
+    compression: Compression
+    topic_source: str
+    topic_ingest: str
+    default_dataset: str
+    env_tag: str
+    fail_on_bad_json: bool
+    # None in transactional mode: workers hand their events back to the poll loop (transactions.py)
+    publisher: KafkaPublisher | None
+    # Offsets already persisted but maybe not committed (None in transactional mode)
+    index: ProcessedIndex | None
+    metrics: IngestMetrics = field(default_factory=lambda: IngestMetrics("ingestor-stream"))  # no-op by default
+    log: IngestLogger = field(default_factory=lambda: IngestLogger("ingestor-stream", summary_seconds=0, asynchronous=False))
+    # Produce -> RAW write latency of producer.py bench messages; reports also go to `bench_topic` if set
+    latency: LatencyRecorder = field(default_factory=LatencyRecorder)
+    bench_topic: str = ""
+    # region_id from the post location, in metadata.json and the events (None: not tagged)
+    regions: RegionTagger | None = None
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def utc_ymd_parts() -> tuple[str, str, str]:
-    now = datetime.now(timezone.utc)
+def utc_ymd_parts(timestamp_ms: int | None = None) -> tuple[str, str, str]:
+    if timestamp_ms is None:
+        now = datetime.now(timezone.utc)
+    else:
+        now = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
     return now.strftime("%Y"), now.strftime("%m"), now.strftime("%d")
 
 
+def message_timestamp_ms(msg) -> int | None:
+    ts_type, ts = msg.timestamp()
+    return None if ts_type == TIMESTAMP_NOT_AVAILABLE else ts
+
+
+def stable_event_id(idempotency_key: str) -> str:
+    return str(uuid.uuid5(EVENT_ID_NAMESPACE, idempotency_key))
+
+
 def safe_decode_key(key_bytes) -> str | None:
     if key_bytes is None:
         return None
@@ -27,56 +89,185 @@ def safe_decode_key(key_bytes) -> str | None:
         return str(key_bytes)
 
 
-def build_object_names(dataset: str, event_id: str) -> tuple[str, str]:
+def build_object_names(dataset: str, event_id: str, timestamp_ms: int | None = None,
+                       payload_name: str = "payload.json") -> tuple[str, str]:
     """
     Conventions.md suggests:
       raw/{dataset}/{yyyy}/{mm}/{dd}/{source}/{event_id}/payload.<ext>
       raw/{dataset}/{yyyy}/{mm}/{dd}/{source}/{event_id}/metadata.json
 
     For MinIO object_name we omit the leading 'raw/' because bucket already is 'raw'.
+    The date is the Kafka message timestamp, not the ingest time, so a replay writes the same key.
     """
-    yyyy, mm, dd = utc_ymd_parts()
+    yyyy, mm, dd = utc_ymd_parts(timestamp_ms)
     base = f"{dataset}/{yyyy}/{mm}/{dd}/ingestor-stream/{event_id}"
-    return f"{base}/payload.json", f"{base}/metadata.json"
+    return f"{base}/{payload_name}", f"{base}/metadata.json"
+
+
+def put_raw(ctx: StreamContext, object_payload: str, object_metadata: str, payload_bytes: bytes, meta: dict,
+            content_type: str = "application/json") -> tuple[str, int]:
+    """Writes payload (compressed if enabled) + metadata.json; returns (raw_uri, stored bytes)."""
+    stored_bytes = ctx.compression.compress(payload_bytes) if ctx.compression.enabled else payload_bytes
+    meta = {**meta, "bytes": len(payload_bytes), "stored_bytes": len(stored_bytes), "compression": ctx.compression.codec}
+    meta_bytes = dumps(meta)
+
+    ctx.minio.put_object(
+        ctx.bucket,
+        object_payload,
+        io.BytesIO(stored_bytes),
+        length=len(stored_bytes),
+        content_type=content_type,
+        metadata={"Content-Encoding": ctx.compression.content_encoding} if ctx.compression.enabled else None,
+    )
+    # Upload metadata.json (optional but very useful)
+    ctx.minio.put_object(
+        ctx.bucket,
+        object_metadata,
+        io.BytesIO(meta_bytes),
+        length=len(meta_bytes),
+        content_type="application/json",
+    )
+    return f"s3://{ctx.bucket}/{object_payload}", len(stored_bytes)
 
 
-def delivery_report(err, msg) -> None:
-    if err is not None:
-        print(json.dumps({
-            "msg": "ingest.stream delivery failed",
-            "error": str(err),
-            "topic": msg.topic(),
-        }))
-    else:
-        # Useful when debugging, but can be noisy; keep for POC
-        print(json.dumps({
-            "msg": "ingest.stream delivered",
-            "topic": msg.topic(),
-            "partition": msg.partition(),
-            "offset": msg.offset(),
-        }))
+def build_stream_event(ctx: StreamContext, event_id: str, idempotency_key: str, event_time: str, ingest_time: str,
+                       payload: dict) -> dict:
+    return {
+        "event_id": event_id,
+        "event_type": "ingest.stream",
+        "schema_version": SCHEMA_VERSION,
+        "source": "ingestor-stream",
+        "event_time": event_time,
+        "ingest_time": ingest_time,
+        "idempotency_key": idempotency_key,
+        "tags": {"env": ctx.env_tag},
+        "payload": payload,
+    }
+
+
+def deliver(ctx: StreamContext, events: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """
+    Worker: publishes (message key, event) pairs and waits for the acks, or, in transactional mode,
+    returns them so the poll loop produces them in the transaction that commits their offsets.
+    """
+    if ctx.publisher is None:
+        return events
+    # All events are queued at once and acknowledged together (no per-message flush)
+    futures = [ctx.publisher.publish(ctx.topic_ingest, ev, key=key) for key, ev in events]
+    for fut in futures:
+        fut.result(timeout=30)
+    return []
+
+
+def parse_source_fields(value: bytes) -> dict:
+    """SOURCE_FIELDS and `location` of one message (None when absent); raises on invalid JSON or a non-object."""
+    doc = loads(value)
+    if not isinstance(doc, dict):
+        raise ValueError(f"expected a JSON object, got {type(doc).__name__}")
+    fields = {name: doc.get(name) for name in SOURCE_FIELDS}
+    fields["location"] = location_of(doc)
+    return fields
+
+
+def measure_lag(consumer: Consumer) -> dict[TP, int]:
+    """Messages between the consumer position and the high watermark, per assigned partition (no broker call)."""
+    lag = {}
+    for tp in consumer.position(consumer.assignment()):
+        if tp.offset < 0:
+            continue  # nothing consumed yet on this partition
+        try:
+            _low, high = consumer.get_watermark_offsets(tp, cached=True)
+        except KafkaException:
+            continue  # no fetch response for this partition yet
+        if high >= 0:
+            lag[(tp.topic, tp.partition)] = max(0, high - tp.offset)
+    return lag
+
+
+def in_unit(ctx: StreamContext, unit: str, dataset: str, fn, *args):
+    """Worker: runs `fn` as one "message" / "batch" stage, counted in flight while it runs."""
+    with ctx.metrics.in_flight(dataset=dataset), ctx.metrics.stage(unit, dataset=dataset):
+        return fn(*args)
+
+
+def record_latency(ctx: StreamContext, stamps: list[BenchStamp | None], dataset: str) -> None:
+    """Worker, right after the RAW write: end-to-end latency of the bench messages in it (latency.py)."""
+    stamps = [s for s in stamps if s is not None]
+    for seconds in ctx.latency.record(stamps):
+        ctx.metrics.observe("end_to_end", seconds, dataset=dataset)
+
+
+def report_latency(ctx: StreamContext, final: bool = False) -> None:
+    """Poll loop: due bench reports are logged and, outside transactional mode, published for the producer."""
+    for report in ctx.latency.due_reports(float("inf") if final else None):
+        ctx.log.info(report["msg"], **{k: v for k, v in report.items() if k != "msg"})
+        if ctx.bench_topic and ctx.publisher is not None:
+            ctx.publisher.publish(ctx.bench_topic, report, key=report["run_id"])
+
+
+def tag_regions(ctx: StreamContext, points: list[Point | None], dataset: str) -> tuple[list[str | None], str | None]:
+    """Worker, before the RAW write: region_id per point and the regions version used (None when off)."""
+    if ctx.regions is None:
+        return [None] * len(points), None
+    index = ctx.regions.index  # one version for the whole unit, even if the poll loop swaps it meanwhile
+    with ctx.metrics.stage("geo", dataset=dataset):
+        return index.lookup(points), index.version
+
+
+def reload_regions(ctx: StreamContext) -> None:
+    """Poll loop: picks up a changed regions file; a file that fails to load keeps the current index."""
+    if ctx.regions is None:
+        return
+    started = time.perf_counter()
+    try:
+        index = ctx.regions.maybe_reload()
+    except Exception as e:
+        ctx.log.warning("ingest.stream regions reload failed", path=ctx.regions.path, error=str(e))
+        return
+    if index is not None:
+        ctx.log.info(
+            "ingest.stream regions loaded",
+            path=ctx.regions.path,
+            regions=len(index.region_ids),
+            version=index.version,
+            duration_ms=int((time.perf_counter() - started) * 1000),
+        )
+
+
+def log_bad_json(ctx: StreamContext, msg, error: Exception) -> None:
+    ctx.log.warning(
+        "bad json in source message",
+        error=str(error),
+        topic=msg.topic(),
+        partition=msg.partition(),
+        offset=msg.offset(),
+    )
 
 
 def main() -> None:
     # ---- Kafka config ----
     bootstrap = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
-    topic_source = os.getenv("KAFKA_TOPIC_SOURCE", "source.posts.v1")
-    topic_ingest = os.getenv("KAFKA_TOPIC_INGEST", "ingest.stream.v1")
     group_id = os.getenv("KAFKA_GROUP_ID", "ingestor-stream.v1")
+    # message: one RAW object + one event per message; batch: see batching.py
+    stream_mode = os.getenv("STREAM_MODE", "message").strip().lower()
+    if stream_mode not in ("message", "batch"):
+        raise SystemExit("STREAM_MODE must be 'message' or 'batch'")
+    # Partitions processed in parallel (each partition stays in order on one worker)
+    workers = max(1, int(os.getenv("STREAM_WORKERS", "1")))
+    max_in_flight = max(1, int(os.getenv("STREAM_MAX_IN_FLIGHT", str(workers * 4))))
+    # Events + offsets in one Kafka transaction (exactly-once towards ingest.stream.v1)
+    transactional_id = os.getenv("STREAM_TRANSACTIONAL_ID", "").strip()
+    # Persisted-offset index: SQLite file to survive restarts, in-memory LRU if empty
+    dedup_path = os.getenv("STREAM_DEDUP_PATH", "").strip()
+    dedup_max_ranges = max(1, int(os.getenv("STREAM_DEDUP_MAX_RANGES", "100000")))
 
     # ---- MinIO config ----
     minio_endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
     minio_access_key = os.getenv("MINIO_ROOT_USER", "minioadmin")
     minio_secret_key = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
-    minio_bucket_raw = os.getenv("MINIO_BUCKET_RAW", "raw")
     minio_secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
 
-    # ---- Defaults ----
-    default_dataset = os.getenv("DATASET", "posts")
-    env_tag = os.getenv("ENV", "local")
-    fail_on_bad_json = os.getenv("FAIL_ON_BAD_JSON", "false").lower() == "true"
-
-    # MinIO client
+    # MinIO client (thread-safe: shared by the workers)
     minio = Minio(
         minio_endpoint,
         access_key=minio_access_key,
@@ -84,9 +275,34 @@ def main() -> None:
         secure=minio_secure,
     )
 
+    publisher_config = PublisherConfig.from_env("ingestor-stream", bootstrap)
+    committer = TransactionalCommitter(publisher_config, transactional_id) if transactional_id else None
+
+    ctx = StreamContext(
+        minio=minio,
+        bucket=os.getenv("MINIO_BUCKET_RAW", "raw"),
+        # RAW_COMPRESSION=gzip|zstd: payload.json.gz / payload.json.zst (metadata.json stays plain)
+        compression=Compression.from_env(),
+        topic_source=os.getenv("KAFKA_TOPIC_SOURCE", "source.posts.v1"),
+        topic_ingest=os.getenv("KAFKA_TOPIC_INGEST", "ingest.stream.v1"),
+        # ---- Defaults ----
+        default_dataset=os.getenv("DATASET", "posts"),
+        env_tag=os.getenv("ENV", "local"),
+        fail_on_bad_json=os.getenv("FAIL_ON_BAD_JSON", "false").lower() == "true",
+        # ingest.stream events: one batched, idempotent producer for every worker
+        publisher=get_publisher(publisher_config) if committer is None else None,
+        index=ProcessedIndex(dedup_path, dedup_max_ranges) if committer is None else None,
+        metrics=get_metrics("ingestor-stream"),
+        log=get_logger("ingestor-stream", rate_limits=LOG_RATE_LIMITS),
+        # Final latency report of each producer.py bench run (PRODUCER_MODE=bench waits for it)
+        bench_topic=os.getenv("STREAM_BENCH_TOPIC", "bench.stream.v1").strip(),
+        # STREAM_REGIONS_PATH: GeoJSON region polygons (regions.py), off when empty
+        regions=RegionTagger.from_env(),
+    )
+
     # Ensure bucket exists (safe for local POC)
-    if not minio.bucket_exists(minio_bucket_raw):
-        minio.make_bucket(minio_bucket_raw)
+    if not minio.bucket_exists(ctx.bucket):
+        minio.make_bucket(ctx.bucket)
 
     # Kafka consumer
     consumer = Consumer({
@@ -95,145 +311,378 @@ def main() -> None:
         "enable.auto.commit": False,
         "auto.offset.reset": "earliest",
     })
-    consumer.subscribe([topic_source])
 
-    # Kafka producer (for ingest.stream events)
-    producer = Producer({
-        "bootstrap.servers": bootstrap,
-        "acks": "1",
-        "retries": 5,
-        "linger.ms": 20,
-        "compression.type": "snappy",
-    })
+    ctx.log.info(
+        "ingestor-stream started",
+        mode=stream_mode,
+        workers=workers,
+        transactional=committer is not None,
+        dedup_path=dedup_path or None,
+        topic_source=ctx.topic_source,
+        topic_ingest=ctx.topic_ingest,
+        group_id=group_id,
+        minio_bucket_raw=ctx.bucket,
+        regions_path=ctx.regions.path if ctx.regions is not None else None,
+        regions=len(ctx.regions.index.region_ids) if ctx.regions is not None else None,
+    )
 
-    print(json.dumps({
-        "msg": "ingestor-stream started",
-        "topic_source": topic_source,
-        "topic_ingest": topic_ingest,
-        "group_id": group_id,
-        "minio_bucket_raw": minio_bucket_raw,
-    }))
+    bcfg = BatchConfig.from_env() if stream_mode == "batch" else None
+    if bcfg is not None and not dedup_path:
+        # Without a persisted index a batch replayed after a restart may be written again (batch_idempotency_key)
+        ctx.log.warning("ingest.stream batch replays not deduplicated across restarts", missing="STREAM_DEDUP_PATH")
+    run(ctx, consumer, PartitionWorkerPool(workers, max_in_flight), bcfg, committer)
+
+
+def run(ctx: StreamContext, consumer: Consumer, pool: PartitionWorkerPool, bcfg: BatchConfig | None,
+        committer: TransactionalCommitter | None = None) -> None:
+    """
+    Poll loop (main thread): messages, or closed batches when `bcfg` is set, are handed to the
+    worker pool; offsets are committed as the contiguous prefix of each partition completes.
+    A worker failure stops the loop without committing past the failed unit (at-least-once).
+    Offsets the index already holds (persisted before a crash or a rebalance) are skipped.
+    """
+    collector = BatchCollector(bcfg) if bcfg is not None else None
+    lag: dict[TP, int] = {}
+    lag_read_at = 0.0
+    ctx.metrics.gauge("ingest.consumer.lag", "Messages behind the high watermark, per partition",
+                      lambda: [(n, {"topic": t, "partition": p}) for (t, p), n in list(lag.items())], unit="{message}")
+    ctx.metrics.gauge("ingest.stream.uncommitted", "Units handed to the workers and not committed yet",
+                      lambda: [(pool.tracker.in_flight(), {})], unit="{unit}")
+
+    def commit_ready(tps: set[TP] | None = None) -> None:
+        offsets, events = pool.tracker.take_ready(tps)
+        if not offsets:
+            return
+        if committer is not None:
+            committer.commit(consumer, ctx.topic_ingest, offsets, events)
+        else:
+            consumer.commit(offsets=[TopicPartition(t, p, o) for (t, p), o in offsets.items()], asynchronous=False)
+        if ctx.index is not None:
+            for tp, offset in offsets.items():
+                ctx.index.prune(tp, offset)
+
+    def on_assign(_consumer, partitions):
+        # Fresh ownership: resume from the committed offsets, forget anything tracked before
+        pool.forget((p.topic, p.partition) for p in partitions)
+        if ctx.index is not None and partitions:
+            seeded = {}
+            for p in consumer.committed(partitions, timeout=10):
+                seeded[f"{p.topic}[{p.partition}]"] = ctx.index.seed((p.topic, p.partition), p.offset if p.offset >= 0 else None)
+            ctx.log.info("ingest.stream partitions assigned", persisted_ranges=seeded)
+
+    def on_revoke(_consumer, partitions):
+        # Still the owner here: finish what we hold for these partitions and commit it
+        revoked = {(p.topic, p.partition) for p in partitions}
+        if collector is not None:
+            for batch in collector.drain(revoked):
+                submit_batch(ctx, pool, bcfg, batch)
+        pool.wait(revoked)
+        if pool.error is None:
+            commit_ready(revoked)
+        pool.forget(revoked)
+        for tp in revoked:
+            lag.pop(tp, None)
+        ctx.log.info("ingest.stream partitions revoked", partitions=sorted(f"{t}[{p}]" for t, p in revoked))
+
+    consumer.subscribe([ctx.topic_source], on_assign=on_assign, on_revoke=on_revoke)
+
+    # SIGTERM/SIGINT: stop consuming, finish in-flight work (and open batches), commit, exit
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
 
     try:
-        while True:
-            msg = consumer.poll(1.0)
-            if msg is None:
-                producer.poll(0)
-                continue
-            if msg.error():
-                raise KafkaException(msg.error())
-
-            ingest_time = utc_now_iso()
-
-            # 1) Parse source message (JSON)
-            try:
-                source_payload = json.loads(msg.value().decode("utf-8"))
-            except Exception as e:
-                print(json.dumps({
-                    "msg": "bad json in source message",
-                    "error": str(e),
-                    "topic": msg.topic(),
-                    "partition": msg.partition(),
-                    "offset": msg.offset(),
-                }))
-                if fail_on_bad_json:
+        while not stop.is_set():
+            deadline = collector.next_deadline() if collector is not None else None
+            timeout = 1.0 if deadline is None else min(1.0, deadline)
+            max_messages = bcfg.max_messages if bcfg is not None else 500
+            replayed = 0
+            for msg in consumer.consume(num_messages=max_messages, timeout=timeout):
+                if msg.error():
+                    raise KafkaException(msg.error())
+                if ctx.index is not None and ctx.index.seen((msg.topic(), msg.partition()), msg.offset()):
+                    # Already in RAW and acknowledged before a crash/rebalance: only its offset is left to commit
+                    replayed += 1
+                    if collector is None:
+                        pool.submit((msg.topic(), msg.partition()), msg.offset(), list)
+                    else:
+                        collector.skip(msg.topic(), msg.partition(), ctx.default_dataset, msg.offset(), replayed=True)
+                elif collector is None:
+                    submit_message(ctx, pool, msg)
+                else:
+                    for batch in add_to_batch(ctx, collector, msg):
+                        submit_batch(ctx, pool, bcfg, batch)
+                if stop.is_set():
                     break
-                # Commit to avoid being stuck on a poison-pill message (POC choice)
-                consumer.commit(message=msg, asynchronous=False)
-                continue
-
-            dataset = source_payload.get("dataset") or default_dataset
-            source_event_time = source_payload.get("event_time") or ingest_time
-            source_event_id = source_payload.get("source_event_id")  # optional
-
-            # 2) Persist RAW to MinIO (one object per message)
-            event_id = str(uuid.uuid4())
-            object_payload, object_metadata = build_object_names(dataset, event_id)
-
-            payload_bytes = json.dumps(source_payload).encode("utf-8")
-            meta = {
-                "dataset": dataset,
-                "topic": msg.topic(),
-                "partition": msg.partition(),
-                "offset": msg.offset(),
-                "key": safe_decode_key(msg.key()),
-                "source_event_id": source_event_id,
-                "event_id": event_id,
-                "event_time": source_event_time,
-                "ingest_time": ingest_time,
-            }
-            meta_bytes = json.dumps(meta).encode("utf-8")
-
-            # Upload payload.json
-            minio.put_object(
-                minio_bucket_raw,
-                object_payload,
-                io.BytesIO(payload_bytes),
-                length=len(payload_bytes),
-                content_type="application/json",
-            )
-            # Upload metadata.json (optional but very useful)
-            minio.put_object(
-                minio_bucket_raw,
-                object_metadata,
-                io.BytesIO(meta_bytes),
-                length=len(meta_bytes),
-                content_type="application/json",
-            )
-
-            raw_uri = f"s3://{minio_bucket_raw}/{object_payload}"
-
-            # 3) Emit ingest.stream event (envelope + payload)
-            idempotency_key = f"ingest-stream:{msg.topic()}:{msg.partition()}:{msg.offset()}"
-
-            ingest_event = {
-                "event_id": event_id,
-                "event_type": "ingest.stream",
-                "schema_version": "1.0.0",
-                "source": "ingestor-stream",
-                "event_time": source_event_time,
-                "ingest_time": ingest_time,
-                "idempotency_key": idempotency_key,
-                "tags": {"env": env_tag},
-                "payload": {
-                    "dataset": dataset,
-                    "topic": msg.topic(),
-                    "partition": msg.partition(),
-                    "offset": msg.offset(),
-                    "key": safe_decode_key(msg.key()),
-                    "raw_uri": raw_uri,
-                    **({"source_event_id": source_event_id} if isinstance(source_event_id, str) else {}),
-                },
-            }
-
-            # Produce + wait delivery (simple & safe for POC)
-            producer.produce(
-                topic=topic_ingest,
-                key=(safe_decode_key(msg.key()) or "").encode("utf-8"),
-                value=json.dumps(ingest_event).encode("utf-8"),
-                on_delivery=delivery_report,
-            )
-            producer.flush(10)
-
-            # 4) Commit source offset only after RAW + event are done
-            consumer.commit(message=msg, asynchronous=False)
-
-            # Smoke-friendly log line (raw_uri is easy to grep)
-            print(json.dumps({
-                "msg": "ingest.stream done",
-                "dataset": dataset,
-                "kafka_topic": msg.topic(),
-                "partition": msg.partition(),
-                "offset": msg.offset(),
-                "raw_uri": raw_uri,
-            }))
-
+            if replayed:
+                ctx.log.info("ingest.stream replayed offsets skipped", count=replayed)
+            if collector is not None:
+                for batch in collector.due():
+                    submit_batch(ctx, pool, bcfg, batch)
+            pool.raise_if_failed()
+            commit_ready()
+            report_latency(ctx)
+            reload_regions(ctx)
+            if time.monotonic() - lag_read_at >= LAG_REFRESH_SECONDS:
+                lag.update(measure_lag(consumer))
+                lag_read_at = time.monotonic()
+
+        if collector is not None:
+            for batch in collector.drain():
+                submit_batch(ctx, pool, bcfg, batch)
+        pool.wait()
+        pool.raise_if_failed()
+        commit_ready()
+        report_latency(ctx, final=True)
+    except BaseException:
+        # Keep the progress of the partitions that did not fail; the failed one is replayed
+        pool.wait(timeout=10)
+        commit_ready()
+        raise
     finally:
         try:
-            producer.flush(5)
+            pool.shutdown()
+            if ctx.publisher is not None:
+                ctx.publisher.close(5)
+            if committer is not None:
+                committer.close(5)
+            if ctx.index is not None:
+                ctx.index.close()
+            ctx.metrics.close()
+            ctx.log.close()
         finally:
             consumer.close()
 
 
+# ---- Message mode ----
+
+def submit_message(ctx: StreamContext, pool: PartitionWorkerPool, msg) -> None:
+    tp = (msg.topic(), msg.partition())
+    try:
+        fields = parse_source_fields(msg.value())
+    except Exception as e:
+        log_bad_json(ctx, msg, e)
+        if ctx.fail_on_bad_json:
+            raise SystemExit(f"bad json at {msg.topic()}[{msg.partition()}]@{msg.offset()}")
+        # Poison pill: nothing to store, but its offset is committed in order (POC choice)
+        pool.submit(tp, msg.offset(), list)
+        return
+    dataset = fields["dataset"] or ctx.default_dataset
+    pool.submit(tp, msg.offset(), in_unit, ctx, "message", dataset, process_message, ctx, msg, fields)
+
+
+def process_message(ctx: StreamContext, msg, fields: dict) -> list[tuple[str, dict]]:
+    """Worker: one RAW object + metadata.json + one acknowledged event for one message."""
+    ingest_time = utc_now_iso()
+    dataset = fields["dataset"] or ctx.default_dataset
+    source_event_time = fields["event_time"] or ingest_time
+    source_event_id = fields["source_event_id"]  # optional
+    idempotency_key = f"ingest-stream:{msg.topic()}:{msg.partition()}:{msg.offset()}"
+
+    # 1) Persist RAW to MinIO (one object per message, same key on replay)
+    event_id = stable_event_id(idempotency_key)
+    object_payload, object_metadata = build_object_names(dataset, event_id, message_timestamp_ms(msg))
+    object_payload = ctx.compression.object_key(object_payload)
+
+    # Stored as received: no re-serialization, the bytes go to MinIO as they came from Kafka
+    payload_bytes = msg.value()
+    (region_id,), regions_version = tag_regions(ctx, [fields["location"]], dataset)
+    region = {"region_id": region_id} if regions_version is not None else {}
+    meta = {
+        "dataset": dataset,
+        "topic": msg.topic(),
+        "partition": msg.partition(),
+        "offset": msg.offset(),
+        "key": safe_decode_key(msg.key()),
+        "source_event_id": source_event_id,
+        "event_id": event_id,
+        "event_time": source_event_time,
+        "ingest_time": ingest_time,
+        **region,
+        **({"regions_version": regions_version} if regions_version is not None else {}),
+    }
+    with ctx.metrics.stage("upload", dataset=dataset):
+        raw_uri, stored_size = put_raw(ctx, object_payload, object_metadata, payload_bytes, meta)
+    record_latency(ctx, [bench_stamp(msg)], dataset)
+
+    # 2) Emit ingest.stream event (envelope + payload)
+    ingest_event = build_stream_event(ctx, event_id, idempotency_key, source_event_time, ingest_time, {
+        "dataset": dataset,
+        "topic": msg.topic(),
+        "partition": msg.partition(),
+        "offset": msg.offset(),
+        "key": safe_decode_key(msg.key()),
+        "raw_uri": raw_uri,
+        "bytes": len(payload_bytes),
+        **region,
+        **({"source_event_id": source_event_id} if isinstance(source_event_id, str) else {}),
+        **({"compression": ctx.compression.codec, "stored_bytes": stored_size} if ctx.compression.enabled else {}),
+    })
+
+    # Only this worker waits for the ack; the offset is committed by the poll loop once it is done
+    with ctx.metrics.stage("publish", dataset=dataset):
+        pending = deliver(ctx, [(safe_decode_key(msg.key()) or "", ingest_event)])
+    ctx.metrics.processed(len(payload_bytes), dataset=dataset)
+    if ctx.index is not None:
+        ctx.index.add((msg.topic(), msg.partition()), msg.offset(), msg.offset())
+
+    # Smoke-friendly log line (raw_uri is easy to grep); rate limited, counted in log.summary
+    ctx.log.info(
+        "ingest.stream done",
+        dataset=dataset,
+        kafka_topic=msg.topic(),
+        partition=msg.partition(),
+        offset=msg.offset(),
+        event_id=event_id,
+        raw_uri=raw_uri,
+    )
+    return pending
+
+
+# ---- Batch mode ----
+
+def add_to_batch(ctx: StreamContext, collector: BatchCollector, msg) -> list[Batch]:
+    try:
+        fields = parse_source_fields(msg.value())
+    except Exception as e:
+        log_bad_json(ctx, msg, e)
+        if ctx.fail_on_bad_json:
+            # Open batches are not committed: they are read again on restart
+            raise SystemExit(f"bad json at {msg.topic()}[{msg.partition()}]@{msg.offset()}")
+        # Poison pill: not stored, but its offset is committed with the batch (POC choice)
+        collector.skip(msg.topic(), msg.partition(), ctx.default_dataset, msg.offset())
+        return []
+
+    dataset = fields["dataset"] or ctx.default_dataset
+    source_event_id = fields["source_event_id"]
+    record = Record(
+        offset=msg.offset(),
+        key=safe_decode_key(msg.key()),
+        line=ndjson_line(msg.value()),
+        source_event_id=source_event_id if isinstance(source_event_id, str) else None,
+        event_time=fields["event_time"],
+        timestamp_ms=message_timestamp_ms(msg),
+        bench=bench_stamp(msg),
+        location=fields["location"],
+    )
+    return collector.add(msg.topic(), msg.partition(), dataset, record)
+
+
+def submit_batch(ctx: StreamContext, pool: PartitionWorkerPool, bcfg: BatchConfig, batch: Batch) -> None:
+    pool.submit((batch.topic, batch.partition), batch.last_offset, in_unit, ctx, "batch", batch.dataset,
+                store_batch, ctx, bcfg, batch)
+
+
+def store_batch(ctx: StreamContext, bcfg: BatchConfig, batch: Batch) -> list[tuple[str, dict]]:
+    """Worker: one NDJSON object for the batch, then its event(s); the commit is left to the poll loop."""
+    started = time.perf_counter()
+    raw_uri, batch_id, pending = None, None, []
+    if batch.records:
+        ingest_time = utc_now_iso()
+        batch_id = stable_event_id(batch_idempotency_key(batch))
+        region_ids, batch.regions_version = tag_regions(ctx, [r.location for r in batch.records], batch.dataset)
+        for r, region_id in zip(batch.records, region_ids):
+            r.region_id = region_id
+        with ctx.metrics.stage("upload", dataset=batch.dataset):
+            raw_uri, stored_size = write_batch_raw(ctx, batch, batch_id, ingest_time)
+        record_latency(ctx, [r.bench for r in batch.records], batch.dataset)
+        events = build_batch_events(ctx, bcfg, batch, batch_id, raw_uri, stored_size, ingest_time)
+        with ctx.metrics.stage("publish", dataset=batch.dataset):
+            pending = deliver(ctx, events)
+        ctx.metrics.processed(batch.nbytes, events=len(batch.records), dataset=batch.dataset)
+    if ctx.index is not None:
+        ctx.index.add((batch.topic, batch.partition), batch.first_offset, batch.last_offset)
+
+    # Smoke-friendly log line (raw_uri is easy to grep); rate limited, counted in log.summary
+    ctx.log.info(
+        "ingest.stream batch done",
+        dataset=batch.dataset,
+        kafka_topic=batch.topic,
+        partition=batch.partition,
+        first_offset=batch.first_offset,
+        last_offset=batch.last_offset,
+        records=len(batch.records),
+        skipped=len(batch.skipped_offsets),
+        replayed=len(batch.replayed_offsets),
+        bytes=batch.nbytes,
+        batch_id=batch_id,
+        raw_uri=raw_uri,
+        duration_ms=int((time.perf_counter() - started) * 1000),
+    )
+    return pending
+
+
+def batch_idempotency_key(batch: Batch) -> str:
+    # Batch boundaries depend on timing (STREAM_BATCH_MAX_MS), so a replay can cut a different
+    # offset range and get another key: it is the dedup index, not this key, that keeps a replayed
+    # batch from being written twice (see STREAM_DEDUP_PATH)
+    return f"ingest-stream:{batch.topic}:{batch.partition}:{batch.records[0].offset}-{batch.records[-1].offset}"
+
+
+def write_batch_raw(ctx: StreamContext, batch: Batch, batch_id: str, ingest_time: str) -> tuple[str, int]:
+    object_payload, object_metadata = build_object_names(batch.dataset, batch_id, batch.records[0].timestamp_ms,
+                                                         "payload.ndjson")
+    object_payload = ctx.compression.object_key(object_payload)
+    meta = {
+        "dataset": batch.dataset,
+        "topic": batch.topic,
+        "partition": batch.partition,
+        "batch_id": batch_id,
+        "format": "ndjson",
+        "first_offset": batch.first_offset,
+        "last_offset": batch.last_offset,
+        "record_count": len(batch.records),
+        "skipped_offsets": batch.skipped_offsets,
+        **({"replayed_offsets": batch.replayed_offsets} if batch.replayed_offsets else {}),
+        "ingest_time": ingest_time,
+        **({"regions_version": batch.regions_version} if batch.regions_version is not None else {}),
+        # offset -> line / byte range in the uncompressed NDJSON (and region_id when tagged)
+        "offsets": batch.offset_index(),
+    }
+    return put_raw(ctx, object_payload, object_metadata, batch.ndjson(), meta, content_type="application/x-ndjson")
+
+
+def build_batch_events(ctx: StreamContext, bcfg: BatchConfig, batch: Batch, batch_id: str, raw_uri: str,
+                       stored_size: int, ingest_time: str) -> list[tuple[str, dict]]:
+    """(message key, event) pairs: one event for the batch, or one per message (STREAM_BATCH_EVENTS)."""
+    first, last = batch.records[0], batch.records[-1]
+    if bcfg.events == "batch":
+        payload = {
+            "dataset": batch.dataset,
+            "topic": batch.topic,
+            "partition": batch.partition,
+            "offset": first.offset,
+            "offset_end": last.offset,
+            "record_count": len(batch.records),
+            "key": None,
+            "raw_uri": raw_uri,
+            "bytes": batch.nbytes,
+            **({"region_ids": sorted({r.region_id for r in batch.records} - {None})}
+               if batch.regions_version is not None else {}),
+            **({"compression": ctx.compression.codec, "stored_bytes": stored_size} if ctx.compression.enabled else {}),
+        }
+        event = build_stream_event(ctx, batch_id, batch_idempotency_key(batch), first.event_time or ingest_time, ingest_time, payload)
+        return [(f"{batch.topic}:{batch.partition}", event)]
+
+    events = []
+    for line, r in enumerate(batch.records):
+        payload = {
+            "dataset": batch.dataset,
+            "topic": batch.topic,
+            "partition": batch.partition,
+            "offset": r.offset,
+            "key": r.key,
+            "raw_uri": raw_uri,
+            "line": line,
+            "bytes": len(r.line),
+            **({"region_id": r.region_id} if batch.regions_version is not None else {}),
+            **({"source_event_id": r.source_event_id} if r.source_event_id is not None else {}),
+        }
+        idempotency_key = f"ingest-stream:{batch.topic}:{batch.partition}:{r.offset}"
+        event = build_stream_event(ctx, stable_event_id(idempotency_key), idempotency_key, r.event_time or ingest_time, ingest_time, payload)
+        events.append((r.key or "", event))
+    return events
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+
+TP = tuple[str, int]  # (topic, partition)
+
+
+class ProcessedIndex:
+    """
+    Offset ranges already persisted (RAW written + events acknowledged) but maybe not committed yet.
+
+    A crash between the RAW write and the offset commit makes Kafka deliver those messages again;
+    `seen()` lets the consumer skip them instead of writing and publishing them a second time.
+    Only the window between the committed offset and what was processed is needed: `seed()` (on
+    partition assignment) and `prune()` (after each commit) drop everything below the committed
+    offset, so the index stays small.
+
+    With a path the ranges are kept in SQLite and survive restarts; without one only an in-memory
+    LRU of the last `max_ranges` ranges is kept (rebalances / redeliveries within the process).
+    """
+
+    def __init__(self, db_path: str = "", max_ranges: int = 100_000):
+        self._lock = threading.Lock()
+        self._max_ranges = max_ranges
+        # Per partition, disjoint ranges sorted by offset (overlapping / adjacent ones are merged):
+        # starts[i]..ends[i]; seen() is one bisect and ends[-1] is the highest persisted offset
+        self._starts: dict[TP, list[int]] = {}
+        self._ends: dict[TP, list[int]] = {}
+        # (topic, partition, first_offset) of every range, least recently added first
+        self._lru: OrderedDict[tuple[str, int, int], None] = OrderedDict()
+        self._conn = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            # One connection shared by the worker threads, serialized by our own lock
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS processed_offsets (
+                    topic        TEXT    NOT NULL,
+                    partition    INTEGER NOT NULL,
+                    first_offset INTEGER NOT NULL,
+                    last_offset  INTEGER NOT NULL,
+                    PRIMARY KEY (topic, partition, first_offset)
+                )
+                """
+            )
+
+    def seed(self, tp: TP, committed_offset: int | None) -> int:
+        """Loads the ranges of a newly assigned partition at or above its committed offset; returns how many."""
+        with self._lock:
+            if committed_offset is not None and committed_offset >= 0:
+                self._prune_locked(tp, committed_offset)
+            if self._conn is None:
+                return len(self._starts.get(tp, ()))
+            rows = self._conn.execute(
+                "SELECT first_offset, last_offset FROM processed_offsets WHERE topic = ? AND partition = ?", tp
+            ).fetchall()
+            for first, last in rows:
+                self._remember_locked(tp, first, last)
+            return len(rows)
+
+    def seen(self, tp: TP, offset: int) -> bool:
+        with self._lock:
+            ends = self._ends.get(tp)
+            # New messages (the common case) are past the last range
+            if not ends or offset > ends[-1]:
+                return False
+            i = bisect_right(self._starts[tp], offset) - 1
+            return i >= 0 and offset <= ends[i]
+
+    def add(self, tp: TP, first_offset: int, last_offset: int) -> None:
+        with self._lock:
+            self._remember_locked(tp, first_offset, last_offset)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO processed_offsets (topic, partition, first_offset, last_offset) VALUES (?, ?, ?, ?)",
+                    (*tp, first_offset, last_offset),
+                )
+
+    def prune(self, tp: TP, committed_offset: int) -> None:
+        """Everything below `committed_offset` will never be delivered again."""
+        with self._lock:
+            self._prune_locked(tp, committed_offset)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+    def _remember_locked(self, tp: TP, first: int, last: int) -> None:
+        starts = self._starts.setdefault(tp, [])
+        ends = self._ends.setdefault(tp, [])
+        # Ranges i..j-1 overlap or touch [first, last]: merged into one
+        i = bisect_left(ends, first - 1)
+        j = bisect_right(starts, last + 1)
+        if i < j:
+            for start in starts[i:j]:
+                self._lru.pop((*tp, start), None)
+            first, last = min(first, starts[i]), max(last, ends[j - 1])
+        starts[i:j] = [first]
+        ends[i:j] = [last]
+        self._lru[(*tp, first)] = None
+        while len(self._lru) > self._max_ranges:
+            self._forget_locked(*self._lru.popitem(last=False)[0])
+
+    def _forget_locked(self, topic: str, partition: int, first: int) -> None:
+        tp = (topic, partition)
+        starts, ends = self._starts[tp], self._ends[tp]
+        i = bisect_left(starts, first)
+        del starts[i], ends[i]
+        if not starts:
+            del self._starts[tp], self._ends[tp]
+
+    def _prune_locked(self, tp: TP, committed_offset: int) -> None:
+        ends = self._ends.get(tp)
+        if ends:
+            k = bisect_left(ends, committed_offset)  # ranges entirely below the committed offset
+            for start in self._starts[tp][:k]:
+                del self._lru[(*tp, start)]
+            del self._starts[tp][:k], ends[:k]
+            if not ends:
+                del self._starts[tp], self._ends[tp]
+        if self._conn is not None:
+            self._conn.execute(
+                "DELETE FROM processed_offsets WHERE topic = ? AND partition = ? AND last_offset < ?",
+                (*tp, committed_offset),
+            )
@@ -0,0 +1,124 @@
+"""
+End-to-end latency of benchmark messages: produce -> RAW write in the consumer.
+
+`producer.py` in bench mode (PRODUCER_MODE=bench) adds three headers to every message:
+    bench-run      run id
+    bench-sent-ns  time.time_ns() right before produce()
+    bench-total    messages the run will send (0 = unbounded)
+
+The consumer calls `LatencyRecorder.record()` once the RAW object holding the message is written
+(per message, or per batch for every record in it). Regular messages carry no headers and cost
+one `headers()` call. Per run, the recorder emits a report every `report_every_s` and a final one
+when all `bench-total` messages were written or the run went idle:
+
+    {"msg": "ingest.stream bench", "run_id": ..., "final": true, "messages": 100000,
+     "msg_per_s": 8412.3, "latency_ms": {"p50": 41.2, "p95": 180.4, "p99": 260.0, "max": 311.9}}
+"""
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+
+HEADER_RUN = "bench-run"
+HEADER_SENT_NS = "bench-sent-ns"
+HEADER_TOTAL = "bench-total"
+
+
+@dataclass(frozen=True)
+class BenchStamp:
+    run_id: str
+    sent_ns: int
+    total: int
+
+
+def bench_stamp(msg) -> BenchStamp | None:
+    """Benchmark headers of a Kafka message, or None (regular traffic)."""
+    headers = msg.headers()
+    if not headers:
+        return None
+    values = {k: v for k, v in headers if k in (HEADER_RUN, HEADER_SENT_NS, HEADER_TOTAL)}
+    if HEADER_RUN not in values or HEADER_SENT_NS not in values:
+        return None
+    try:
+        return BenchStamp(values[HEADER_RUN].decode("utf-8"), int(values[HEADER_SENT_NS]), int(values.get(HEADER_TOTAL) or 0))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def percentiles(values, qs=(50, 95, 99)) -> dict[str, float]:
+    """Nearest-rank percentiles (+ max) of `values`, rounded to 0.1."""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    out = {f"p{q}": round(ordered[min(len(ordered) - 1, max(0, int(len(ordered) * q / 100 + 0.5) - 1))], 1) for q in qs}
+    out["max"] = round(ordered[-1], 1)
+    return out
+
+
+@dataclass
+class _Run:
+    total: int
+    first_sent_ns: int
+    last_written_ns: int = 0
+    latencies_ms: array = field(default_factory=lambda: array("d"))
+    last_report: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+
+
+class LatencyRecorder:
+    def __init__(self, report_every_s: float = 10.0, idle_s: float = 5.0):
+        self.report_every_s = report_every_s
+        self.idle_s = idle_s
+        self._runs: dict[str, _Run] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stamps: list[BenchStamp], written_ns: int | None = None) -> list[float]:
+        """Worker: the messages of `stamps` are in RAW now; returns their latencies (seconds)."""
+        if not stamps:
+            return []
+        written_ns = time.time_ns() if written_ns is None else written_ns
+        now = time.monotonic()
+        seconds = []
+        with self._lock:
+            for s in stamps:
+                run = self._runs.get(s.run_id)
+                if run is None:
+                    run = self._runs[s.run_id] = _Run(total=s.total, first_sent_ns=s.sent_ns)
+                run.first_sent_ns = min(run.first_sent_ns, s.sent_ns)
+                run.last_written_ns = max(run.last_written_ns, written_ns)
+                run.last_seen = now
+                latency = max(0, written_ns - s.sent_ns) / 1e9
+                run.latencies_ms.append(latency * 1000)
+                seconds.append(latency)
+        return seconds
+
+    def due_reports(self, now: float | None = None) -> list[dict]:
+        """Poll loop: progress reports every `report_every_s`, final reports of finished or idle runs."""
+        now = time.monotonic() if now is None else now
+        reports = []
+        with self._lock:
+            for run_id, run in list(self._runs.items()):
+                done = 0 < run.total <= len(run.latencies_ms)
+                if done or now - run.last_seen >= self.idle_s:
+                    reports.append(self._report(run_id, run, final=True))
+                    del self._runs[run_id]
+                elif now - run.last_report >= self.report_every_s:
+                    reports.append(self._report(run_id, run, final=False))
+                    run.last_report = now
+        return reports
+
+    @staticmethod
+    def _report(run_id: str, run: _Run, final: bool) -> dict:
+        elapsed = max((run.last_written_ns - run.first_sent_ns) / 1e9, 1e-9)
+        return {
+            "msg": "ingest.stream bench",
+            "run_id": run_id,
+            "final": final,
+            "expected": run.total or None,
+            "messages": len(run.latencies_ms),
+            "elapsed_s": round(elapsed, 3),
+            "msg_per_s": round(len(run.latencies_ms) / elapsed, 1),
+            "latency_ms": percentiles(run.latencies_ms),
+        }
@@ -0,0 +1,169 @@
+"""
+Load generation for the stream path (producer.py, PRODUCER_MODE=bench).
+
+- TokenBucket: rate control that accounts for the time spent producing, with a bounded burst.
+- LoadProfile: target rate over time:
+      constant  BENCH_RATE msg/s
+      ramp      BENCH_RATE -> BENCH_RAMP_TO, linearly over the run
+      burst     BENCH_RATE, and BENCH_RATE * BENCH_BURST_FACTOR for BENCH_BURST_SECONDS every BENCH_BURST_EVERY_S
+- PayloadSizer: pads posts to BENCH_PAYLOAD_BYTES ("300", or "200-2000" for sizes uniform in the range).
+- KeyPicker: message keys, i.e. how messages spread over partitions:
+      uniform   BENCH_KEY_SPACE keys, equally likely
+      hot       BENCH_HOT_FRACTION of the messages on the first BENCH_HOT_KEYS keys (hot partitions)
+      zipf      key i with weight 1 / i^BENCH_ZIPF_S
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass
+
+from ingest_common.serialization import dumps
+
+PROFILES = ("constant", "ramp", "burst")
+KEY_DISTRIBUTIONS = ("uniform", "hot", "zipf")
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst_seconds` worth of them saved up (at least one)."""
+
+    def __init__(self, rate: float, burst_seconds: float = 0.01):
+        self.burst_seconds = burst_seconds
+        self.set_rate(rate)
+        self._tokens = self.capacity
+        self._at = time.monotonic()
+
+    def set_rate(self, rate: float) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.capacity = max(1.0, rate * self.burst_seconds)
+
+    def take(self, max_n: int = 1) -> int:
+        """Blocks until a token is available, then takes up to `max_n` of them; returns how many."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            if self._tokens >= 1:
+                n = min(max_n, int(self._tokens))
+                self._tokens -= n
+                return n
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    kind: str = "constant"
+    rate: float = 1000.0
+    ramp_to: float = 5000.0
+    duration_s: float = 60.0
+    burst_factor: float = 10.0
+    burst_seconds: float = 1.0
+    burst_every_s: float = 10.0
+
+    def rate_at(self, elapsed: float) -> float:
+        if self.kind == "ramp":
+            return self.rate + (self.ramp_to - self.rate) * min(1.0, elapsed / self.duration_s)
+        if self.kind == "burst" and elapsed % self.burst_every_s < self.burst_seconds:
+            return self.rate * self.burst_factor
+        return self.rate
+
+
+class PayloadSizer:
+    """Adds a `filler` string so the encoded post reaches the target size (posts already larger stay as they are)."""
+
+    def __init__(self, spec: str):
+        low, _, high = spec.partition("-")
+        self.low = int(low)
+        self.high = int(high or low)
+        if not 0 < self.low <= self.high:
+            raise ValueError(f"bad payload size {spec!r}: expected N or MIN-MAX")
+        self._filler = "x" * self.high
+
+    def encode(self, post: dict) -> bytes:
+        value = dumps(post)
+        target = self.low if self.low == self.high else random.randint(self.low, self.high)
+        pad = target - len(value) - len(',"filler":""')
+        if pad <= 0:
+            return value
+        post["filler"] = self._filler[:pad]
+        return dumps(post)
+
+
+class KeyPicker:
+    def __init__(self, distribution: str = "uniform", key_space: int = 1000, hot_keys: int = 1,
+                 hot_fraction: float = 0.8, zipf_s: float = 1.1):
+        if distribution not in KEY_DISTRIBUTIONS:
+            raise ValueError(f"key distribution must be one of {', '.join(KEY_DISTRIBUTIONS)}")
+        self.keys = [f"key-{i:06d}".encode("utf-8") for i in range(max(1, key_space))]
+        n = len(self.keys)
+        if distribution == "hot" and hot_keys < n:
+            weights = [hot_fraction / hot_keys] * hot_keys + [(1 - hot_fraction) / (n - hot_keys)] * (n - hot_keys)
+        elif distribution == "zipf":
+            weights = [1 / (i + 1) ** zipf_s for i in range(n)]
+        else:
+            weights = [1.0] * n
+        self._cum_weights = list(itertools.accumulate(weights))
+
+    def pick(self, n: int) -> list[bytes]:
+        return random.choices(self.keys, cum_weights=self._cum_weights, k=n)
+
+
+@dataclass(frozen=True)
+class LoadConfig:
+    profile: LoadProfile
+    total: int  # 0 = run for profile.duration_s
+    payload_bytes: str
+    keys: str
+    key_space: int
+    hot_keys: int
+    hot_fraction: float
+    zipf_s: float
+    partitions: int  # > 0: create / grow the source topic to this many partitions first
+    report_topic: str
+    wait_s: float
+
+    @classmethod
+    def from_env(cls) -> "LoadConfig":
+        kind = os.getenv("BENCH_PROFILE", "constant").strip().lower()
+        if kind not in PROFILES:
+            raise SystemExit(f"BENCH_PROFILE must be one of {', '.join(PROFILES)}")
+        keys = os.getenv("BENCH_KEYS", "uniform").strip().lower()
+        if keys not in KEY_DISTRIBUTIONS:
+            raise SystemExit(f"BENCH_KEYS must be one of {', '.join(KEY_DISTRIBUTIONS)}")
+        payload_bytes = os.getenv("BENCH_PAYLOAD_BYTES", "300").strip()
+        try:
+            PayloadSizer(payload_bytes)
+        except ValueError as e:
+            raise SystemExit(f"BENCH_PAYLOAD_BYTES: {e}")
+        rate = float(os.getenv("BENCH_RATE", "1000"))
+        if rate <= 0:
+            raise SystemExit("BENCH_RATE must be > 0")
+        profile = LoadProfile(
+            kind=kind,
+            rate=rate,
+            ramp_to=float(os.getenv("BENCH_RAMP_TO", str(rate * 5))),
+            duration_s=max(1.0, float(os.getenv("BENCH_DURATION_S", "60"))),
+            burst_factor=float(os.getenv("BENCH_BURST_FACTOR", "10")),
+            burst_seconds=float(os.getenv("BENCH_BURST_SECONDS", "1")),
+            burst_every_s=max(1.0, float(os.getenv("BENCH_BURST_EVERY_S", "10"))),
+        )
+        return cls(
+            profile=profile,
+            total=max(0, int(os.getenv("BENCH_TOTAL", "0"))),
+            payload_bytes=payload_bytes,
+            keys=keys,
+            key_space=max(1, int(os.getenv("BENCH_KEY_SPACE", "1000"))),
+            hot_keys=max(1, int(os.getenv("BENCH_HOT_KEYS", "1"))),
+            hot_fraction=min(1.0, max(0.0, float(os.getenv("BENCH_HOT_FRACTION", "0.8")))),
+            zipf_s=float(os.getenv("BENCH_ZIPF_S", "1.1")),
+            partitions=max(0, int(os.getenv("BENCH_PARTITIONS", "0"))),
+            report_topic=os.getenv("BENCH_REPORT_TOPIC", "bench.stream.v1").strip(),
+            wait_s=float(os.getenv("BENCH_WAIT_S", "60")),
+        )
+
+    def key_picker(self) -> KeyPicker:
+        return KeyPicker(self.keys, self.key_space, self.hot_keys, self.hot_fraction, self.zipf_s)
@@ -1,11 +1,20 @@
-import json
 import os
 import random
 import time
 import uuid
+from array import array
 from datetime import datetime, timezone
 
-from confluent_kafka import Producer
+from confluent_kafka import Consumer, Producer
+from confluent_kafka.admin import AdminClient, NewPartitions, NewTopic
+
+from ingest_common.log import get_logger, log_context
+from ingest_common.serialization import dumps, loads
+from latency import HEADER_RUN, HEADER_SENT_NS, HEADER_TOTAL, percentiles
+from loadgen import LoadConfig, PayloadSizer, TokenBucket
+
+# Messages produced per token-bucket grant in bench mode (one poll(0) each)
+BENCH_CHUNK = 500
 
 
 def utc_now_iso() -> str:
@@ -38,31 +47,143 @@ def build_post(dataset: str) -> dict:
         "severity": random.choice(["low", "medium", "high"]),
     }
 
+
 def delivery_report(err, msg) -> None:
-    # Called once for each produced message to indicate delivery result.
+    # Called once for each produced message to indicate delivery result (rate limited, see main)
     if err is not None:
-        print(json.dumps({
-            "msg": "delivery failed",
-            "error": str(err),
-            "topic": msg.topic(),
-        }))
+        get_logger().error("delivery failed", error=str(err), topic=msg.topic())
+    else:
+        get_logger().info("delivered", topic=msg.topic(), partition=msg.partition(), offset=msg.offset())
+
+
+def produce(producer: Producer, topic: str, key: bytes, value: bytes, on_delivery, headers=None) -> None:
+    # Backpressure: if local queue is full, poll and retry
+    while True:
+        try:
+            producer.produce(topic=topic, key=key, value=value, headers=headers, on_delivery=on_delivery)
+            return
+        except BufferError:
+            producer.poll(0.1)
+
+
+def run_smoke(producer: Producer, topic: str, dataset: str, posts_per_sec: float, total: int) -> int:
+    """A few posts at a steady pace, each delivery logged."""
+    bucket = TokenBucket(posts_per_sec, burst_seconds=0)
+    sent = 0
+    while True:
+        bucket.take()
+        post = build_post(dataset=dataset)
+        produce(producer, topic, post["source_event_id"].encode("utf-8"), dumps(post), delivery_report)
+
+        # Serve delivery callbacks (non-blocking)
+        producer.poll(0)
+
+        sent += 1
+        if 0 < total <= sent:
+            return sent
+
+
+def ensure_partitions(bootstrap: str, topic: str, partitions: int) -> None:
+    """Creates the topic with `partitions`, or grows it (partitions are never removed)."""
+    admin = AdminClient({"bootstrap.servers": bootstrap})
+    current = admin.list_topics(topic, timeout=10).topics.get(topic)
+    if current is None or current.error is not None:
+        futures = admin.create_topics([NewTopic(topic, num_partitions=partitions, replication_factor=1)])
+    elif len(current.partitions) < partitions:
+        futures = admin.create_partitions([NewPartitions(topic, partitions)])
     else:
-        print(json.dumps({
-            "msg": "delivered",
-            "topic": msg.topic(),
-            "partition": msg.partition(),
-            "offset": msg.offset(),
-        }))
+        return
+    for future in futures.values():
+        future.result(timeout=30)
+
+
+def run_bench(producer: Producer, topic: str, dataset: str, cfg: LoadConfig, run_id: str) -> dict:
+    """
+    Produces at the profile's rate until BENCH_TOTAL messages or BENCH_DURATION_S; every message
+    carries the bench headers read by the consumer (latency.py). Returns the producer-side figures.
+    """
+    profile = cfg.profile
+    bucket = TokenBucket(profile.rate)
+    keys = cfg.key_picker()
+    sizer = PayloadSizer(cfg.payload_bytes)
+    run_header = run_id.encode("utf-8")
+    total_header = str(cfg.total).encode("ascii")
+    acks_ms = array("d")
+    failed = 0
+
+    def on_delivery(err, msg):
+        nonlocal failed
+        if err is not None:
+            failed += 1
+        else:
+            acks_ms.append((msg.latency() or 0.0) * 1000)
+
+    sent = nbytes = 0
+    started = time.monotonic()
+    while True:
+        elapsed = time.monotonic() - started
+        if (cfg.total and sent >= cfg.total) or (not cfg.total and elapsed >= profile.duration_s):
+            break
+        bucket.set_rate(profile.rate_at(elapsed))
+        n = bucket.take(min(BENCH_CHUNK, cfg.total - sent) if cfg.total else BENCH_CHUNK)
+        for key in keys.pick(n):
+            value = sizer.encode(build_post(dataset=dataset))
+            headers = [(HEADER_RUN, run_header), (HEADER_SENT_NS, str(time.time_ns()).encode("ascii")),
+                       (HEADER_TOTAL, total_header)]
+            produce(producer, topic, key, value, on_delivery, headers)
+            nbytes += len(value)
+        sent += n
+        producer.poll(0)
+    produced_s = time.monotonic() - started
+    producer.flush(30)
+
+    return {
+        "topic": topic,
+        "profile": profile.kind,
+        "keys": cfg.keys,
+        "sent": sent,
+        "failed": failed,
+        "elapsed_s": round(produced_s, 3),
+        "msg_per_s": round(sent / produced_s, 1),
+        "bytes_per_s": round(nbytes / produced_s),
+        "ack_latency_ms": percentiles(acks_ms),
+    }
+
+
+def wait_for_report(bootstrap: str, report_topic: str, run_id: str, timeout: float) -> dict | None:
+    """The consumer's final latency report for `run_id` (consumer.py publishes it on `report_topic`)."""
+    consumer = Consumer({
+        "bootstrap.servers": bootstrap,
+        "group.id": f"bench-report-{run_id}",
+        "auto.offset.reset": "earliest",
+        "enable.auto.commit": False,
+    })
+    consumer.subscribe([report_topic])
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            msg = consumer.poll(1.0)
+            if msg is None or msg.error():
+                continue
+            report = loads(msg.value())
+            if report.get("run_id") == run_id and report.get("final"):
+                return report
+        return None
+    finally:
+        consumer.close()
 
 
 def main() -> None:
     bootstrap = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
     topic = os.getenv("KAFKA_TOPIC_SOURCE", "source.posts.v1")
     dataset = os.getenv("DATASET", "posts")
+    # smoke: POSTS_TOTAL posts at POSTS_PER_SEC; bench: load generator + end-to-end report (loadgen.py)
+    mode = os.getenv("PRODUCER_MODE", "smoke").strip().lower()
+    if mode not in ("smoke", "bench"):
+        raise SystemExit("PRODUCER_MODE must be 'smoke' or 'bench'")
 
-    # Sending rate controls
-    posts_per_sec = float(os.getenv("POSTS_PER_SEC", "5"))
-    total = int(os.getenv("POSTS_TOTAL", "0"))  # 0 = infinite
+    # One line per delivery at smoke rates, at most 20/s (plus a log.summary) beyond
+    log = get_logger("ingestor-stream-producer", rate_limits={"delivered": 20})
 
     # Kafka producer tuning (keep simple for POC)
     producer = Producer({
@@ -74,39 +195,32 @@ def main() -> None:
         # "enable.idempotence": True,  # optional; keep off unless you want stronger guarantees
     })
 
-    sent = 0
     try:
-        while True:
-            post = build_post(dataset=dataset)
-            key = post["source_event_id"]
-
-            value_bytes = json.dumps(post).encode("utf-8")
-
-            # Backpressure: if local queue is full, poll and retry
-            while True:
-                try:
-                    producer.produce(
-                        topic=topic,
-                        key=key.encode("utf-8"),
-                        value=value_bytes,
-                        on_delivery=delivery_report,
-                    )
-                    break
-                except BufferError:
-                    producer.poll(0.1)
-
-            # Serve delivery callbacks (non-blocking)
-            producer.poll(0)
-
-            sent += 1
-            if 0 < total <= sent:
-                break
-
-            time.sleep(max(0.0, 1.0 / posts_per_sec))
-
+        if mode == "smoke":
+            # Sending rate controls
+            posts_per_sec = float(os.getenv("POSTS_PER_SEC", "5"))
+            total = int(os.getenv("POSTS_TOTAL", "0"))  # 0 = infinite
+            sent = run_smoke(producer, topic, dataset, posts_per_sec, total)
             # Ensure all messages are delivered before exiting
-        producer.flush(10)
-        print(json.dumps({"msg": "producer done", "topic": topic, "sent": sent}))
+            producer.flush(10)
+            log.info("producer done", topic=topic, sent=sent)
+            return
+
+        cfg = LoadConfig.from_env()
+        if cfg.partitions:
+            ensure_partitions(bootstrap, topic, cfg.partitions)
+        run_id = uuid.uuid4().hex[:12]
+        with log_context(run_id=run_id):
+            log.info("bench producer started", topic=topic, profile=cfg.profile.kind, rate=cfg.profile.rate,
+                     total=cfg.total or None, payload_bytes=cfg.payload_bytes, keys=cfg.keys)
+            log.info("bench producer done", **run_bench(producer, topic, dataset, cfg, run_id))
+            if not cfg.report_topic or cfg.wait_s <= 0:
+                return
+            report = wait_for_report(bootstrap, cfg.report_topic, run_id, cfg.wait_s)
+            if report is None:
+                log.warning("bench report not received", report_topic=cfg.report_topic, waited_s=cfg.wait_s)
+            else:
+                log.info("bench end-to-end report", **{k: v for k, v in report.items() if k not in ("msg", "run_id")})
     finally:
         # flush again just in case (safe)
         producer.flush(5)
@@ -0,0 +1,113 @@
+"""
+Region tagging of stream messages: `location` point -> `region_id`, in the consumer.
+
+STREAM_REGIONS_PATH is a GeoJSON FeatureCollection of region polygons with a `region_id` property:
+`analytics/dbt/poc_trino/exports/regions.geojson`, or `dim_regions` exported from Trino with
+`scripts/export_geo.py --table hive.curated_s3.dim_regions -o regions.geojson`. The polygons are
+prepared and put in a shapely STRtree; a batch is tagged with one vectorized
+`query(points, predicate="intersects")` call, so a message costs a few microseconds instead of a
+join in Trino. A point in no region, or a message without `location.lat` / `location.lon`, gets
+`region_id` None; where regions overlap, the first one in the file wins.
+
+Hot reload: every STREAM_REGIONS_RELOAD_S (default 30; 0 = never) the poll loop stats the file and,
+when its mtime or size changed, builds a new index and swaps it in with one assignment. Workers
+read the current index once per unit, so a unit is always tagged against a single version. A file
+that fails to load keeps the previous index.
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+
+from ingest_common.serialization import dumps, loads
+
+try:
+    import numpy as np
+    import shapely
+except ImportError:  # optional: only needed with STREAM_REGIONS_PATH
+    np = shapely = None
+
+Point = tuple[float, float]  # (lon, lat)
+
+
+def location_of(doc: dict) -> Point | None:
+    """(lon, lat) of a post's `location`, or None when absent or not numeric."""
+    location = doc.get("location")
+    if not isinstance(location, dict):
+        return None
+    lon, lat = location.get("lon"), location.get("lat")
+    if type(lon) not in (int, float) or type(lat) not in (int, float):
+        return None
+    return float(lon), float(lat)
+
+
+@dataclass(frozen=True)
+class RegionIndex:
+    region_ids: list[str]
+    tree: "shapely.STRtree"
+    version: str  # "<mtime_ns>-<size>" of the file it was built from
+
+    @classmethod
+    def load(cls, path: str) -> "RegionIndex":
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            doc = loads(f.read())
+        region_ids, geometries = [], []
+        for feature in doc.get("features") or []:
+            region_id = (feature.get("properties") or {}).get("region_id")
+            if region_id is None or not feature.get("geometry"):
+                continue
+            region_ids.append(str(region_id))
+            geometries.append(dumps(feature["geometry"]))
+        if not region_ids:
+            raise ValueError(f"{path}: no features with a geometry and a region_id")
+        polygons = shapely.from_geojson(geometries)
+        shapely.prepare(polygons)
+        return cls(region_ids, shapely.STRtree(polygons), f"{stat.st_mtime_ns}-{stat.st_size}")
+
+    def lookup(self, points: list[Point | None]) -> list[str | None]:
+        """region_id per point, in order."""
+        if not points:
+            return []
+        coords = np.array([p if p is not None else (np.nan, np.nan) for p in points], dtype="float64")
+        # NaN coordinates make empty points, which intersect nothing
+        inputs, hits = self.tree.query(shapely.points(coords), predicate="intersects")
+        first = np.full(len(points), len(self.region_ids), dtype="int64")
+        np.minimum.at(first, inputs, hits)
+        ids = self.region_ids
+        return [ids[i] if i < len(ids) else None for i in first.tolist()]
+
+
+class RegionTagger:
+    """`index`: the current RegionIndex of one file, replaced when the file changes."""
+
+    def __init__(self, path: str, reload_s: float = 30.0):
+        if shapely is None:
+            raise SystemExit("STREAM_REGIONS_PATH needs shapely (pip install shapely)")
+        self.path = path
+        self.reload_s = reload_s
+        try:
+            self.index = RegionIndex.load(path)
+        except Exception as e:  # unreadable file, bad JSON or geometry
+            raise SystemExit(f"STREAM_REGIONS_PATH: {e}")
+        self._checked_at = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> "RegionTagger | None":
+        path = os.getenv("STREAM_REGIONS_PATH", "").strip()
+        if not path:
+            return None
+        return cls(path, max(0.0, float(os.getenv("STREAM_REGIONS_RELOAD_S", "30"))))
+
+    def maybe_reload(self, now: float | None = None) -> RegionIndex | None:
+        """Poll loop: the new index if the file changed since the last load; raises if it fails to load."""
+        now = time.monotonic() if now is None else now
+        if self.reload_s <= 0 or now - self._checked_at < self.reload_s:
+            return None
+        self._checked_at = now
+        stat = os.stat(self.path)
+        if f"{stat.st_mtime_ns}-{stat.st_size}" == self.index.version:
+            return None
+        self.index = RegionIndex.load(self.path)
+        return self.index
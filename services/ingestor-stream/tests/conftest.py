@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The service runs as flat modules next to a copy of ingest_common (see the Dockerfile)
+SERVICE = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(SERVICE), str(SERVICE.parent / "common")]
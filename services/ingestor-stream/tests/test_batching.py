@@ -0,0 +1,16 @@
+from batching import BatchCollector, BatchConfig, Record
+
+TP = ("source.posts.v1", 0)
+
+
+def test_replayed_and_bad_json_offsets_are_kept_apart():
+    collector = BatchCollector(BatchConfig(max_messages=10, max_bytes=1 << 20, max_ms=1000, events="batch"))
+    collector.skip(*TP, "posts", 5, replayed=True)
+    collector.skip(*TP, "posts", 6, replayed=True)
+    collector.add(*TP, "posts", Record(offset=7, key=None, line=b"{}", source_event_id=None, event_time=None))
+    collector.skip(*TP, "posts", 8)
+    [batch] = collector.drain()
+    assert (batch.first_offset, batch.last_offset) == (5, 8)
+    assert batch.replayed_offsets == [5, 6]
+    assert batch.skipped_offsets == [8]
+    assert [r.offset for r in batch.records] == [7]
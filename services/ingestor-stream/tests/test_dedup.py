@@ -0,0 +1,58 @@
+from dedup import ProcessedIndex
+
+TP = ("source.posts.v1", 0)
+
+
+def test_seen_only_inside_persisted_ranges():
+    index = ProcessedIndex()
+    index.add(TP, 10, 19)
+    index.add(TP, 30, 30)
+    assert [o for o in range(0, 40) if index.seen(TP, o)] == [*range(10, 20), 30]
+    assert not index.seen(("source.posts.v1", 1), 10)
+
+
+def test_overlapping_and_adjacent_ranges_merge():
+    index = ProcessedIndex()
+    index.add(TP, 5, 5)
+    index.add(TP, 3, 6)  # a batch around an already persisted message
+    index.add(TP, 7, 8)
+    assert index.seed(TP, None) == 1
+    assert all(index.seen(TP, o) for o in range(3, 9))
+    assert not index.seen(TP, 2) and not index.seen(TP, 9)
+
+
+def test_prune_drops_ranges_below_the_committed_offset():
+    index = ProcessedIndex()
+    index.add(TP, 0, 9)
+    index.add(TP, 20, 29)
+    index.prune(TP, 10)
+    assert not index.seen(TP, 5)
+    assert index.seen(TP, 25)
+    index.prune(TP, 30)
+    assert not index.seen(TP, 25)
+    assert index.seed(TP, None) == 0
+
+
+def test_eviction_keeps_the_newest_ranges():
+    index = ProcessedIndex(max_ranges=2)
+    index.add(TP, 0, 0)
+    index.add(TP, 10, 10)
+    index.add(TP, 20, 20)
+    assert not index.seen(TP, 0)
+    assert index.seen(TP, 10) and index.seen(TP, 20)
+    index.add(("source.posts.v1", 1), 0, 0)  # evicts the newest-but-one of TP
+    assert not index.seen(TP, 10)
+    assert index.seen(TP, 20) and not index.seen(TP, 21)
+
+
+def test_ranges_survive_a_restart_with_a_path(tmp_path):
+    db = str(tmp_path / "dedup.sqlite")
+    index = ProcessedIndex(db)
+    index.add(TP, 0, 9)
+    index.add(TP, 10, 19)
+    index.close()
+
+    restarted = ProcessedIndex(db)
+    assert not restarted.seen(TP, 15)  # nothing until the partition is assigned
+    assert restarted.seed(TP, 10) == 1  # 0..9 is below the committed offset
+    assert restarted.seen(TP, 15) and not restarted.seen(TP, 5)
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from worker_pool import OffsetTracker, PartitionWorkerPool
+
+TP0 = ("source.posts.v1", 0)
+TP1 = ("source.posts.v1", 1)
+
+
+def test_commit_advances_over_the_completed_prefix_only():
+    tracker = OffsetTracker()
+    first, second, third = (tracker.start(TP0, offset) for offset in (9, 19, 29))
+    tracker.finish(second, ["b"])
+    tracker.finish(third, ["c"])
+    # The first unit is still running: nothing behind it is committable
+    assert tracker.take_ready() == ({}, [])
+    assert tracker.in_flight() == 3
+    tracker.finish(first, ["a"])
+    assert tracker.take_ready() == ({TP0: 30}, ["a", "b", "c"])
+    assert tracker.in_flight() == 0
+    assert tracker.take_ready() == ({}, [])
+
+
+def test_partitions_commit_independently():
+    tracker = OffsetTracker()
+    slow = tracker.start(TP0, 5)
+    fast = tracker.start(TP1, 7)
+    tracker.finish(fast)
+    assert tracker.take_committable() == {TP1: 8}
+    tracker.finish(slow)
+    assert tracker.take_committable([TP1]) == {}
+    assert tracker.take_committable([TP0]) == {TP0: 6}
+
+
+def test_forget_drops_revoked_partitions():
+    tracker = OffsetTracker()
+    unit = tracker.start(TP0, 3)
+    tracker.forget([TP0])
+    tracker.finish(unit)
+    assert tracker.take_committable() == {}
+    assert tracker.in_flight() == 0
+
+
+def test_pool_runs_a_partition_in_order_and_commits_after_out_of_order_completion():
+    pool = PartitionWorkerPool(workers=2, max_in_flight=8)
+    release = threading.Event()
+    ran: list = []
+
+    def unit(tp, offset, block=False):
+        if block:
+            release.wait(5)
+        ran.append((tp, offset))
+        return [offset]
+
+    pool.submit(TP0, 0, unit, TP0, 0, True)
+    pool.submit(TP0, 1, unit, TP0, 1)
+    pool.submit(TP1, 0, unit, TP1, 0)
+    pool.wait([TP1])
+    assert pool.tracker.take_committable() == {TP1: 1}
+    release.set()
+    pool.wait()
+    pool.shutdown()
+    assert [o for tp, o in ran if tp == TP0] == [0, 1]
+    assert pool.tracker.take_ready() == ({TP0: 2}, [0, 1])
+
+
+def test_pool_failure_holds_back_the_commit_and_stops_the_pool():
+    pool = PartitionWorkerPool(workers=1, max_in_flight=4)
+    release = threading.Event()
+    ran: list = []
+
+    def fail():
+        release.wait(5)
+        raise OSError("minio down")
+
+    pool.submit(TP0, 0, fail)
+    pool.submit(TP0, 1, ran.append, 1)
+    release.set()
+    pool.wait()
+    pool.shutdown()
+    # The unit behind the failed one is skipped, and neither offset is committable
+    assert ran == []
+    assert pool.tracker.take_committable() == {}
+    with pytest.raises(RuntimeError, match="minio down"):
+        pool.submit(TP0, 2, ran.append, 2)
@@ -0,0 +1,63 @@
+"""
+Transactional produce + offset commit for the stream consumer (STREAM_TRANSACTIONAL_ID set).
+
+Workers still write RAW in parallel, but leave their ingest.stream events to the poll loop. For
+every commit, the events of the units it covers and the consumer offsets go out in one Kafka
+transaction: both become visible together or not at all. Downstream consumers must read with
+`isolation.level=read_committed` to ignore aborted events.
+
+RAW writes stay outside the transaction; they are made idempotent by deterministic object keys
+(a replayed message overwrites the object it wrote before instead of adding a new one).
+"""
+from __future__ import annotations
+
+from dataclasses import replace
+
+from confluent_kafka import Consumer, KafkaException, Producer, TopicPartition
+
+from ingest_common.kafka_publisher import PublisherConfig
+from ingest_common.serialization import dumps
+from worker_pool import TP
+
+
+class TransactionalCommitter:
+    def __init__(self, config: PublisherConfig, transactional_id: str, timeout: float = 30):
+        # transactional.id fences older instances with the same id (zombie producers after a restart)
+        conf = replace(config, idempotent=True, extra={**config.extra, "transactional.id": transactional_id})
+        self._producer = Producer(conf.to_librdkafka())
+        self._timeout = timeout
+        self._producer.init_transactions(timeout)
+        self.transactions = 0
+        self.aborted = 0
+
+    def commit(self, consumer: Consumer, topic: str, offsets: dict[TP, int], events: list[tuple[str, dict]]) -> None:
+        """Produces `events` and commits `offsets` atomically; aborts and raises on failure."""
+        self._producer.begin_transaction()
+        try:
+            for key, event in events:
+                self._produce(topic, key, dumps(event))
+            self._producer.send_offsets_to_transaction(
+                [TopicPartition(t, p, o) for (t, p), o in offsets.items()],
+                consumer.consumer_group_metadata(),
+                self._timeout,
+            )
+            self._producer.commit_transaction(self._timeout)
+            self.transactions += 1
+        except KafkaException as e:
+            # Fatal errors (e.g. fenced by a newer instance) cannot be aborted: the process must restart
+            if e.args[0].txn_requires_abort():
+                self._producer.abort_transaction(self._timeout)
+                self.aborted += 1
+            raise
+
+    def close(self, timeout: float = 5) -> None:
+        self._producer.flush(timeout)
+
+    def _produce(self, topic: str, key: str, value: bytes) -> None:
+        while True:
+            try:
+                self._producer.produce(topic=topic, key=key, value=value)
+                return
+            except BufferError:
+                # Local queue full: commit_transaction() flushes, meanwhile make room
+                self._producer.poll(0.1)
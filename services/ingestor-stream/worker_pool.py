@@ -0,0 +1,151 @@
+"""
+Partition-parallel processing for the stream consumer.
+
+The poll loop stays on the main thread; units of work (one message, or one batch) are handed to
+STREAM_WORKERS single-threaded lanes. Every partition is pinned to one lane, so its units run in
+order, while different partitions are written to MinIO in parallel.
+
+Commits go through an OffsetTracker: per partition, units are queued in submission order and the
+committable offset only advances over the prefix of completed units. A failed or slow unit holds
+back the commit of everything after it in its partition, never of other partitions. Whatever a
+unit returns (e.g. events left for a transactional commit) is handed out with the offsets it
+makes committable, in partition order.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+TP = tuple[str, int]  # (topic, partition)
+
+
+@dataclass
+class Unit:
+    tp: TP
+    last_offset: int
+    done: bool = False
+    result: list = field(default_factory=list)
+
+
+class OffsetTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._units: dict[TP, deque[Unit]] = {}
+        self._committable: dict[TP, int] = {}
+        self._results: dict[TP, list] = {}
+
+    def start(self, tp: TP, last_offset: int) -> Unit:
+        unit = Unit(tp, last_offset)
+        with self._lock:
+            self._units.setdefault(tp, deque()).append(unit)
+        return unit
+
+    def finish(self, unit: Unit, result: list | None = None) -> None:
+        with self._lock:
+            unit.done = True
+            unit.result = result or []
+            units = self._units.get(unit.tp)
+            # Advance over the completed prefix only: offsets behind an unfinished unit stay uncommitted
+            while units and units[0].done:
+                done = units.popleft()
+                self._committable[unit.tp] = done.last_offset + 1
+                if done.result:
+                    self._results.setdefault(unit.tp, []).extend(done.result)
+
+    def take_committable(self, tps: Iterable[TP] | None = None) -> dict[TP, int]:
+        """Offsets to commit (next offset to read) that advanced since the last call."""
+        return self.take_ready(tps)[0]
+
+    def take_ready(self, tps: Iterable[TP] | None = None) -> tuple[dict[TP, int], list]:
+        """Committable offsets plus the results of the units they cover, taken together."""
+        with self._lock:
+            keys = [tp for tp in self._committable if tps is None or tp in tps]
+            results = [r for tp in keys for r in self._results.pop(tp, [])]
+            return {tp: self._committable.pop(tp) for tp in keys}, results
+
+    def in_flight(self, tps: Iterable[TP] | None = None) -> int:
+        with self._lock:
+            return sum(len(q) for tp, q in self._units.items() if tps is None or tp in tps)
+
+    def forget(self, tps: Iterable[TP]) -> None:
+        with self._lock:
+            for tp in tps:
+                self._units.pop(tp, None)
+                self._committable.pop(tp, None)
+                self._results.pop(tp, None)
+
+
+class PartitionWorkerPool:
+    def __init__(self, workers: int, max_in_flight: int):
+        self.tracker = OffsetTracker()
+        self._lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stream-worker-{i}") for i in range(workers)]
+        self._next_lane = itertools.cycle(range(workers))
+        self._lane_of: dict[TP, int] = {}
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._futures: dict[TP, set[Future]] = {}
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self.error: BaseException | None = None
+
+    def submit(self, tp: TP, last_offset: int, fn: Callable, *args) -> None:
+        """
+        Queues `fn(*args)` behind the earlier units of the same partition (blocks while the pool is full).
+        `fn` may return a list; it comes back from `tracker.take_ready()` with the unit's offsets.
+        """
+        while not self._slots.acquire(timeout=0.5):
+            self.raise_if_failed()
+        if self._failed.is_set():
+            self._slots.release()
+            self.raise_if_failed()
+        unit = self.tracker.start(tp, last_offset)
+        with self._lock:
+            # Round-robin: partitions spread evenly over the lanes, each one always on the same lane
+            lane = self._lane_of.get(tp)
+            if lane is None:
+                lane = self._lane_of[tp] = next(self._next_lane)
+            fut = self._lanes[lane].submit(self._run, unit, fn, args)
+            self._futures.setdefault(tp, set()).add(fut)
+        fut.add_done_callback(lambda f: self._discard(tp, f))
+
+    def _run(self, unit: Unit, fn: Callable, args: tuple) -> None:
+        try:
+            # After a failure nothing else is done: the consumer stops and replays from the last commit
+            if self._failed.is_set():
+                return
+            self.tracker.finish(unit, fn(*args))
+        except BaseException as e:
+            self.error = self.error or e
+            self._failed.set()
+        finally:
+            self._slots.release()
+
+    def _discard(self, tp: TP, fut: Future) -> None:
+        with self._lock:
+            self._futures.get(tp, set()).discard(fut)
+
+    def raise_if_failed(self) -> None:
+        if self._failed.is_set():
+            raise RuntimeError(f"stream worker failed: {self.error}") from self.error
+
+    def wait(self, tps: Iterable[TP] | None = None, timeout: float | None = None) -> None:
+        """Blocks until every submitted unit (of `tps`) has run."""
+        with self._lock:
+            futures = [f for tp, fs in self._futures.items() if tps is None or tp in tps for f in fs]
+        wait(futures, timeout=timeout)
+
+    def forget(self, tps: Iterable[TP]) -> None:
+        """Partitions no longer owned (revoked): drop their tracking, their lane may be reused."""
+        tps = list(tps)
+        self.tracker.forget(tps)
+        with self._lock:
+            for tp in tps:
+                self._lane_of.pop(tp, None)
+                self._futures.pop(tp, None)
+
+    def shutdown(self) -> None:
+        for lane in self._lanes:
+            lane.shutdown(wait=True)